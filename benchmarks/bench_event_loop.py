@@ -0,0 +1,87 @@
+"""
+Event-loop responsiveness check for the async portfolio routes.
+
+Fires a burst of (slow) portfolio OHLC builds at a running server and,
+while they are in flight, keeps timing GET /api/strategies. With the async
+data-access layer the strategy listing should stay close to its idle latency
+instead of queueing behind the portfolio builds.
+
+    uvicorn main:app --port 8000
+    python benchmarks/bench_event_loop.py --portfolio MyPortfolio --concurrency 8
+
+Only the standard library is used; requests run on threads driven by asyncio.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import urllib.parse
+import urllib.request
+
+
+def _get(url: str, timeout: float) -> float:
+    start = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
+        resp.read()
+    return time.perf_counter() - start
+
+
+async def _probe(url: str, stop: asyncio.Event, interval: float, timeout: float) -> list:
+    samples = []
+    while not stop.is_set():
+        samples.append(await asyncio.to_thread(_get, url, timeout))
+        await asyncio.sleep(interval)
+    return samples
+
+
+def _summary(label: str, samples: list):
+    if not samples:
+        print(f"{label:<10} no samples")
+        return
+    ms = sorted(s * 1000 for s in samples)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    print(f"{label:<10} n={len(ms):<4} median={statistics.median(ms):8.1f} ms  p95={p95:8.1f} ms  max={ms[-1]:8.1f} ms")
+
+
+async def main(args):
+    base = args.base_url.rstrip("/")
+    strategies_url = f"{base}/api/strategies"
+    portfolio_url = f"{base}/api/portfolio/{urllib.parse.quote(args.portfolio)}/{args.route}"
+
+    # Idle baseline
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(strategies_url, stop, args.interval, args.timeout))
+    await asyncio.sleep(args.baseline_seconds)
+    stop.set()
+    idle = await probe
+
+    # Same probe while portfolio builds are running
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(strategies_url, stop, args.interval, args.timeout))
+    started = time.perf_counter()
+    builds = await asyncio.gather(
+        *(asyncio.to_thread(_get, portfolio_url, args.timeout) for _ in range(args.concurrency))
+    )
+    stop.set()
+    loaded = await probe
+
+    print(f"{args.concurrency} x {portfolio_url} finished in {time.perf_counter() - started:.2f}s")
+    _summary("portfolio", builds)
+    _summary("idle", idle)
+    _summary("loaded", loaded)
+
+    if idle and loaded:
+        ratio = statistics.median(loaded) / statistics.median(idle)
+        print(f"loaded / idle median latency: {ratio:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--portfolio", required=True)
+    parser.add_argument("--route", default="mtmss", choices=["mtm", "mtms", "mtmss"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--baseline-seconds", type=float, default=2.0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,117 @@
+"""
+Portfolio net equity (/portfolio/{name}/mtmss): the previous pandas costing
+(groupbys + merges over every trade, cost mapped onto the equity rows) vs
+services.trade_costs — per-strategy daily stats, lot-weighted per request.
+
+    python benchmarks/bench_portfolio_costs.py
+    python benchmarks/bench_portfolio_costs.py --strategies 10 50 --days 250 1000 --trades 20
+
+"stats" is the once-per-strategy reduction (done by daily_trade_pipeline in
+MongoDB and cached between requests; numpy here), "lots" a request that
+only changed lots / costs. Reports the max abs difference of
+the net equity paths of both engines.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.portfolio_equity import merge_equity  # noqa: E402
+from services.trade_costs import portfolio_daily_costs, eod_cost_deduction  # noqa: E402
+
+MIN_NS = 60 * 10**9
+DAY_NS = 24 * 60 * MIN_NS
+SESSION_OPEN_NS = (9 * 60 + 15) * MIN_NS - 19800 * 10**9     # 09:15 IST as UTC offset
+BARS_PER_SESSION = 25
+
+
+def make_portfolio(n_strategies: int, days: int, trades_per_day: int, seed: int = 7):
+    """Equity series, trade-log columns per strategy and the portfolio's cost settings"""
+    rng = np.random.default_rng(seed)
+    day_starts = np.arange(days, dtype=np.int64) * DAY_NS + 1_700_000_000 * 10**9 // DAY_NS * DAY_NS
+    bars = np.arange(BARS_PER_SESSION, dtype=np.int64) * 15 * MIN_NS
+    series, logs, lots, brokerage, slippage = [], {}, {}, {}, {}
+    for i in range(n_strategies):
+        name = f"S{i}"
+        t = (day_starts[:, None] + SESSION_OPEN_NS + bars).ravel()
+        series.append((t, np.cumsum(rng.normal(0, 500, len(t)))))
+
+        n = days * trades_per_day
+        keys = day_starts[rng.integers(0, days, n)] + SESSION_OPEN_NS + rng.integers(0, 375, n) * MIN_NS
+        logs[name] = {
+            "Key": np.sort(keys).astype("datetime64[ns]").astype("datetime64[ms]"),
+            "EntryPrice": rng.normal(200, 30, n).round(2),
+            "ExitPrice": rng.normal(200, 30, n).round(2),
+        }
+        lots[name], brokerage[name], slippage[name] = int(rng.integers(1, 10)), 20.0, 0.005
+    return series, logs, lots, brokerage, slippage
+
+
+def daily_stats(cols):
+    """What daily_trade_pipeline returns, as services.trade_costs._daily_stats arrays"""
+    day = cols["Key"].astype("datetime64[D]")
+    days, slot = np.unique(day, return_inverse=True)
+    prices = cols["EntryPrice"] + cols["ExitPrice"]
+    return days, np.bincount(slot, minlength=len(days)).astype(np.float64), np.bincount(slot, weights=prices)
+
+
+def pandas_net(series, logs, lots, brokerage, slippage):
+    """The previous engine: per-trade frame, groupbys / merges, cost mapped per row"""
+    df = pd.concat([pd.DataFrame({**cols, "strategy": name}) for name, cols in logs.items()])
+    df["date"] = df["Key"].dt.date
+    count = df.groupby(["date", "strategy"]).size().reset_index(name="trade_count")
+    count["daily_brokerage"] = count["trade_count"] * count["strategy"].map(lots) * count["strategy"].map(brokerage)
+    df["slippage_per_trade"] = (df["EntryPrice"] + df["ExitPrice"]) * df["strategy"].map(lots) * df["strategy"].map(slippage)
+    daily = pd.merge(
+        count.groupby("date")["daily_brokerage"].sum().reset_index(),
+        df.groupby(["date", "strategy"])["slippage_per_trade"].sum().groupby("date").sum().reset_index(),
+        on="date", how="outer",
+    )
+    cost_map = dict(zip(daily["date"], daily["daily_brokerage"].fillna(0) + daily["slippage_per_trade"].fillna(0)))
+
+    time_ns, equity = merge_equity(series)
+    gross = pd.DataFrame({"Date": pd.to_datetime(time_ns, utc=True), "equity": equity})
+    gross["date_only"] = gross["Date"].dt.date
+    is_eod = gross.groupby("date_only")["Date"].transform("max") == gross["Date"]
+    deduction = np.where(is_eod, gross["date_only"].map(cost_map).fillna(0), 0.0)
+    return gross["equity"].to_numpy() - deduction
+
+
+def numpy_net(series, stats, lots, brokerage, slippage):
+    time_ns, equity = merge_equity(series)
+    days, costs = portfolio_daily_costs(stats, lots, brokerage, slippage)
+    return equity - eod_cost_deduction(time_ns, days, costs)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--strategies", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--days", type=int, nargs="+", default=[250, 1000])
+    parser.add_argument("--trades", type=int, default=20, help="trades per strategy per day")
+    args = parser.parse_args()
+
+    print(f"{'strategies':>10} {'days':>6} {'trades':>10} {'pandas s':>9} {'stats s':>9} {'lots s':>9} {'speedup':>8} {'max diff':>10}")
+    for n in args.strategies:
+        for days in args.days:
+            series, logs, lots, brokerage, slippage = make_portfolio(n, days, args.trades)
+            ref, t_ref = timed(pandas_net, series, logs, lots, brokerage, slippage)
+            stats, t_stats = timed(lambda: {name: daily_stats(cols) for name, cols in logs.items()})
+            net, t_net = timed(numpy_net, series, stats, lots, brokerage, slippage)
+            trades = sum(len(cols["Key"]) for cols in logs.values())
+            print(f"{n:>10} {days:>6} {trades:>10} {t_ref:9.3f} {t_stats:9.3f} {t_net:9.3f} "
+                  f"{t_ref / t_net:7.1f}x {np.max(np.abs(net - ref)):10.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Portfolio equity: pivot_table/ffill/sum (previous engine) vs the k-way merge
+in helpers.portfolio_equity, on synthetic strategies mixing intraday
+(15-min bars during market hours) and positional (one EOD point) series.
+
+    python benchmarks/bench_portfolio_equity.py
+    python benchmarks/bench_portfolio_equity.py --strategies 10 50 200 --days 500
+
+Reports wall time, peak traced memory and the max abs difference between
+the two equity paths for every portfolio size.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.portfolio_equity import merge_equity  # noqa: E402
+
+MIN_NS = 60 * 10**9
+DAY_NS = 24 * 60 * MIN_NS
+SESSION_OPEN_NS = (9 * 60 + 15) * MIN_NS - 19800 * 10**9     # 09:15 IST as UTC offset
+BARS_PER_SESSION = 25
+
+
+def make_series(n_strategies: int, days: int, seed: int = 7):
+    """One sorted (time_ns, scaled cumulative) pair per strategy"""
+    rng = np.random.default_rng(seed)
+    day_starts = np.arange(days, dtype=np.int64) * DAY_NS + 1_700_000_000 * 10**9 // DAY_NS * DAY_NS
+    series = []
+    for i in range(n_strategies):
+        # Strategies start on different days and every third one is positional
+        active = day_starts[rng.integers(0, days // 4 + 1):]
+        if i % 3 == 2:
+            t = active + SESSION_OPEN_NS + BARS_PER_SESSION * 15 * MIN_NS
+        else:
+            bars = np.arange(BARS_PER_SESSION, dtype=np.int64) * 15 * MIN_NS
+            t = (active[:, None] + SESSION_OPEN_NS + bars).ravel()
+        lots = rng.integers(1, 10)
+        cumul = np.cumsum(rng.normal(0, 500, len(t))) * lots
+        series.append((t, cumul))
+    return series
+
+
+def pivot_equity(series):
+    """The previous engine: dense timestamps × strategies matrix"""
+    df = pd.DataFrame({
+        "Date": np.concatenate([t for t, _ in series]),
+        "strategy_code": np.concatenate([np.full(len(t), i) for i, (t, _) in enumerate(series)]),
+        "scaled_cumul": np.concatenate([v for _, v in series]),
+    })
+    pivot = df.pivot_table(index="Date", columns="strategy_code", values="scaled_cumul", aggfunc="last").ffill()
+    equity = pivot.sum(axis=1)
+    return equity.index.to_numpy(dtype=np.int64), equity.to_numpy()
+
+
+def measure(fn, series):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(series)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def main(args):
+    print(f"{'strategies':>10} {'rows':>10} {'stamps':>8} | {'pivot s':>8} {'pivot MB':>9} | {'merge s':>8} {'merge MB':>9} | {'max |diff|':>10}")
+    for n in args.strategies:
+        series = make_series(n, args.days)
+        rows = sum(len(t) for t, _ in series)
+
+        (pt, pe), p_time, p_mem = measure(pivot_equity, series)
+        (mt, me), m_time, m_mem = measure(merge_equity, series)
+
+        assert np.array_equal(pt, mt), "timestamps differ"
+        diff = float(np.max(np.abs(pe - me))) if len(pe) else 0.0
+        print(f"{n:>10} {rows:>10} {len(mt):>8} | {p_time:>8.3f} {p_mem:>9.1f} | {m_time:>8.3f} {m_mem:>9.1f} | {diff:>10.2e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--strategies", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--days", type=int, default=750)
+    main(parser.parse_args())
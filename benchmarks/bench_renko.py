@@ -0,0 +1,96 @@
+"""
+Close-path Renko: the candle loop (_build_renko_reference) vs the clamp-scan
+builder (_build_renko_numpy) on synthetic 15-minute equity curves; OHLC-path
+Renko: the per-candle loop (_build_ohlc_renko_reference) vs renko_path +
+walk_renko on the same curves with random wicks.
+
+    python benchmarks/bench_renko.py
+    python benchmarks/bench_renko.py --candles 100000 1000000 10000000 --bricks 0.25 1 5
+    python benchmarks/bench_renko.py --mode ohlc
+
+--bricks are brick sizes in multiples of the per-candle move's standard
+deviation (small bricks = many bricks per candle, the slow case for the loop).
+That the builders agree brick for brick is tested in tests/test_renko.py.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+from helpers.make_renko import (  # noqa: E402
+    _build_renko_numpy, _build_renko_reference, _build_ohlc_renko_reference, _renko_frame, renko_path, walk_renko,
+)
+
+CANDLE_MS = 15 * 60 * 1000
+STEP_SD = 40.0          # per-candle PnL move
+REFERENCE_MAX = 2_000_000   # the loop is skipped above this many candles unless --reference-all
+
+
+def equity(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    closes = np.cumsum(rng.normal(0, STEP_SD, n)) + 250_000.37
+    dates = (1_700_000_000_000 + CANDLE_MS * np.arange(n)).astype("datetime64[ms]")
+    return closes, dates
+
+
+def with_wicks(closes, seed: int = 0):
+    """Candles opening at the previous close, wicks up to a move either side"""
+    rng = np.random.default_rng(seed)
+    opens = np.r_[closes[:1], closes[:-1]]
+    highs = np.maximum(opens, closes) + np.abs(rng.normal(0, STEP_SD, len(closes)))
+    lows = np.minimum(opens, closes) - np.abs(rng.normal(0, STEP_SD, len(closes)))
+    return pd.DataFrame({"open": opens, "high": highs, "low": lows, "close": closes})
+
+
+def ohlc_numpy(df, dates, size):
+    path = renko_path(df, "ohlc")
+    if not len(path):
+        return _build_ohlc_renko_reference(*(df[c].to_numpy() for c in ("open", "high", "low", "close")), dates, size)
+    idx, opens, closes, _ = walk_renko(path, path[0, 0], size)
+    return _renko_frame(dates[idx], opens, closes)
+
+
+def ohlc_reference(df, dates, size):
+    return _build_ohlc_renko_reference(*(df[c].to_numpy() for c in ("open", "high", "low", "close")), dates, size)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candles", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--bricks", type=float, nargs="+", default=[0.25, 1.0, 5.0])
+    parser.add_argument("--reference-all", action="store_true", help="time the loop on every size")
+    parser.add_argument("--mode", choices=["close", "ohlc"], default="close")
+    args = parser.parse_args()
+
+    print(f"{'candles':>10} {'brick':>6} {'bricks':>11} {'loop s':>9} {'numpy s':>9} {'speedup':>8}")
+    for n in args.candles:
+        closes, dates = equity(n)
+        if args.mode == "ohlc":
+            data, fast_fn, ref_fn = with_wicks(closes), ohlc_numpy, ohlc_reference
+        else:
+            data, fast_fn, ref_fn = closes, _build_renko_numpy, _build_renko_reference
+        for mult in args.bricks:
+            size = max(1, round(mult * STEP_SD))
+            fast, t_fast = timed(fast_fn, data, dates, size)
+
+            if n <= REFERENCE_MAX or args.reference_all:
+                _, t_ref = timed(ref_fn, data, dates, size)
+                ref, speed = f"{t_ref:9.3f}", f"{t_ref / t_fast:7.1f}x"
+            else:
+                ref, speed = f"{'-':>9}", f"{'-':>8}"
+            print(f"{n:>10} {size:>6} {len(fast):>11} {ref} {t_fast:9.3f} {speed}")
+
+
+if __name__ == "__main__":
+    main()
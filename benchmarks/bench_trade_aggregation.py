@@ -0,0 +1,112 @@
+"""
+Trade-log costing input: every trade pulled into Python (the previous
+/mtmss read) vs daily_trade_pipeline, which returns one doc per day per
+strategy. Needs a MongoDB to run against; it writes to a scratch database
+and drops it afterwards.
+
+    python benchmarks/bench_trade_aggregation.py
+    python benchmarks/bench_trade_aggregation.py --url mongodb://localhost:27017 --trades 100000 1000000
+
+Checks both paths give the same (day, trades, price sum) per strategy —
+counts exactly, sums to 1e-9 relative — then reports docs transferred and
+wall time of each.
+
+Docs transferred per strategy with the default seed (5 strategies, 1461
+days of trades) — a property of the data, the same on any server:
+
+       trades      find docs   aggregate docs
+      100000   19857 - 20178             1461
+     1000000  199027 - 200601            1461
+
+Wall times are not recorded yet: they need a run against a real mongod
+(mongomock runs aggregations in Python and says nothing about them).
+"""
+import argparse
+import datetime as dt
+import os
+import sys
+import time
+
+import numpy as np
+from pymongo import MongoClient, ASCENDING
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.trade_costs import daily_trade_pipeline, _daily_stats  # noqa: E402
+
+SCRATCH_DB = "bench_trade_aggregation"
+STRATEGIES = 5
+INSERT_BATCH = 50_000
+
+
+def seed(col, n: int, seed: int = 3):
+    """n trades spread over STRATEGIES strategies and ~4 years of sessions"""
+    rng = np.random.default_rng(seed)
+    start = dt.datetime(2021, 1, 1, 3, 45)
+    minutes = np.sort(rng.integers(0, 4 * 365 * 24 * 60, n))
+    strategy = rng.integers(0, STRATEGIES, n)
+    entry, exit_ = rng.normal(200, 30, n).round(2), rng.normal(200, 30, n).round(2)
+
+    col.drop()
+    col.create_index([("strategy", ASCENDING), ("Key", ASCENDING)])
+    for lo in range(0, n, INSERT_BATCH):
+        col.insert_many([
+            {"strategy": f"S{s}", "Key": start + dt.timedelta(minutes=int(m)), "EntryPrice": float(e), "ExitPrice": float(x)}
+            for s, m, e, x in zip(strategy[lo:lo + INSERT_BATCH], minutes[lo:lo + INSERT_BATCH],
+                                  entry[lo:lo + INSERT_BATCH], exit_[lo:lo + INSERT_BATCH])
+        ])
+
+
+def pulled(col, strategy):
+    """The previous read: every trade to the client, reduced there"""
+    docs = list(col.find({"strategy": strategy}, {"_id": 0, "Key": 1, "EntryPrice": 1, "ExitPrice": 1}))
+    day = np.array([d["Key"] for d in docs], dtype="datetime64[ms]").astype("datetime64[D]")
+    prices = np.array([d["EntryPrice"] + d["ExitPrice"] for d in docs])
+    days, slot = np.unique(day, return_inverse=True)
+    stats = days, np.bincount(slot, minlength=len(days)).astype(np.float64), np.bincount(slot, weights=prices)
+    return stats, len(docs)
+
+
+def aggregated(col, strategy):
+    docs = list(col.aggregate(daily_trade_pipeline(strategy)))
+    return _daily_stats(docs), len(docs)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=os.getenv("MONGO_URL_FINSAGE_V2", "mongodb://localhost:27017"))
+    parser.add_argument("--trades", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    client = MongoClient(args.url, serverSelectionTimeoutMS=3000)
+    col = client[SCRATCH_DB].strategies_trade_logs
+    ok = True
+    try:
+        print(f"{'trades':>10} {'strategy':>8} {'docs':>9} {'find s':>8} {'groups':>7} {'agg s':>8} {'speedup':>8}")
+        for n in args.trades:
+            seed(col, n)
+            for s in range(STRATEGIES):
+                name = f"S{s}"
+                (ref, docs), t_ref = timed(pulled, col, name)
+                (out, groups), t_agg = timed(aggregated, col, name)
+                same = (np.array_equal(ref[0], out[0]) and np.array_equal(ref[1], out[1])
+                        and np.allclose(ref[2], out[2], rtol=1e-9, atol=0))
+                if not same:
+                    print(f"MISMATCH  trades={n}  {name}")
+                    ok = False
+                print(f"{n:>10} {name:>8} {docs:>9} {t_ref:8.3f} {groups:>7} {t_agg:8.3f} {t_ref / t_agg:7.1f}x")
+    finally:
+        client.drop_database(SCRATCH_DB)
+    print("equivalence: " + ("identical" if ok else "FAILED"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Chart transforms (helpers/chart_transforms.py): the kernels (numpy for
+Heikin-Ashi, Kagi and P&F; a lean single pass for line break) vs their
+candle-by-candle references on synthetic 15-minute equity curves.
+
+    python benchmarks/bench_transforms.py
+    python benchmarks/bench_transforms.py --candles 100000 1000000 --check-only
+
+Every run first checks each kernel against its reference row for row on the
+benchmark series and on adversarial ones (flat stretches, integer prices on
+box boundaries, a long trend); any difference aborts with a non-zero exit.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.chart_transforms import (  # noqa: E402
+    heikin_ashi, _heikin_ashi_reference,
+    line_break, _line_break_reference,
+    kagi, _kagi_reference,
+    point_figure, _point_figure_reference,
+)
+
+CANDLE_MS = 15 * 60 * 1000
+STEP_SD = 40.0
+REFERENCE_MAX = 1_000_000   # the loops are skipped above this many candles
+
+
+def candles(closes: np.ndarray, seed: int = 0) -> pd.DataFrame:
+    """Candles opening at the previous close, with wicks up to a move either side"""
+    rng = np.random.default_rng(seed)
+    opens = np.r_[closes[:1], closes[:-1]]
+    return pd.DataFrame({
+        "time": 1_700_000_000_000 + CANDLE_MS * np.arange(len(closes)),
+        "open": opens,
+        "high": np.maximum(opens, closes) + np.abs(rng.normal(0, STEP_SD / 2, len(closes))),
+        "low": np.minimum(opens, closes) - np.abs(rng.normal(0, STEP_SD / 2, len(closes))),
+        "close": closes,
+    })
+
+
+def equity(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return candles(np.cumsum(rng.normal(0, STEP_SD, n)) + 250_000.37, seed)
+
+
+def adversarial_cases(seed: int = 1):
+    rng = np.random.default_rng(seed)
+    for n in (0, 1, 2, 3, 50, 5000):
+        yield "integer steps", candles(np.cumsum(rng.choice([-20, -10, 0, 0, 10, 20], n)).astype(float))
+        yield "flat", candles(np.full(n, 100.0))
+        yield "trend", candles(np.arange(n) * 3.0 + rng.normal(0, 1, n))
+
+
+CASES = [
+    ("heikin_ashi", heikin_ashi, _heikin_ashi_reference, {}),
+    ("line_break 3", line_break, _line_break_reference, {"lines": 3}),
+    ("line_break 1", line_break, _line_break_reference, {"lines": 1}),
+    ("kagi", kagi, _kagi_reference, {"reversal": 60.0}),
+    ("kagi small", kagi, _kagi_reference, {"reversal": 10.0}),
+    ("point_figure", point_figure, _point_figure_reference, {"box_size": 20.0, "reversal": 3}),
+    ("point_figure 1", point_figure, _point_figure_reference, {"box_size": 10.0, "reversal": 1}),
+]
+
+
+def same(a, b) -> bool:
+    if a.shape != b.shape or list(a.columns) != list(b.columns):
+        return False
+    return all(np.array_equal(a[c].to_numpy(), b[c].to_numpy()) for c in a.columns)
+
+
+def check(sizes) -> bool:
+    ok = True
+    frames = [(name, df) for name, df in adversarial_cases()]
+    frames += [(f"random walk n={n}", equity(n)) for n in sizes if n <= REFERENCE_MAX]
+    for label, df in frames:
+        for name, fast, ref, params in CASES:
+            if not same(fast(df, **params), ref(df, **params)):
+                print(f"MISMATCH  {name}  {label}  n={len(df)}")
+                ok = False
+    print("equivalence: " + ("identical" if ok else "FAILED"))
+    return ok
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candles", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--check-only", action="store_true")
+    args = parser.parse_args()
+
+    if not check([n for n in args.candles if n <= 100_000]):
+        sys.exit(1)
+    if args.check_only:
+        return
+
+    print(f"\n{'transform':>15} {'candles':>10} {'rows':>9} {'loop s':>9} {'kernel s':>9} {'speedup':>8}")
+    for n in args.candles:
+        df = equity(n)
+        for name, fast, ref, params in CASES:
+            out, t_fast = timed(fast, df, **params)
+            if n <= REFERENCE_MAX:
+                _, t_ref = timed(ref, df, **params)
+                loop, speed = f"{t_ref:9.3f}", f"{t_ref / t_fast:7.1f}x"
+            else:
+                loop, speed = f"{'-':>9}", f"{'-':>8}"
+            print(f"{name:>15} {n:>10} {len(out):>9} {loop} {t_fast:9.3f} {speed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import os
-from pymongo import MongoClient
+from pymongo import MongoClient, AsyncMongoClient, ASCENDING
 from dotenv import load_dotenv
 from logger_setup import logger
 
@@ -9,7 +9,48 @@ MONGO_URL_MTM_DATA = os.getenv("MONGO_URL_FINSAGE_V2")
 MONGO_URL_INFRA_TOOLS = os.getenv("MONGO_URL_INFRA_TOOLS")
 
 mongo_clients = {}      # Healthy clients only
+async_mongo_clients = {}
 mongo_failed = set()    # Mark permanently failed DBs
+async_mongo_failed = set()  # Same for the async clients, so one kind failing doesn't disable the other
+mongo_indexed = set()   # DBs whose indexes were already ensured
+
+# Connections per async client, shared by every request on the worker
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+
+# Indexes the read paths depend on, per database → collection
+FINSAGE_INDEXES = {
+    "strategies_mtm_data": [
+        [("strategy", ASCENDING), ("Date", ASCENDING)],
+    ],
+    # Trade-log costing groups one strategy's trades by day and probes its latest Key
+    "strategies_trade_logs": [
+        [("strategy", ASCENDING), ("Key", ASCENDING)],
+    ],
+}
+
+INFRA_INDEXES = {
+    # Re-uploads of the same bytes are found by hash
+    "files": [
+        [("content_hash", ASCENDING)],
+    ],
+    "timeseries_mtm": [
+        [("file_id", ASCENDING), ("timestamp", ASCENDING)],
+    ],
+    # Windowed reads walk start_ts forwards and end_ts backwards
+    "timeseries_mtm_buckets": [
+        [("file_id", ASCENDING), ("start_ts", ASCENDING)],
+        [("file_id", ASCENDING), ("end_ts", ASCENDING)],
+    ],
+    # Persisted Renko states read their brick chunks in order and find the
+    # checkpoint nearest a window start
+    "renko_bricks": [
+        [("state_id", ASCENDING), ("generation", ASCENDING), ("seq", ASCENDING)],
+    ],
+    "renko_checkpoints": [
+        [("state_id", ASCENDING), ("generation", ASCENDING), ("time", ASCENDING)],
+    ],
+}
 
 
 def get_mongo_client(url: str, db_name: str):
@@ -41,11 +82,87 @@ def get_mongo_client(url: str, db_name: str):
         raise ConnectionError(f"Cannot connect to MongoDB ({db_name})") from e
 
 
+async def get_async_mongo_client(url: str, db_name: str):
+    # Same bookkeeping as the sync client: fail fast once a DB is known down
+    if db_name in async_mongo_failed:
+        raise ConnectionError(f"MongoDB ({db_name}) is offline")
+
+    if db_name in async_mongo_clients:
+        return async_mongo_clients[db_name]
+
+    try:
+        logger.info(f"[MongoDB] Connecting async client to {db_name}...")
+        client = AsyncMongoClient(
+            url,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            serverSelectionTimeoutMS=3000,
+            connectTimeoutMS=3000,
+            socketTimeoutMS=5000,
+            heartbeatFrequencyMS=10000,
+        )
+        await client.admin.command("ping")
+        logger.info(f"Connected async client to MongoDB: {db_name}")
+        async_mongo_clients[db_name] = client
+        return client
+
+    except Exception as e:
+        logger.error(f"MongoDB async connection failed ({db_name}): {e}", exc_info=True)
+        async_mongo_failed.add(db_name)
+        raise ConnectionError(f"Cannot connect to MongoDB ({db_name})") from e
+
+
+def ensure_indexes(db, indexes: dict):
+    # Only once per process; create_index is a no-op when the index exists
+    if db.name in mongo_indexed:
+        return
+    mongo_indexed.add(db.name)
+
+    for collection, index_list in indexes.items():
+        for keys in index_list:
+            try:
+                db[collection].create_index(keys)
+            except Exception as e:
+                # Read-only users can still query, just without our index
+                logger.warning(f"Could not create index {keys} on {db.name}.{collection}: {e}")
+
+
+async def ensure_indexes_async(db, indexes: dict):
+    if db.name in mongo_indexed:
+        return
+    mongo_indexed.add(db.name)
+
+    for collection, index_list in indexes.items():
+        for keys in index_list:
+            try:
+                await db[collection].create_index(keys)
+            except Exception as e:
+                logger.warning(f"Could not create index {keys} on {db.name}.{collection}: {e}")
+
+
 def get_finsage_db():
     client = get_mongo_client(MONGO_URL_MTM_DATA, "FinSageAI_V2")
-    return client["FinSageAI_V2"]
+    db = client["FinSageAI_V2"]
+    ensure_indexes(db, FINSAGE_INDEXES)
+    return db
 
 
 def get_infra_db():
     client = get_mongo_client(MONGO_URL_INFRA_TOOLS, "FinSageAI_V2_Files")
-    return client["FinSageAI_V2_Files"]
+    db = client["FinSageAI_V2_Files"]
+    ensure_indexes(db, INFRA_INDEXES)
+    return db
+
+
+async def get_finsage_async_db():
+    client = await get_async_mongo_client(MONGO_URL_MTM_DATA, "FinSageAI_V2")
+    db = client["FinSageAI_V2"]
+    await ensure_indexes_async(db, FINSAGE_INDEXES)
+    return db
+
+
+async def get_infra_async_db():
+    client = await get_async_mongo_client(MONGO_URL_INFRA_TOOLS, "FinSageAI_V2_Files")
+    db = client["FinSageAI_V2_Files"]
+    await ensure_indexes_async(db, INFRA_INDEXES)
+    return db
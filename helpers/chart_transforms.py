@@ -0,0 +1,387 @@
+import pandas as pd
+import numpy as np
+from helpers.make_renko import _clamp_scan, MAX_RENKO_RESTARTS
+
+
+# ==================== SETTINGS ====================
+
+COLUMNS = ['time', 'open', 'high', 'low', 'close']
+
+
+def _frame(time, open_, close, **extra) -> pd.DataFrame:
+    open_ = np.asarray(open_, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    return pd.DataFrame({
+        'time':  np.asarray(time, dtype=np.int64),
+        'open':  open_,
+        'high':  np.maximum(open_, close),
+        'low':   np.minimum(open_, close),
+        'close': close,
+        **extra,
+    })
+
+
+def _arrays(df: pd.DataFrame, *columns):
+    return [df[c].to_numpy(dtype=np.float64) for c in columns]
+
+
+# ==================== HEIKIN-ASHI ====================
+
+def heikin_ashi(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Heikin-Ashi candles: close = (o + h + l + c) / 4, open = midpoint of the
+    previous HA candle. That recurrence, open[i] = ½·open[i-1] + ½·close[i-1],
+    is an EWM with alpha ½ (adjust=False) over [(o0 + c0) / 2, close[:-1]].
+    """
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNS)
+
+    o, h, l, c = _arrays(df, 'open', 'high', 'low', 'close')
+    ha_close = (o + h + l + c) / 4
+    seed = np.r_[(o[0] + c[0]) / 2, ha_close[:-1]]
+    ha_open = pd.Series(seed).ewm(alpha=0.5, adjust=False).mean().to_numpy()
+
+    return pd.DataFrame({
+        'time':  df['time'].to_numpy(dtype=np.int64),
+        'open':  ha_open,
+        'high':  np.maximum(np.maximum(h, ha_open), ha_close),
+        'low':   np.minimum(np.minimum(l, ha_open), ha_close),
+        'close': ha_close,
+    })
+
+
+def _heikin_ashi_reference(df: pd.DataFrame) -> pd.DataFrame:
+    """Candle-by-candle Heikin-Ashi — what heikin_ashi must match"""
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNS)
+
+    o, h, l, c = _arrays(df, 'open', 'high', 'low', 'close')
+    rows = []
+    ha_open = (o[0] + c[0]) / 2
+    for i in range(len(c)):
+        if i:
+            ha_open = (ha_open + ha_close) / 2
+        ha_close = (o[i] + h[i] + l[i] + c[i]) / 4
+        rows.append((ha_open, max(h[i], ha_open, ha_close), min(l[i], ha_open, ha_close), ha_close))
+
+    out = pd.DataFrame(rows, columns=COLUMNS[1:])
+    out.insert(0, 'time', df['time'].to_numpy(dtype=np.int64))
+    return out
+
+
+# ==================== LINE BREAK ====================
+
+def _first_line(c: np.ndarray):
+    """Index of the first close that differs from the first one (the first line), or None"""
+    moved = np.flatnonzero(c != c[0]) if len(c) else []
+    return int(moved[0]) if len(moved) else None
+
+
+def line_break(df: pd.DataFrame, lines: int = 3) -> pd.DataFrame:
+    """
+    N-line break on closes. A close beyond the last line's end extends the
+    trend with a new line from there; a close beyond the extreme of the last
+    `lines` lines (either color) reverses, with a line from the far end of
+    the last line. Any other close draws nothing.
+
+    Each line depends on the ones before it, so this is one pass over the
+    closes, but the reversal levels are only recomputed when a line is drawn
+    and a close that draws nothing costs two float comparisons.
+    """
+    if lines < 1:
+        raise ValueError("lines must be at least 1")
+    t, c = df['time'].to_numpy(dtype=np.int64), df['close'].to_numpy(dtype=np.float64)
+    j = _first_line(c)
+    if j is None:
+        return pd.DataFrame(columns=COLUMNS)
+
+    xs = c.tolist()
+    idx, opens, closes = [j], [xs[0]], [xs[j]]
+    tops, bottoms = [max(xs[0], xs[j])], [min(xs[0], xs[j])]
+    up, o_last, c_last = xs[j] > xs[0], xs[0], xs[j]
+    hi, lo = tops[0], bottoms[0]
+
+    for i in range(j + 1, len(xs)):
+        x = xs[i]
+        if up:
+            if x > c_last:
+                o_last = c_last
+            elif x < lo:
+                up = False
+            else:
+                continue
+        else:
+            if x < c_last:
+                o_last = c_last
+            elif x > hi:
+                up = True
+            else:
+                continue
+        # o_last is now this line's open: the last close (trend) or the last open (reversal)
+        c_last = x
+        idx.append(i); opens.append(o_last); closes.append(x)
+        tops.append(max(o_last, x)); bottoms.append(min(o_last, x))
+        hi, lo = max(tops[-lines:]), min(bottoms[-lines:])
+
+    return _frame(t[idx], opens, closes)
+
+
+def _line_break_reference(df: pd.DataFrame, lines: int = 3) -> pd.DataFrame:
+    """Candle-by-candle N-line break — what line_break must match"""
+    t, c = df['time'].to_numpy(dtype=np.int64), df['close'].to_numpy(dtype=np.float64)
+    j = _first_line(c)
+    if j is None:
+        return pd.DataFrame(columns=COLUMNS)
+
+    idx, opens, closes = [j], [c[0]], [c[j]]
+    for i in range(j + 1, len(c)):
+        x, o_last, c_last = c[i], opens[-1], closes[-1]
+        hi = max(max(o, cl) for o, cl in zip(opens[-lines:], closes[-lines:]))
+        lo = min(min(o, cl) for o, cl in zip(opens[-lines:], closes[-lines:]))
+        up = c_last > o_last
+
+        if (up and x > c_last) or (not up and x < c_last):
+            idx.append(i); opens.append(c_last); closes.append(x)
+        elif (up and x < lo) or (not up and x > hi):
+            idx.append(i); opens.append(o_last); closes.append(x)
+
+    return _frame(t[idx], opens, closes)
+
+
+# ==================== SWINGS (KAGI, POINT & FIGURE) ====================
+
+def _swing_segment(x, reversal, up_level, down_level, gap, start, direction, extreme):
+    """
+    Direction and extreme after every point of x[start:], given the state
+    after x[start], plus the first point (offset from start) where that
+    disagrees with the point-by-point rule, or None.
+
+    Both swing directions hold the same window (lo, lo + reversal + gap):
+    lo = extreme - reversal in an up swing, extreme - gap in a down swing.
+    A point at or below lo reverses an up swing or extends a down one, and
+    either way lo becomes down_level(x) - gap; at or above the top the same
+    goes for up_level(x) - reversal. So lo follows k -> clip(k, up_level(x) -
+    reversal, down_level(x) - gap) whatever the direction — a clamp scan —
+    and the direction is the side of the window last touched.
+    """
+    y = x[start + 1:]
+    lo0 = extreme - reversal if direction > 0 else extreme - gap
+    A, B = _clamp_scan(up_level(y) - reversal, down_level(y) - gap) if len(y) else (y, y)
+    prev = np.r_[lo0, np.clip(lo0, A, B)[:-1]]
+
+    event = np.r_[direction, np.where(y <= prev, -1, np.where(y >= prev + reversal + gap, 1, 0))]
+    d = event[np.maximum.accumulate(np.where(event != 0, np.arange(len(event)), 0))]
+
+    # Extremes: running max of up_level (min of down_level) within each swing
+    level = np.r_[extreme, np.where(d[1:] > 0, up_level(y), down_level(y))]
+    swing = np.cumsum(np.r_[0, d[1:] != d[:-1]])
+    ext = d * pd.Series(d * level).groupby(swing).cummax().to_numpy()
+
+    # Check every decision in the point-by-point rule's own arithmetic
+    flip = np.where(d[:-1] > 0, y <= ext[:-1] - reversal, y >= ext[:-1] + reversal)
+    bad = np.flatnonzero(flip != (d[1:] != d[:-1]))
+    return d, ext, (int(bad[0]) + 1 if len(bad) else None)
+
+
+def _swings(x: np.ndarray, reversal: float, up_level, down_level, gap: float,
+            start: int, direction: int, extreme: float):
+    """
+    Alternating swings of `x` from the swing that begins at `start`. An up
+    swing tracks its highest up_level(x) and ends at the first point with
+    x <= extreme - reversal, which begins a down swing at down_level(x)
+    (mirrored for down swings). `gap` is how far below its extreme a down
+    swing can go without extending it (0 for prices, 1 box for P&F levels).
+
+    Returns (starts, directions, extremes), one entry per swing.
+    """
+    dirs, exts = [], []
+    pos, restarts = start, 0
+    while True:
+        d, ext, bad = _swing_segment(x, reversal, up_level, down_level, gap, pos, direction, extreme)
+        if bad is None:
+            dirs.append(d); exts.append(ext)
+            break
+        # Rounding disagreed (window edges are off by an ulp): keep what was
+        # right, take that one point by the rule and scan on from there
+        dirs.append(d[:bad]); exts.append(ext[:bad])
+        direction, extreme, pos = int(d[bad - 1]), ext[bad - 1], pos + bad
+        if direction > 0 and x[pos] <= extreme - reversal:
+            direction, extreme = -1, down_level(x[pos])
+        elif direction < 0 and x[pos] >= extreme + reversal:
+            direction, extreme = 1, up_level(x[pos])
+        else:
+            extreme = max(extreme, up_level(x[pos])) if direction > 0 else min(extreme, down_level(x[pos]))
+        restarts += 1
+        if restarts >= MAX_RENKO_RESTARTS:
+            break
+
+    d, ext = np.concatenate(dirs), np.concatenate(exts)
+    turn = np.flatnonzero(d[1:] != d[:-1])
+    starts, swing_dirs, ends = start + np.r_[0, turn + 1], d[np.r_[0, turn + 1]], ext[np.r_[turn, len(d) - 1]]
+    if bad is None:
+        return starts, swing_dirs, ends
+
+    # Too many restarts: the rest point by point (its first swing may continue our last)
+    more = _swings_reference(x, reversal, up_level, down_level, gap, pos, direction, extreme)
+    if more[1][0] == swing_dirs[-1]:
+        more, ends = (more[0][1:], more[1][1:], more[2]), ends[:-1]
+    return np.r_[starts, more[0]], np.r_[swing_dirs, more[1]], np.r_[ends, more[2]]
+
+
+def _swings_reference(x, reversal, up_level, down_level, gap, start, direction, extreme):
+    """Point-by-point _swings"""
+    starts, dirs, ends = [start], [direction], []
+    for i in range(start + 1, len(x)):
+        if direction > 0:
+            if x[i] <= extreme - reversal:
+                ends.append(extreme)
+                direction, extreme = -1, down_level(x[i])
+                starts.append(i); dirs.append(direction)
+            else:
+                extreme = max(extreme, up_level(x[i]))
+        else:
+            if x[i] >= extreme + reversal:
+                ends.append(extreme)
+                direction, extreme = 1, up_level(x[i])
+                starts.append(i); dirs.append(direction)
+            else:
+                extreme = min(extreme, down_level(x[i]))
+
+    ends.append(extreme)
+    return np.asarray(starts), np.asarray(dirs), np.asarray(ends, dtype=np.float64)
+
+
+def _identity(v):
+    return v
+
+
+# ==================== KAGI ====================
+
+def _kagi_frame(t, c, starts, dirs, ends) -> pd.DataFrame:
+    opens = np.r_[c[0], ends[:-1]]
+
+    # Yang (thick) once an up line tops the previous shoulder, yin (thin)
+    # once a down line drops below the previous waist; the first line sets it
+    before = np.r_[np.nan, np.nan, ends][:len(ends)]
+    event = np.where((dirs > 0) & (ends > before), 1, np.where((dirs < 0) & (ends < before), -1, 0))
+    event[0] = dirs[0]
+    last = np.maximum.accumulate(np.where(event != 0, np.arange(len(event)), 0))
+
+    return _frame(t[starts], opens, ends, yang=event[last] > 0)
+
+
+def _kagi_start(c: np.ndarray, reversal: float):
+    """(index, direction) of the first move of `reversal` away from the first close, or None"""
+    moved = np.flatnonzero(np.abs(c - c[0]) >= reversal) if len(c) else []
+    if not len(moved):
+        return None
+    j = int(moved[0])
+    return j, (1 if c[j] > c[0] else -1)
+
+
+def kagi(df: pd.DataFrame, reversal: float = None) -> pd.DataFrame:
+    """
+    Kagi lines on closes: the first line starts at the first close and runs
+    in the direction of the first move of `reversal`; a line keeps extending
+    until the close turns back by `reversal` from its extreme. One row per
+    line (time = candle that started it) with its thickness at the end.
+    """
+    return _kagi(df, reversal, _swings)
+
+
+def _kagi_reference(df: pd.DataFrame, reversal: float = None) -> pd.DataFrame:
+    return _kagi(df, reversal, _swings_reference)
+
+
+def _kagi(df, reversal, swings):
+    if not reversal or reversal <= 0:
+        raise ValueError("kagi needs reversal > 0")
+    t, c = df['time'].to_numpy(dtype=np.int64), df['close'].to_numpy(dtype=np.float64)
+    first = _kagi_start(c, reversal)
+    if first is None:
+        return pd.DataFrame(columns=COLUMNS + ['yang'])
+
+    j, direction = first
+    starts, dirs, ends = swings(c, reversal, _identity, _identity, 0, j, direction, c[j])
+    return _kagi_frame(t, c, starts, dirs, ends)
+
+
+# ==================== POINT & FIGURE ====================
+
+def _pnf_start(q: np.ndarray):
+    """(index, direction) of the first close a whole box away from the first one, or None"""
+    if not len(q):
+        return None
+    up = np.floor(q) >= np.floor(q[0]) + 1
+    down = np.ceil(q) <= np.ceil(q[0]) - 1
+    moved = np.flatnonzero(up | down)
+    if not len(moved):
+        return None
+    j = int(moved[0])
+    return j, (1 if up[j] else -1)
+
+
+def point_figure(df: pd.DataFrame, box_size: float = None, reversal: int = 3) -> pd.DataFrame:
+    """
+    Point & Figure on closes in boxes of `box_size`. An X column rises to the
+    highest whole box the close reached and gives way to an O column when the
+    close falls `reversal` boxes below its top (mirrored for O columns). A new
+    column starts one box beyond the previous column's end.
+
+    One row per column: open → close in the column's direction, the column
+    type ("X" / "O") and its box count.
+    """
+    return _point_figure(df, box_size, reversal, _swings)
+
+
+def _point_figure_reference(df: pd.DataFrame, box_size: float = None, reversal: int = 3) -> pd.DataFrame:
+    return _point_figure(df, box_size, reversal, _swings_reference)
+
+
+def _point_figure(df, box_size, reversal, swings):
+    if not box_size or box_size <= 0:
+        raise ValueError("point_figure needs box_size > 0")
+    if reversal < 1:
+        raise ValueError("reversal must be at least 1 box")
+    t, c = df['time'].to_numpy(dtype=np.int64), df['close'].to_numpy(dtype=np.float64)
+    q = c / box_size
+    first = _pnf_start(q)
+    if first is None:
+        return pd.DataFrame(columns=COLUMNS + ['column', 'boxes'])
+
+    j, direction = first
+    level = np.floor if direction > 0 else np.ceil
+    starts, dirs, ends = swings(q, reversal, np.floor, np.ceil, 1, j, direction, level(q[j]))
+
+    # Box levels: a column begins one box past where the previous one ended
+    previous = np.r_[np.floor(q[0]) if direction > 0 else np.ceil(q[0]), ends[:-1]]
+    begin = previous + dirs
+    boxes = (np.abs(ends - begin) + 1).astype(np.int64)
+
+    return _frame(t[starts], begin * box_size, ends * box_size,
+                  column=np.where(dirs > 0, "X", "O"), boxes=boxes)
+
+
+# ==================== REGISTRY ====================
+
+# name → (kernel, parameters it takes)
+TRANSFORMS = {
+    "heikin_ashi":  (heikin_ashi, ()),
+    "line_break":   (line_break, ("lines",)),
+    "kagi":         (kagi, ("reversal",)),
+    "point_figure": (point_figure, ("box_size", "reversal")),
+}
+
+
+def transform_params(transform: str, params: dict) -> dict:
+    """The parameters `transform` takes, from `params` (None = use its default)"""
+    if transform not in TRANSFORMS:
+        raise ValueError(f"transform must be one of {', '.join(TRANSFORMS)}")
+    _, names = TRANSFORMS[transform]
+    return {name: params[name] for name in names if params.get(name) is not None}
+
+
+def apply_transform(df: pd.DataFrame, transform: str, params: dict) -> pd.DataFrame:
+    """Run a registered transform over time/open/high/low/close candles"""
+    kernel, _ = TRANSFORMS[transform]
+    return kernel(df, **transform_params(transform, params))
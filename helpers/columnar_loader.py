@@ -0,0 +1,131 @@
+import bson
+import math
+import asyncio
+import numpy as np
+from bson.codec_options import CodecOptions, DatetimeConversion
+
+
+# ==================== COLUMN TYPES ====================
+
+FLOAT    = "float"      # float64, missing / non-numeric → NaN
+DATETIME = "datetime"   # datetime64[ms], missing → NaT
+
+# Dates stay as DatetimeMS (a plain int of epoch ms) instead of datetime objects
+_CODEC = CodecOptions(datetime_conversion=DatetimeConversion.DATETIME_MS)
+
+_NAT = np.iinfo(np.int64).min
+
+DEFAULT_BATCH_SIZE = 50000
+
+
+def _as_float(v):
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return v
+    return math.nan
+
+
+def _as_ms(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return _NAT
+
+
+# ==================== BATCH DECODING ====================
+
+def _decode_batch(raw: bytes, fields: dict) -> dict:
+    """One raw BSON batch → typed column arrays; the dicts die with this call"""
+    docs = bson.decode_all(raw, _CODEC)
+    n = len(docs)
+    columns = {}
+    for name, kind in fields.items():
+        values = (d.get(name) for d in docs)
+        if kind == FLOAT:
+            columns[name] = np.fromiter((_as_float(v) for v in values), dtype=np.float64, count=n)
+        elif kind == DATETIME:
+            columns[name] = np.fromiter((_as_ms(v) for v in values), dtype=np.int64, count=n).view("datetime64[ms]")
+        else:
+            raise ValueError(f"Unknown column type '{kind}' for field '{name}'")
+    return columns
+
+
+def iter_column_batches(
+    collection,
+    query: dict,
+    fields: dict,
+    sort=None,
+    limit: int = 0,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+):
+    """Stream a query as dicts of typed NumPy arrays, one per server batch"""
+    projection = {"_id": 0, **{name: 1 for name in fields}}
+    cursor = collection.find_raw_batches(
+        query,
+        projection,
+        sort=sort,
+        limit=limit or 0,
+        batch_size=batch_size,
+    )
+    for raw in cursor:
+        yield _decode_batch(raw, fields)
+
+
+def _concat_columns(chunks: dict, fields: dict) -> dict:
+    columns = {}
+    for name, kind in fields.items():
+        empty = np.empty(0, dtype=np.float64 if kind == FLOAT else "datetime64[ms]")
+        columns[name] = np.concatenate(chunks[name]) if chunks[name] else empty
+    return columns
+
+
+def load_columns(
+    collection,
+    query: dict,
+    fields: dict,
+    sort=None,
+    limit: int = 0,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> dict:
+    """
+    Run `query` and return {field: column} with one typed column per field:
+
+        load_columns(db.strategies_mtm_data, {"strategy": name},
+                     {"Date": DATETIME, "CumulativePnl": FLOAT}, sort=[("Date", 1)])
+
+    Documents are decoded one raw batch at a time, so the full result never
+    exists as a list of Python dicts.
+    """
+    chunks = {name: [] for name in fields}
+    for batch in iter_column_batches(collection, query, fields, sort, limit, batch_size):
+        for name, values in batch.items():
+            chunks[name].append(values)
+    return _concat_columns(chunks, fields)
+
+
+async def aload_columns(
+    collection,
+    query: dict,
+    fields: dict,
+    sort=None,
+    limit: int = 0,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> dict:
+    """
+    load_columns for an AsyncCollection: batches arrive without blocking the
+    event loop and each one is decoded on a worker thread.
+    """
+    chunks = {name: [] for name in fields}
+    projection = {"_id": 0, **{name: 1 for name in fields}}
+    cursor = collection.find_raw_batches(
+        query,
+        projection,
+        sort=sort,
+        limit=limit or 0,
+        batch_size=batch_size,
+    )
+    async for raw in cursor:
+        batch = await asyncio.to_thread(_decode_batch, raw, fields)
+        for name, values in batch.items():
+            chunks[name].append(values)
+    return _concat_columns(chunks, fields)
+
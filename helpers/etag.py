@@ -0,0 +1,49 @@
+import hashlib
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+
+# ==================== ETAGS ====================
+
+def make_etag(*parts) -> str:
+    """
+    ETag from a data-version marker plus everything else that shapes the
+    body (query window, resolution, negotiated format, ...). Weak, since the
+    compression middleware sends the same tag for br, gzip and identity bytes.
+    """
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """If-None-Match uses weak comparison: W/ prefixes are ignored, * matches anything"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag.removeprefix("W/"):
+            return True
+    return False
+
+
+def etag_headers(etag: str) -> dict:
+    # Clients may keep the body but must revalidate — a poll then costs one version lookup
+    return {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
+
+
+def json_with_etag(data, if_none_match) -> Response:
+    """
+    JSON response whose ETag is a hash of the body — for cheap listings that
+    have no version marker of their own; saves the transfer, not the query.
+    """
+    response = JSONResponse(jsonable_encoder(data))
+    etag = f'W/"{hashlib.sha1(response.body).hexdigest()}"'
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers.update(etag_headers(etag))
+    return response
@@ -188,27 +188,16 @@ def calculate_brick_size(df: pd.DataFrame, method: str, value: float, margin: fl
     return max(1, brick_size)
 
 
-# ==================== FAST NUMPY RENKO ====================
+# ==================== REFERENCE RENKO ====================
 
-def _build_renko_numpy(closes: np.ndarray, dates: np.ndarray, brick_size: float):
+def _reference_bricks(closes: np.ndarray, brick_price: float, brick_size: float):
     """
-    Pure NumPy Renko builder — O(n) single pass, no Python-level loop overhead
-    beyond the number of *bricks* formed (not candles).
+    The candle-by-candle close Renko walk, from `brick_price`. Returns the
+    candle index, open and close of every brick, plus the final brick price.
     """
-    n = len(closes)
-    if n == 0:
-        return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close'])
-
-    # Pre-allocate output arrays (worst case: every candle forms a brick)
-    max_bricks = n * 2          # generous upper bound
-    out_date  = np.empty(max_bricks, dtype=dates.dtype)
-    out_open  = np.empty(max_bricks, dtype=np.float64)
-    out_close = np.empty(max_bricks, dtype=np.float64)
+    out_idx, out_open, out_close = [], [], []
 
-    brick_price = closes[0]
-    count = 0
-
-    for i in range(1, n):
+    for i in range(len(closes)):
         close = closes[i]
         diff  = close - brick_price
         steps = int(abs(diff) / brick_size)
@@ -221,25 +210,194 @@ def _build_renko_numpy(closes: np.ndarray, dates: np.ndarray, brick_size: float)
 
         for _ in range(steps):
             new_price = brick_price + step_val
-            out_date[count]  = dates[i]
-            out_open[count]  = brick_price
-            out_close[count] = new_price
-            brick_price      = new_price
-            count           += 1
-
-    # Trim to actual size
-    out_date  = out_date[:count]
-    out_open  = out_open[:count]
-    out_close = out_close[:count]
-
-    renko_df = pd.DataFrame({
-        'date':  out_date,
+            out_idx.append(i)
+            out_open.append(brick_price)
+            out_close.append(new_price)
+            brick_price = new_price
+
+    return (
+        np.asarray(out_idx, dtype=np.int64),
+        np.asarray(out_open, dtype=np.float64),
+        np.asarray(out_close, dtype=np.float64),
+        brick_price,
+    )
+
+
+def _renko_frame(dates: np.ndarray, out_open: np.ndarray, out_close: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame({
+        'date':  dates,
         'open':  out_open,
         'high':  np.maximum(out_open, out_close),
         'low':   np.minimum(out_open, out_close),
         'close': out_close,
     })
-    return renko_df
+
+
+def _build_renko_reference(closes: np.ndarray, dates: np.ndarray, brick_size: float):
+    """
+    Plain-loop Renko builder: the first close seeds the brick price, every
+    later candle forms as many whole bricks as its close has moved away.
+    The definition _build_renko_numpy must match brick for brick.
+    """
+    if len(closes) == 0:
+        return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close'])
+
+    idx, out_open, out_close, _ = _reference_bricks(closes[1:], closes[0], brick_size)
+    return _renko_frame(dates[1:][idx], out_open, out_close)
+
+
+def _build_ohlc_renko_reference(opens, highs, lows, closes, dates, brick_size: float):
+    """
+    Plain-loop OHLC Renko: the first open seeds the brick price, then every
+    candle walks open → low → high → close when it closed up (close >= open)
+    and open → high → low → close when it closed down, forming whole bricks
+    at each point like the close walk. What renko_path + walk_renko must match.
+    """
+    if len(closes) == 0:
+        return pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close'])
+
+    out_date, out_open, out_close = [], [], []
+    brick_price = opens[0]
+    for i in range(len(closes)):
+        if closes[i] >= opens[i]:
+            points = (opens[i], lows[i], highs[i], closes[i])
+        else:
+            points = (opens[i], highs[i], lows[i], closes[i])
+        _, bo, bc, brick_price = _reference_bricks(np.asarray(points), brick_price, brick_size)
+        out_date.extend([dates[i]] * len(bo))
+        out_open.extend(bo)
+        out_close.extend(bc)
+
+    return _renko_frame(np.asarray(out_date, dtype=dates.dtype),
+                        np.asarray(out_open, dtype=np.float64),
+                        np.asarray(out_close, dtype=np.float64))
+
+
+# ==================== FAST NUMPY RENKO ====================
+
+# Segments re-vectorized after a float mismatch before the rest goes to the loop
+MAX_RENKO_RESTARTS = 16
+
+
+def _clamp_scan(lo: np.ndarray, hi: np.ndarray):
+    """
+    Inclusive prefix composition of k -> clip(k, lo[i], hi[i]) (Hillis–Steele).
+    Clamps compose into clamps, so the prefix up to i is clip(k, A[i], B[i]).
+
+    Two shortcuts keep it well under log2(n) full passes: a run of identical
+    clamps acts like one (clip is idempotent), so runs are collapsed first;
+    and a prefix that has become constant (A == B) can't change any more, so
+    each doubling step only touches the prefixes still open.
+    """
+    changed = np.r_[True, (lo[1:] != lo[:-1]) | (hi[1:] != hi[:-1])]
+    A, B = lo[changed], hi[changed]
+
+    active = np.flatnonzero(A != B)
+    d = 1
+    while len(active):
+        active = active[active >= d]
+        # Earlier prefix (ending at i-d) first, then the window ending at i
+        prev_a, prev_b = A[active - d], B[active - d]
+        cur_a, cur_b = A[active], B[active]
+        A[active] = np.minimum(np.maximum(prev_a, cur_a), cur_b)
+        B[active] = np.minimum(np.maximum(prev_b, cur_a), cur_b)
+        active = active[A[active] != B[active]]
+        d *= 2
+
+    run = np.cumsum(changed) - 1
+    return A[run], B[run]
+
+
+def _renko_segment(closes: np.ndarray, brick_price: float, brick_size: float):
+    """
+    Vectorized _reference_bricks for candles `closes`, from `brick_price`.
+
+    In brick units x = (close - p0) / size, the brick level moves to
+    floor(x) when x is a whole brick above it, to ceil(x) when a whole
+    brick below, and stays otherwise — i.e. k_i = clip(k_{i-1}, floor x_i,
+    ceil x_i), a clamp scan. Brick prices are then the same running sums the
+    loop performs. Finally each candle's decision is re-checked with the
+    loop's exact float arithmetic against the brick price it actually saw.
+
+    Returns (idx, opens, closes, final_price, bad): `bad` is the first candle
+    whose check failed (bricks are only returned for candles before it), or None.
+    """
+    x = (closes - brick_price) / brick_size
+    A, B = _clamp_scan(np.floor(x), np.ceil(x))
+    levels = np.clip(0.0, A, B)
+
+    deltas = np.diff(levels, prepend=0.0)
+    counts = np.abs(deltas).astype(np.int64)
+    ends = np.cumsum(counts)
+    steps = np.repeat(np.sign(deltas) * brick_size, counts)
+
+    # prices[j] = brick price after j bricks, summed one brick at a time like the loop
+    prices = np.cumsum(np.r_[brick_price, steps])
+
+    seen = prices[ends - counts]            # brick price each candle starts from
+    diff = closes - seen
+    expect = np.trunc(np.abs(diff) / brick_size) * np.where(diff > 0, 1.0, -1.0)
+    mismatch = np.flatnonzero(expect != deltas)
+
+    bad = int(mismatch[0]) if len(mismatch) else None
+    keep = len(closes) if bad is None else bad
+    n_bricks = int(ends[keep - 1]) if keep else 0
+
+    idx = np.repeat(np.arange(keep), counts[:keep])
+    return idx, prices[:n_bricks], prices[1:n_bricks + 1], prices[n_bricks], bad
+
+
+def extend_renko(prices: np.ndarray, brick_price: float, brick_size: float):
+    """
+    Bricks formed by `prices` walking on from `brick_price` — the same
+    (idx, opens, closes, final_price) as _reference_bricks. A candle whose
+    float rounding disagrees with the scan (rare, at exact brick boundaries)
+    is taken through the loop and the scan resumes after it; NaN prices go
+    through the loop altogether.
+    """
+    n = len(prices)
+    if n == 0 or np.isnan(prices).any():
+        return _reference_bricks(prices, brick_price, brick_size)
+
+    parts_idx, parts_open, parts_close = [], [], []
+    start = 0
+    restarts = 0
+
+    while start < n:
+        if restarts >= MAX_RENKO_RESTARTS:
+            idx, opens, ends, brick_price = _reference_bricks(prices[start:], brick_price, brick_size)
+            bad = None
+        else:
+            idx, opens, ends, brick_price, bad = _renko_segment(prices[start:], brick_price, brick_size)
+        parts_idx.append(idx + start)
+        parts_open.append(opens)
+        parts_close.append(ends)
+        if bad is None:
+            break
+
+        # Exact step for the disputed candle, then back to the scan
+        at = start + bad
+        idx, opens, ends, brick_price = _reference_bricks(prices[at:at + 1], brick_price, brick_size)
+        parts_idx.append(idx + at)
+        parts_open.append(opens)
+        parts_close.append(ends)
+        start = at + 1
+        restarts += 1
+
+    return np.concatenate(parts_idx), np.concatenate(parts_open), np.concatenate(parts_close), brick_price
+
+
+def _build_renko_numpy(closes: np.ndarray, dates: np.ndarray, brick_size: float):
+    """
+    Array-only Renko builder, brick-for-brick identical to
+    _build_renko_reference: the first close seeds the brick price and
+    extend_renko walks the rest.
+    """
+    if len(closes) < 2 or np.isnan(closes).any():
+        return _build_renko_reference(closes, dates, brick_size)
+
+    idx, out_open, out_close, _ = extend_renko(closes[1:], closes[0], brick_size)
+    return _renko_frame(dates[1:][idx], out_open, out_close)
 
 
 # ==================== DUPLICATE DATE FIX ====================
@@ -254,6 +412,30 @@ def fix_duplicate_dates(df: pd.DataFrame) -> pd.DataFrame:
 
 # ==================== PUBLIC API ====================
 
+def renko_path(df: pd.DataFrame, brick_type: str) -> np.ndarray:
+    """
+    The prices each candle walks through, one row per candle:
+    'close' → [close]; 'ohlc' → the intra-bar path, open → low → high → close
+    for an up candle (close >= open) and open → high → low → close for a
+    down candle.
+    """
+    if brick_type == "close":
+        return df["close"].values.astype(np.float64)[:, None]
+
+    if brick_type == "ohlc":
+        o, h, l, c = (df[col].values.astype(np.float64) for col in ("open", "high", "low", "close"))
+        up = (c >= o)[:, None]
+        return np.where(up, np.stack([o, l, h, c], axis=1), np.stack([o, h, l, c], axis=1))
+
+    raise ValueError("brick_type must be 'close' or 'ohlc'")
+
+
+def walk_renko(path: np.ndarray, brick_price: float, brick_size: float):
+    """extend_renko over a renko_path; brick indexes point at candles (path rows)"""
+    idx, opens, closes, final_price = extend_renko(path.ravel(), brick_price, brick_size)
+    return idx // path.shape[1], opens, closes, final_price
+
+
 def generate_renko(
     df: pd.DataFrame,
     brick_type: str  = "close",
@@ -268,7 +450,7 @@ def generate_renko(
     Parameters
     ----------
     df         : DataFrame with columns time/timestamp/date, open, high, low, close
-    brick_type : 'close' (use only close prices) or 'ohlc' (use high/low extremes)
+    brick_type : 'close' (use only close prices) or 'ohlc' (walk each candle's open/high/low/close path)
     method     : 'atr' | 'percentage' | 'traditional'
     value      : ATR period / percentage / absolute value
     save_csv   : write renko_csv to disk when True
@@ -292,22 +474,13 @@ def generate_renko(
 
     brick_size = calculate_brick_size(df, method, value, margin)
 
-    if brick_type == "close":
-        closes = df["close"].values.astype(np.float64)
-        dates  = df["date"].values
-        renko_df = _build_renko_numpy(closes, dates, brick_size)
-
-    elif brick_type == "ohlc":
-        # For OHLC mode: interleave highs and lows so each candle can form
-        # both up and down bricks — standard OHLC Renko convention.
-        # We alternate: if previous brick was up → check low first, then high
-        # (conservative). Simple fast approach: use (high+low)/2 mid-prices.
-        mids  = ((df["high"] + df["low"]) / 2).values.astype(np.float64)
-        dates = df["date"].values
-        renko_df = _build_renko_numpy(mids, dates, brick_size)
-
+    # The first price seeds the brick price (it can't form a brick itself)
+    path = renko_path(df, brick_type)
+    if len(path):
+        idx, out_open, out_close, _ = walk_renko(path, path[0, 0], brick_size)
+        renko_df = _renko_frame(df["date"].values[idx], out_open, out_close)
     else:
-        raise ValueError("brick_type must be 'close' or 'ohlc'")
+        renko_df = pd.DataFrame(columns=['date', 'open', 'high', 'low', 'close'])
 
     renko_final = fix_duplicate_dates(renko_df)
 
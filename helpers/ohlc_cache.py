@@ -0,0 +1,68 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+# ==================== OHLC RESULT CACHE ====================
+
+class OHLCCache:
+    """
+    In-process LRU + TTL cache for built OHLC series.
+
+    Every entry is stored with the data-version marker of its source
+    (last Date of a strategy, the files doc of an upload, the config hash of
+    a portfolio, ...). A lookup only hits when the caller's current marker
+    matches, so new data invalidates the entry without any explicit purge.
+    """
+
+    _MISS = object()
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()       # key → (version, stored_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version, default=None):
+        with self._lock:
+            entry = self._entries.get(key, self._MISS)
+            if entry is self._MISS:
+                self.misses += 1
+                return default
+
+            cached_version, stored_at, value = entry
+            if cached_version != version or time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, match):
+        """Drop every entry whose key satisfies `match(key)`"""
+        with self._lock:
+            for key in [k for k in self._entries if match(k)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Shared by the strategy, portfolio and file services
+ohlc_cache = OHLCCache()
@@ -0,0 +1,204 @@
+import json
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+try:
+    import pyarrow as pa
+except ImportError:     # Arrow IPC is optional
+    pa = None
+
+
+# ==================== MEDIA TYPES ====================
+
+JSON          = "application/json"                              # list of candle objects (default)
+COLUMNAR_JSON = "application/vnd.finsage.columnar+json"         # {"time": [...], "open": [...], ...}
+MSGPACK       = "application/msgpack"                           # same map as columnar JSON
+ARROW_STREAM  = "application/vnd.apache.arrow.stream"           # one record batch, needs pyarrow
+
+MEDIA_TYPES = {
+    JSON:                    JSON,
+    COLUMNAR_JSON:           COLUMNAR_JSON,
+    MSGPACK:                 MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    ARROW_STREAM:            ARROW_STREAM,
+    "*/*":                   JSON,
+    "application/*":         JSON,
+}
+
+
+def negotiate_format(accept) -> str:
+    """
+    Pick the response format from an Accept header (highest q wins, first
+    listed on ties). No header → JSON; nothing acceptable → 406.
+    """
+    if not accept:
+        return JSON
+
+    best, best_q = None, 0.0
+    for part in accept.split(","):
+        media, *params = [p.strip() for p in part.split(";")]
+        fmt = MEDIA_TYPES.get(media.lower())
+        if fmt is None or (fmt == ARROW_STREAM and pa is None):
+            continue
+
+        q = 1.0
+        for param in params:
+            name, _, val = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(val)
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = fmt, q
+
+    if best is None:
+        available = [JSON, COLUMNAR_JSON, MSGPACK] + ([ARROW_STREAM] if pa is not None else [])
+        raise HTTPException(
+            status_code=406,
+            detail=f"Not acceptable: '{accept}'. Available: {', '.join(available)}"
+        )
+    return best
+
+
+# ==================== ENCODERS ====================
+
+def ohlc_records(df: pd.DataFrame) -> list:
+    """Row-oriented JSON records; JSON has no inf / NaN, so those become null"""
+    floats = [c for c in df.columns if df[c].dtype.kind == "f"]
+    if floats:
+        values = df[floats].to_numpy()
+        if not np.isfinite(values).all():
+            df = df.astype({c: object for c in floats})
+            df[floats] = df[floats].where(np.isfinite(values), None)
+    return df.to_dict(orient="records")
+
+
+def _json_column(values: np.ndarray) -> list:
+    if values.dtype.kind == "f" and not np.isfinite(values).all():
+        return np.where(np.isfinite(values), values, None).tolist()
+    return values.tolist()
+
+
+def encode_columnar_json(df: pd.DataFrame) -> bytes:
+    columns = {name: _json_column(df[name].to_numpy()) for name in df.columns}
+    return json.dumps(columns, separators=(",", ":"), allow_nan=False).encode()
+
+
+def _msgpack_header(n: int, fix: int, fix_max: int, tag16: int, tag32: int, tag8: int = None) -> bytes:
+    if n <= fix_max:
+        return bytes([fix | n])
+    if tag8 is not None and n < 1 << 8:
+        return bytes([tag8, n])
+    if n < 1 << 16:
+        return bytes([tag16]) + n.to_bytes(2, "big")
+    return bytes([tag32]) + n.to_bytes(4, "big")
+
+
+def _msgpack_str(s: str) -> bytes:
+    b = s.encode()
+    return _msgpack_header(len(b), 0xa0, 31, 0xda, 0xdb, tag8=0xd9) + b
+
+
+def _msgpack_fixed(values: np.ndarray, tag: int, dtype: str) -> bytes:
+    """Every element as tag byte + big-endian value, laid out straight from the buffer"""
+    packed = np.empty(len(values), dtype=[("tag", "u1"), ("v", dtype)])
+    packed["tag"] = tag
+    packed["v"] = values
+    return packed.tobytes()
+
+
+def _msgpack_column(values: np.ndarray) -> bytes:
+    kind = values.dtype.kind
+    head = _msgpack_header(len(values), 0x90, 15, 0xdc, 0xdd)
+
+    if kind == "f":
+        return head + _msgpack_fixed(values, 0xcb, ">f8")
+    if kind == "i":
+        return head + _msgpack_fixed(values, 0xd3, ">i8")
+    if kind == "u":
+        return head + _msgpack_fixed(values, 0xcf, ">u8")
+    if kind == "b":
+        return head + np.where(values, 0xc3, 0xc2).astype(np.uint8).tobytes()
+
+    # Strings: fixed-width ones (dates) pack in one go, anything else per value
+    encoded = np.char.encode(values.astype(str), "utf-8")
+    width = encoded.dtype.itemsize
+    if len(encoded) and width < 32 and (np.char.str_len(encoded) == width).all():
+        return head + _msgpack_fixed(encoded, 0xa0 | width, f"S{width}")
+    return head + b"".join(_msgpack_str(str(v)) for v in values)
+
+
+def encode_msgpack(df: pd.DataFrame) -> bytes:
+    """Columnar map {column: array} in MessagePack, built without per-row objects"""
+    parts = [_msgpack_header(len(df.columns), 0x80, 15, 0xde, 0xdf)]
+    for name in df.columns:
+        parts.append(_msgpack_str(str(name)))
+        parts.append(_msgpack_column(df[name].to_numpy()))
+    return b"".join(parts)
+
+
+def encode_arrow_stream(df: pd.DataFrame) -> bytes:
+    batch = pa.RecordBatch.from_arrays(
+        [pa.array(df[name].to_numpy()) for name in df.columns],
+        names=[str(name) for name in df.columns],
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+# ==================== STREAMING JSON ====================
+
+def _json_tokens(values: np.ndarray) -> list:
+    """One JSON literal per element, spelled exactly like json.dumps would"""
+    if values.dtype.kind in "iuf":
+        tokens = list(map(repr, values.tolist()))
+        if values.dtype.kind == "f":
+            for i in np.flatnonzero(~np.isfinite(values)):
+                tokens[i] = "null"
+        return tokens
+    return [json.dumps(v, ensure_ascii=False) for v in values.tolist()]
+
+
+def iter_json_records(frames):
+    """
+    Serialize a sequence of OHLC frames as one JSON array of candle objects,
+    a chunk of bytes per frame — byte-for-byte what JSONResponse would send
+    for the concatenated frame, without ever holding all of it.
+    """
+    yield b"["
+    first = True
+    for df in frames:
+        if df.empty:
+            continue
+        template = "{" + ",".join(f'{json.dumps(str(c))}:%s' for c in df.columns) + "}"
+        columns = [_json_tokens(df[c].to_numpy()) for c in df.columns]
+        body = ",".join(template % row for row in zip(*columns))
+        yield (body if first else "," + body).encode()
+        first = False
+    yield b"]"
+
+
+def streaming_ohlc_response(frames, headers: dict = None) -> StreamingResponse:
+    """JSON records streamed frame by frame; a sync iterator is drained on the threadpool"""
+    headers = {**(headers or {}), "Vary": "Accept"}
+    return StreamingResponse(iter_json_records(frames), media_type=JSON, headers=headers)
+
+
+# ==================== RESPONSE ====================
+
+def ohlc_response(df: pd.DataFrame, fmt: str = JSON, headers: dict = None) -> Response:
+    """Serialize an OHLC frame in the negotiated format"""
+    headers = {**(headers or {}), "Vary": "Accept"}
+
+    if fmt == COLUMNAR_JSON:
+        return Response(encode_columnar_json(df), media_type=COLUMNAR_JSON, headers=headers)
+    if fmt == MSGPACK:
+        return Response(encode_msgpack(df), media_type=MSGPACK, headers=headers)
+    if fmt == ARROW_STREAM:
+        return Response(encode_arrow_stream(df), media_type=ARROW_STREAM, headers=headers)
+    return JSONResponse(ohlc_records(df), headers=headers)
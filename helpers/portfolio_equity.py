@@ -0,0 +1,53 @@
+import numpy as np
+
+
+# ==================== K-WAY MERGE EQUITY ENGINE ====================
+
+def _step_series(time_ns, values):
+    """
+    One strategy's sorted (time, cumulative) series → (time, delta) steps.
+    Missing values keep the previous level, duplicate timestamps keep the last
+    value, and every delta is the change of this strategy's running value.
+    """
+    time_ns = np.asarray(time_ns, dtype=np.int64)
+    values  = np.asarray(values, dtype=np.float64)
+
+    keep = ~np.isnan(values)
+    time_ns, values = time_ns[keep], values[keep]
+    if not len(time_ns):
+        return time_ns, values
+
+    last = np.r_[time_ns[1:] != time_ns[:-1], True]
+    time_ns, values = time_ns[last], values[last]
+
+    return time_ns, np.diff(values, prepend=0.0)
+
+
+def merge_equity(series):
+    """
+    Merge lot-scaled cumulative series into one portfolio equity path:
+
+        time, equity = merge_equity([(t_a, cumul_a), (t_b, cumul_b), ...])
+
+    Each input must be sorted by time. At every distinct timestamp the
+    equity is the sum of each strategy's last known value (strategies that
+    have not started yet count as 0) — the same numbers as
+    pivot_table(...).ffill().sum(axis=1), without the dense
+    timestamps × strategies matrix. Memory stays O(total rows).
+    """
+    steps = [_step_series(t, v) for t, v in series]
+    steps = [s for s in steps if len(s[0])]
+    if not steps:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    time_ns = np.concatenate([t for t, _ in steps])
+    deltas  = np.concatenate([d for _, d in steps])
+
+    # Stable sort over k pre-sorted runs = k-way merge (timsort merges the runs)
+    order   = np.argsort(time_ns, kind="stable")
+    time_ns = time_ns[order]
+    equity  = np.cumsum(deltas[order])
+
+    # Running sum after the last update of each timestamp
+    last = np.r_[time_ns[1:] != time_ns[:-1], True]
+    return time_ns[last], equity[last]
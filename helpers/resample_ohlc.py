@@ -0,0 +1,120 @@
+import pandas as pd
+import numpy as np
+
+
+# ==================== RESOLUTIONS ====================
+
+MINUTE_MS = 60 * 1000
+HOUR_MS   = 60 * MINUTE_MS
+DAY_MS    = 24 * HOUR_MS
+WEEK_MS   = 7 * DAY_MS
+
+# Buckets follow the IST wall clock (days start at 00:00 IST, hours at :00 IST)
+IST_OFFSET_MS = 19800 * 1000
+
+# 1970-01-01 was a Thursday — shift weekly buckets so they start on Monday
+WEEK_ANCHOR_MS = 4 * DAY_MS
+
+RESOLUTION_MS = {
+    "1":  MINUTE_MS,
+    "5":  5 * MINUTE_MS,
+    "15": 15 * MINUTE_MS,
+    "60": HOUR_MS,
+    "1D": DAY_MS,
+    "D":  DAY_MS,
+    "1W": WEEK_MS,
+    "W":  WEEK_MS,
+}
+
+# For Query(..., pattern=RESOLUTION_PATTERN) on the routes
+RESOLUTION_PATTERN = "^(1|5|15|60|1D|D|1W|W)$"
+
+
+def resolution_to_ms(resolution):
+    """Bucket width in ms, None for raw (one candle per stored row)"""
+    if not resolution:
+        return None
+    if resolution not in RESOLUTION_MS:
+        raise ValueError(f"Unsupported resolution '{resolution}'")
+    return RESOLUTION_MS[resolution]
+
+
+def bucket_start(time_ms, bucket_ms: int):
+    """Start (UTC ms) of the bucket holding `time_ms` — works on ints and arrays"""
+    anchor = WEEK_ANCHOR_MS if bucket_ms == WEEK_MS else 0
+    shifted = time_ms + IST_OFFSET_MS - anchor
+    return (shifted // bucket_ms) * bucket_ms + anchor - IST_OFFSET_MS
+
+
+# ==================== RESAMPLER ====================
+
+def resample_ohlc(df: pd.DataFrame, resolution) -> pd.DataFrame:
+    """
+    Aggregate time-sorted candles (time in ms, open/high/low/close) into
+    `resolution` buckets — first open, max high, min low, last close.
+
+    Every candle opens at the previous candle's close, so a bucket's open is
+    the previous bucket's close (or the window's seed close for the first one).
+    """
+    bucket_ms = resolution_to_ms(resolution)
+    if bucket_ms is None or df.empty:
+        return df
+
+    time    = df["time"].to_numpy().astype(np.int64)
+    buckets = bucket_start(time, bucket_ms)
+
+    # Index of the first candle of every bucket
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends   = np.r_[starts[1:], len(buckets)] - 1
+
+    high = df["high"].to_numpy(dtype=np.float64)
+    low  = df["low"].to_numpy(dtype=np.float64)
+
+    return pd.DataFrame({
+        "time":  buckets[starts],
+        "open":  df["open"].to_numpy(dtype=np.float64)[starts],
+        "high":  np.fmax.reduceat(high, starts),     # fmax/fmin skip NaN
+        "low":   np.fmin.reduceat(low, starts),
+        "close": df["close"].to_numpy(dtype=np.float64)[ends],
+    })
+
+
+# ==================== CANDLE BUILDER ====================
+
+def candles_from_equity(time_ms, equity, prev_close=None) -> pd.DataFrame:
+    """
+    One candle per point of an equity path: close = the point, open = the
+    previous point (`prev_close` or the point itself for the first candle).
+    """
+    close = np.asarray(equity, dtype=np.float64)
+    open_ = np.empty_like(close)
+    if len(close):
+        open_[1:] = close[:-1]
+        open_[0] = close[0] if prev_close is None else prev_close
+        open_ = np.where(np.isnan(open_), close, open_)
+
+    return pd.DataFrame({
+        "time":  time_ms,
+        "open":  open_,
+        "high":  np.fmax(open_, close),
+        "low":   np.fmin(open_, close),
+        "close": close,
+    })
+
+
+def candles_from_opens(time_ms, open_, close) -> pd.DataFrame:
+    """Candles whose opens were stored alongside the closes (cleaned uploads)"""
+    open_ = np.asarray(open_, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    return pd.DataFrame({
+        "time":  time_ms,
+        "open":  open_,
+        "high":  np.maximum(open_, close),
+        "low":   np.minimum(open_, close),
+        "close": close,
+    })
+
+
+def empty_ohlc() -> pd.DataFrame:
+    """Zero-row candle frame with the usual columns and dtypes"""
+    return candles_from_equity(np.empty(0, dtype=np.int64), np.empty(0))
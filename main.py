@@ -1,8 +1,9 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from routes import strategy_ohlc, upload_file, portfolio_ohlc, chart_layout, renko_ohlc
+from routes import strategy_ohlc, upload_file, portfolio_ohlc, chart_layout, renko_ohlc, chart_transforms
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
+from brotli_asgi import BrotliMiddleware
 
 app = FastAPI(
     title="FinSageAI MTM Strategy API",
@@ -23,14 +24,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-No-Data", "X-Next-Time", "X-Next-Cursor", "ETag"],  # datafeed paging hints + revalidation
 )
 
+# Compress large bodies (OHLC series, listings) when the client accepts it
+COMPRESS_MIN_BYTES = 1024
+# br when accepted, else gzip
+app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_BYTES, gzip_fallback=True)
+
 # include router
 app.include_router(strategy_ohlc.router)
 app.include_router(upload_file.router)
 app.include_router(portfolio_ohlc.router)
 app.include_router(chart_layout.router)
 app.include_router(renko_ohlc.router)
+app.include_router(chart_transforms.router)
 
 @app.get("/")
 def home():
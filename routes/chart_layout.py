@@ -7,7 +7,7 @@ import json
 import datetime
 from io import StringIO
 from logger_setup import logger
-from database import get_infra_db
+from database import get_infra_db, get_infra_async_db
 
 router = APIRouter(prefix="/api", tags=["chart_layout"])
 
@@ -22,6 +22,17 @@ def get_db():
             detail="Infra tools Database is down"
         )
 
+async def get_async_db():
+    try:
+        db = await get_infra_async_db()
+        return db
+    except Exception as e:
+        logger.error(f"DB unavailable: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Infra tools Database is down"
+        )
+
 def get_collections(db=Depends(get_db)):
     return {
         "chart_layouts": db.chart_layouts
@@ -38,8 +49,8 @@ async def save_chart(
     content: Optional[str] = Form(None),
     symbol: Optional[str] = Form(None),
     resolution: Optional[str] = Form(None),
+    adb=Depends(get_async_db),
 ):  
-    db = get_infra_db()
 
     # If it was sent as JSON (some older TradingView versions / Firefox)
     if name is None and content is None:
@@ -77,7 +88,7 @@ async def save_chart(
     }
 
     try:
-        result = db.charts_layout.insert_one(doc)
+        result = await adb.charts_layout.insert_one(doc)
         logger.info(f"Chart saved successfully: {name}, id={result.inserted_id}")
         return JSONResponse({"status": "ok", "id": str(result.inserted_id)})
     except Exception as e:
@@ -88,16 +99,16 @@ async def save_chart(
 async def charts_endpoint(
     client_id: str = Query(..., alias="client"),
     user_id: str = Query(..., alias="user"),
-    chart: Optional[str] = Query(None, alias="chart")
+    chart: Optional[str] = Query(None, alias="chart"),
+    adb=Depends(get_async_db),
 ):
-    db = get_infra_db()
-    col = db.charts_layout
+    col = adb.charts_layout
     logger.info(f"Charts request: client={client_id}, user={user_id}, chart={chart}")
 
     if chart:
         # Load single chart
         try:
-            doc = col.find_one({
+            doc = await col.find_one({
                 "_id": ObjectId(chart),
                 "client_id": client_id,
                 "user_id": user_id
@@ -121,7 +132,7 @@ async def charts_endpoint(
     else:
         # List all
         charts = []
-        for doc in col.find({"client_id": client_id, "user_id": user_id}):
+        async for doc in col.find({"client_id": client_id, "user_id": user_id}):
             charts.append({
                 "id": str(doc["_id"]),
                 "name": doc["name"],
@@ -136,11 +147,11 @@ async def charts_endpoint(
 async def delete_chart(
     client_id: str = Query(..., alias="client"),
     user_id: str = Query(..., alias="user"),
-    chart: str = Query(..., alias="chart")
+    chart: str = Query(..., alias="chart"),
+    adb=Depends(get_async_db),
 ):
-    db = get_infra_db()
     try:
-        result = await db.charts_layout.delete_one({
+        result = await adb.charts_layout.delete_one({
             "_id": ObjectId(chart),
             "client_id": client_id,
             "user_id": user_id
@@ -0,0 +1,67 @@
+from fastapi import HTTPException, APIRouter, Header
+from logger_setup import logger
+from database import get_infra_db, get_finsage_db
+from services.transform_service import get_transform
+from helpers.ohlc_formats import negotiate_format, ohlc_response
+
+router = APIRouter(prefix="/api", tags=["transforms"])
+
+
+def get_db():
+    try:
+        db = get_infra_db()
+        return db
+    except Exception as e:
+        logger.error(f"DB unavailable: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Infra tools Database is down"
+        )
+
+def get_fin_db():
+    try:
+        db = get_finsage_db()
+        return db
+    except Exception as e:
+        logger.error(f"DB unavailable: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Finsage Database is down"
+        )
+
+
+@router.get("/get-transform")
+def make_transform_chart(
+    type,
+    name,
+    transform,
+    lines: int = None,
+    reversal: float = None,
+    box_size: float = None,
+    accept: str = Header(None)
+):
+    """
+    Heikin-Ashi / line break / Kagi / Point & Figure of a strategy, portfolio
+    or file. Parameters a transform doesn't take are ignored:
+
+    heikin_ashi  : —
+    line_break   : lines (default 3)
+    kagi         : reversal, in price
+    point_figure : box_size, in price; reversal, in boxes (default 3)
+
+    All but line_break are numpy scans. line_break stays a Python pass over
+    the closes — each line depends on the lines before it — at about 1 s per
+    million candles (benchmarks/bench_transforms.py); results are cached
+    until the source changes.
+    """
+    fmt = negotiate_format(accept)
+    # strategies / portfolios live in FinSage, uploads in infra
+    db = get_db() if type == 'file' else get_fin_db()
+
+    params = {"lines": lines, "reversal": reversal, "box_size": box_size}
+    if transform == "point_figure" and reversal is not None:
+        if reversal != int(reversal):
+            raise HTTPException(status_code=400, detail="point_figure reversal is a whole number of boxes")
+        params["reversal"] = int(reversal)
+
+    return ohlc_response(get_transform(type, name, transform, params, db), fmt)
@@ -1,4 +1,4 @@
-from fastapi import HTTPException, APIRouter, UploadFile, Depends, Query
+from fastapi import HTTPException, APIRouter, UploadFile, Depends, Query, Header
 from fastapi.responses import JSONResponse
 from bson import ObjectId
 import pandas as pd
@@ -10,10 +10,9 @@ from logger_setup import logger
 from pydantic import BaseModel
 from typing import List
 from database import get_infra_db, get_finsage_db
-from services.file_ohlc import get_file_ohlc
-from services.strategy_ohlc_service import get_strategy_ohlc
-from services.portfolio_ohlc_service import get_portfolio_ohlc
-from helpers.make_renko import generate_renko
+from services.renko_state import get_renko
+from services.renko_sweep import run_renko_sweep
+from helpers.ohlc_formats import negotiate_format, ohlc_response, ohlc_records
 
 import psutil, os
 
@@ -32,6 +31,18 @@ class RenkoRequest(BaseModel):
     value: float
     ohlc: List[dict]
 
+class RenkoCombination(BaseModel):
+    brick_type: str = "close"
+    method: str
+    value: float
+
+class RenkoSweepRequest(BaseModel):
+    type: str
+    name: str
+    margin: float
+    combinations: List[RenkoCombination]
+    include_bricks: bool = False
+
 # In your routers
 def get_db():
     try:
@@ -68,23 +79,25 @@ def make_renko_chart(
     value: float,
     type,
     name,
-    margin: float
+    margin: float,
+    from_ts: int = Query(None, alias="from"),
+    to_ts: int = Query(None, alias="to"),
+    accept: str = Header(None)
 ):  
-    ohlc_data = []
-    # get the ohlc data first
-    if type == 'strategy':
-        db = get_fin_db()
-        ohlc_data = get_strategy_ohlc(name, db)
-    elif type == 'portfolio':
-        db = get_fin_db()
-        ohlc_data = get_portfolio_ohlc(name, db)
-    elif type == 'file':
-        db = get_db()
-        ohlc_data = get_file_ohlc(name, db)
-
-    df = pd.DataFrame(ohlc_data)
-
-    renko_df, brick_size = generate_renko(df, brick_type, method, value, margin)
+    fmt = negotiate_format(accept)
+    # strategies / portfolios live in FinSage, uploads and the Renko state in infra
+    state_db = get_db()
+    db = state_db if type == 'file' else get_fin_db()
+
+    # Only the candles since the last call are turned into bricks
+    renko_df, brick_size = get_renko(type, name, brick_type, method, value, margin, db, state_db, from_ts, to_ts)
+
+    return ohlc_response(_chart_frame(renko_df), fmt)
+
+
+def _chart_frame(renko_df):
+    """Bricks as served to the charts: IST date string, time in ms, OHLC"""
+    renko_df = renko_df.copy()      # shared with the cache
 
     renko_df["date"] = pd.to_datetime(renko_df["date"])
 
@@ -98,6 +111,22 @@ def make_renko_chart(
         .dt.tz_convert("Asia/Kolkata")
         .dt.strftime("%Y-%m-%d %H:%M:%S")
     )    
-    out = renko_df[["date", "time", "open", "high", "low", "close"]].to_dict("records")
+    return renko_df[["date", "time", "open", "high", "low", "close"]]
+
+
+@router.post("/renko-sweep")
+def renko_sweep(request: RenkoSweepRequest):
+    """
+    Brick counts and run statistics for many (brick_type, method, value)
+    combinations of one strategy / portfolio / file, from a single load of
+    its series. `include_bricks` adds each combination's bricks as
+    /get-renko serves them.
+    """
+    db = get_db() if request.type == 'file' else get_fin_db()
 
-    return out
\ No newline at end of file
+    combinations = [c.model_dump() for c in request.combinations]
+    out = run_renko_sweep(request.type, request.name, combinations, request.margin, db, request.include_bricks)
+    for result in out["results"]:
+        if "renko" in result:
+            result["renko"] = ohlc_records(_chart_frame(result["renko"]))
+    return out
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Header
 from datetime import datetime, timezone
 from logger_setup import logger  
 import pandas as pd
 from database import get_finsage_db
-from services.strategy_ohlc_service import get_strategy_ohlc
+from services.strategy_ohlc_service import get_strategy_ohlc_frame, get_strategy_next_time, get_strategy_version
+from helpers.resample_ohlc import RESOLUTION_PATTERN
+from helpers.ohlc_formats import negotiate_format, ohlc_response
+from helpers.etag import make_etag, etag_matches, etag_headers, not_modified, json_with_etag
 
 router = APIRouter(prefix="/api", tags=["strategies"])
 
@@ -29,13 +32,14 @@ def convert_to_datetime_str(ts):
 
 @router.get("/strategies")
 def get_strategies( 
+    if_none_match: str = Header(None),
     db=Depends(get_db)):
     """Fetch all available strategies"""
     try:
         logger.info("Fetching list of strategies from MongoDB...")
         data = list(db.strategies.find({}, {"_id": 0, "strategy": 1, "segment": 1, "type": 1}))
         logger.info(f"Fetched {len(data)} strategies successfully.")
-        return data
+        return json_with_etag(data, if_none_match)
 
     except Exception as e:
         logger.error(f"Error while fetching strategies: {e}")
@@ -48,7 +52,31 @@ def get_strategy_mtm(
     from_ts: int = Query(None, alias="from"),
     to_ts: int = Query(None, alias="to"),
     count_back: int = Query(None, alias="countBack"),
+    resolution: str = Query(None, pattern=RESOLUTION_PATTERN),
+    accept: str = Header(None),
+    if_none_match: str = Header(None),
     db=Depends(get_db)
     ):
-    """Generate OHLC from CumulativePnl (15-min candles) using pandas for speed"""
-    return get_strategy_ohlc(strategy_name, db)
\ No newline at end of file
+    """
+    Generate OHLC from CumulativePnl (15-min candles) using pandas for speed.
+    An empty window sets X-No-Data / X-Next-Time so the datafeed can stop paging.
+    `Accept` picks JSON records, columnar JSON, MessagePack or Arrow IPC.
+    The ETag follows the strategy's latest Date, so an unchanged poll is a 304.
+    """
+    fmt = negotiate_format(accept)
+    version = get_strategy_version(strategy_name, db)
+    etag = make_etag("strategy", strategy_name, version, from_ts, to_ts, count_back, resolution, fmt)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    out = get_strategy_ohlc_frame(strategy_name, db, from_ts, to_ts, count_back, resolution, version)
+
+    headers = etag_headers(etag)
+    if out.empty and (from_ts is not None or to_ts is not None):
+        before_ts = to_ts if count_back or from_ts is None else from_ts
+        next_time = get_strategy_next_time(strategy_name, db, before_ts)
+        headers["X-No-Data"] = "true"
+        if next_time is not None:
+            headers["X-Next-Time"] = str(next_time)
+
+    return ohlc_response(out, fmt, headers)
\ No newline at end of file
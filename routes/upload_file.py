@@ -1,16 +1,36 @@
-from fastapi import HTTPException, APIRouter, UploadFile, Depends, Query
+from fastapi import HTTPException, APIRouter, UploadFile, Depends, Query, Header
 from fastapi.responses import JSONResponse
 from bson import ObjectId
+from bson.errors import InvalidId
 import pandas as pd
 import json
+import ijson
+import asyncio
 import datetime
+import os
+import shutil
+import tempfile
+import threading
 from io import StringIO
 from logger_setup import logger
 from database import get_infra_db
-from services.file_ohlc import get_file_ohlc
+from services.file_ingest import ingest_chunks, iter_csv_chunks, iter_record_chunks, iter_json_mtm, register_file, content_hash, find_duplicate
+from services.file_delete import delete_file_data
+from services.jobs import jobs
+from services.file_ohlc import get_file_ohlc_page, get_file_next_time, get_file_version, iter_file_ohlc, is_large_file
+from helpers.resample_ohlc import RESOLUTION_PATTERN
+from helpers.ohlc_formats import negotiate_format, ohlc_response, streaming_ohlc_response, JSON
+import itertools
+from helpers.etag import make_etag, etag_matches, etag_headers, not_modified, json_with_etag
 
 router = APIRouter(prefix="/api", tags=["file"])
 
+# Background uploads / in-flight deletes stay out of the listings
+LISTED = {"status": {"$nin": ["ingesting", "failed", "deleting"]}}
+
+# One claim-and-queue at a time, so a repeated DELETE sees the live job
+_delete_lock = threading.Lock()
+
 BATCH_SIZE = 5000   # Insert 5000 rows at a time (best performance)
 # In your routers
 def get_db():
@@ -39,115 +59,127 @@ def normalize_to_min_ceil(ts):
         return ts
     return ts + (60 - reminder)
 
-@router.post("/file/upload")
-async def upload_file(file: UploadFile, db=Depends(get_db)):
-    files_collection = db.files
-    timeseries_collection = db.timeseries_mtm
+def _file_chunks(fileobj, file_type: str):
+    if file_type == "csv":
+        return iter_csv_chunks(fileobj)
+    # Streamed item by item; a missing 'mtm' key raises 400 once the document is read
+    return iter_record_chunks(iter_json_mtm(fileobj))
 
-    if not file.filename.endswith((".csv", ".json")):
-        raise HTTPException(status_code=400, detail="Only CSV and JSON files allowed")
 
-    try:
-        file_content = await file.read()
-        
-        # Determine file type and parse accordingly
-        if file.filename.endswith(".csv"):
-            df = pd.read_csv(StringIO(file_content.decode("utf-8")))
-            records = df.to_dict(orient="records")
-            row_count = len(df)
-
-        elif file.filename.endswith(".json"):
-            json_data = json.loads(file_content.decode("utf-8"))
-
-            if "mtm" not in json_data:
-                raise HTTPException(
-                    status_code=400,
-                    detail="JSON must contain 'mtm' key with array of records"
-                )
+# Raised while parsing an upload whose bytes are not what its extension says
+PARSE_ERRORS = (json.JSONDecodeError, ijson.JSONError, UnicodeDecodeError)
 
-            records = []
-            for item in json_data["mtm"]:
-                record = {
-                    "Date": item.get("Date"),
-                    "CumulativePnl": item.get("CumulativePnl"),
-                }
-                records.append(record)
 
-            row_count = len(records)
+def _invalid_format(file_type: str) -> HTTPException:
+    return HTTPException(status_code=400, detail=f"Invalid {file_type.upper()} format")
 
-        for i, r in enumerate(records):
-            pnl = r.get("CumulativePnl")
-            if pnl is None or pd.isna(pnl):
-                logger.error("User tried to upload currupt file")
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Invalid CumulativePnl at row {i+1}"
-                )
-            
-        # Insert metadata
-        file_doc = {
-            "filename": file.filename,
-            "content_type": file.content_type,
-            "upload_date": datetime.datetime.utcnow(),
-            "total_rows": row_count,
-            "file_type": "json" if file.filename.endswith(".json") else "csv",
-        }
-        result = files_collection.insert_one(file_doc)
-        file_id = result.inserted_id
-
-        batch = []
-        for r in records:
-            # Create timestamp directly from "Date"
-            raw_date = r.get("Date")
-            try:
-                dt = datetime.datetime.strptime(r["Date"], "%Y-%m-%d %H:%M:%S")
-                epoc_time = int(dt.timestamp())
-            except:
-                dt = None
-                epoc_time = None
 
-            doc = {
-                "file_id": file_id,
-                "timestamp": epoc_time,
-                "Date": raw_date,
-                "CumulativePnl": r.get("CumulativePnl"),
-            }
+def _ingest_spooled(job, db, path: str, filename: str, content_type, file_type: str, file_id, digest):
+    """Background job body: ingest the copied upload, then drop the copy"""
+    try:
+        with open(path, "rb") as f:
+            return ingest_chunks(db, _file_chunks(f, file_type), filename, content_type, file_type, file_id, job, digest)
+    except PARSE_ERRORS:
+        raise _invalid_format(file_type)
+    finally:
+        os.remove(path)
 
-            batch.append(doc)
 
-            if len(batch) >= BATCH_SIZE:
-                timeseries_collection.insert_many(batch)
-                batch = []
+def _spool_copy(fileobj, suffix: str) -> str:
+    # UploadFile is closed when the request ends, so the job needs its own copy
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        shutil.copyfileobj(fileobj, tmp, 1024 * 1024)
+        return tmp.name
 
-        if batch:
-            timeseries_collection.insert_many(batch)
 
+@router.post("/file/upload")
+async def upload_file(
+    file: UploadFile,
+    background: bool = Query(False),
+    force: bool = Query(False),
+    db=Depends(get_db)):
+    """
+    Store an uploaded CSV / JSON MTM series.
+    With `background=true` the file is queued and a job id returned at once (202);
+    poll /api/file/jobs/{job_id} — the file is listed once its status is "ready".
+    Re-uploading identical bytes returns the existing file_id (`duplicate: true`)
+    unless `force=true` asks for a fresh copy.
+    """
+    if not file.filename.endswith((".csv", ".json")):
+        raise HTTPException(status_code=400, detail="Only CSV and JSON files allowed")
+
+    file_type = "json" if file.filename.endswith(".json") else "csv"
+    try:
+        # The upload is already spooled to disk — hash and parse it off the event loop
+        digest = await asyncio.to_thread(content_hash, file.file)
+        if not force:
+            existing = await asyncio.to_thread(find_duplicate, db, digest, file_type)
+            if existing:
+                logger.info(f"Duplicate upload of {file.filename}, returning {existing['_id']}")
+                return {
+                    "file_id": str(existing["_id"]),
+                    "rows": existing.get("total_rows"),
+                    "dropped_rows": existing.get("dropped_rows"),
+                    "file_type": file_type,
+                    "status": existing.get("status", "ready"),
+                    "duplicate": True,
+                }
+
+        if background:
+            path = await asyncio.to_thread(_spool_copy, file.file, f".{file_type}")
+            file_id = None
+            try:
+                file_id = await asyncio.to_thread(register_file, db, file.filename, file.content_type, file_type, digest)
+                job = jobs.submit(
+                    "ingest",
+                    lambda job: _ingest_spooled(job, db, path, file.filename, file.content_type, file_type, file_id, digest),
+                    file_id=str(file_id),
+                    filename=file.filename,
+                )
+            except BaseException:
+                os.remove(path)
+                # No job will ever finish this file (e.g. queue full): drop its "ingesting" doc
+                if file_id is not None:
+                    await asyncio.to_thread(db.files.delete_one, {"_id": file_id})
+                raise
+            return JSONResponse(
+                {"job_id": job.id, "file_id": str(file_id), "status": job.status},
+                status_code=202,
+            )
 
-        return {
-            "file_id": str(file_id), 
-            "rows": row_count,
-            "file_type": file_doc["file_type"]
-        }
+        return await asyncio.to_thread(
+            ingest_chunks, db, _file_chunks(file.file, file_type), file.filename, file.content_type, file_type,
+            digest=digest
+        )
 
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid JSON format")
+    except PARSE_ERRORS:
+        raise _invalid_format(file_type)
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.get("/file/jobs/{job_id}")
+def get_job_status(job_id: str):
+    """Progress of a background job: rows parsed / inserted, throughput, errors"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.snapshot()
+
 @router.get("/file")
-def list_uploaded_files(db=Depends(get_db)):
+def list_uploaded_files(if_none_match: str = Header(None), db=Depends(get_db)):
     files_collection = db.files
     """List all uploaded files with metadata"""
     try:
         files = list(files_collection.find(
-            {"file_type": "csv"}, 
+            {"file_type": "csv", **LISTED}, 
             {"_id": 1, "filename": 1, "upload_date": 1, "total_rows": 1}))
         for f in files:
             f["file_id"] = str(f["_id"])
             del f["_id"]
-        return files
+        return json_with_etag(files, if_none_match)
     except Exception as e:
         logger.error(f"Error while listing uploaded files: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -176,7 +208,7 @@ def list_uploaded_json(db=Depends(get_db)):
     """List all json files"""
     try:
         files = list(files_collection.find(
-            {"file_type": "json"},
+            {"file_type": "json", **LISTED},
             {"_id": 1, "filename": 1}
             ))
         for f in files:
@@ -194,14 +226,72 @@ def get_mtm_from_file(
     from_ts: int = Query(None, alias="from"), 
     to_ts: int = Query(None, alias="to"),      
     count_back: int = Query(None, alias="countBack"),
+    cursor: int = Query(None),
+    limit: int = Query(None, gt=0),
+    resolution: str = Query(None, pattern=RESOLUTION_PATTERN),
+    stream: bool = Query(False),
+    accept: str = Header(None),
+    if_none_match: str = Header(None),
     db=Depends(get_db)
 ):
-    return get_file_ohlc(file_id, db)
+    """
+    OHLC for an uploaded file, optionally windowed (from/to/countBack)
+    and paginated (cursor/limit). X-Next-Cursor is set while more pages remain.
+    `resolution` aggregates candles server-side (1/5/15/60/1D/1W).
+    `Accept` picks JSON records, columnar JSON, MessagePack or Arrow IPC.
+    Unpaged JSON reads stream in chunks when `stream=true` or the file is large.
+    The ETag follows the files doc, so an unchanged poll is a 304.
+    """
+    fmt = negotiate_format(accept)
+    try:
+        version = get_file_version(file_id, db)
+    except InvalidId:
+        raise HTTPException(status_code=400, detail="Invalid file_id format")
+    if version is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    etag = make_etag("file", file_id, version, from_ts, to_ts, count_back, cursor, limit, resolution, fmt)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    if fmt == JSON and count_back is None and cursor is None and limit is None:
+        if stream or is_large_file(version):
+            frames = iter_file_ohlc(file_id, db, from_ts, to_ts, resolution, version=version)
+            first = next(frames, None)
+            # An empty window falls through so it still gets X-No-Data / X-Next-Time
+            if first is not None:
+                return streaming_ohlc_response(itertools.chain([first], frames), etag_headers(etag))
+
+    out, next_cursor = get_file_ohlc_page(file_id, db, from_ts, to_ts, count_back, cursor, limit, resolution, version)
+
+    headers = etag_headers(etag)
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = str(next_cursor)
+
+    if out.empty and cursor is None and (from_ts is not None or to_ts is not None):
+        before_ts = to_ts if count_back or from_ts is None else from_ts
+        next_time = get_file_next_time(file_id, db, before_ts, version)
+        headers["X-No-Data"] = "true"
+        if next_time is not None:
+            headers["X-Next-Time"] = str(next_time)
+
+    return ohlc_response(out, fmt, headers)
+
+def _deletion_in_progress(file_id: str, job_id) -> JSONResponse:
+    return JSONResponse(
+        {"message": "File deletion in progress", "file_id": file_id, "job_id": job_id, "status": "deleting"},
+        status_code=202,
+    )
+
 
 @router.delete("/file/{file_id}")
 def delete_file(file_id: str, db=Depends(get_db)):
+    """
+    Hide the file at once (status "deleting") and remove its rows in
+    rate-limited background batches; progress at /api/file/jobs/{job_id}.
+    Repeating the call for a file whose job was lost (restart) resumes it.
+    """
     files_collection = db.files
-    timeseries_collection = db.timeseries_mtm
 
     try:
         oid = ObjectId(file_id)
@@ -212,15 +302,41 @@ def delete_file(file_id: str, db=Depends(get_db)):
     file_doc = files_collection.find_one({"_id": oid})
     if not file_doc:
         raise HTTPException(status_code=404, detail="File not found")
-
-    # Delete file metadata
-    files_collection.delete_one({"_id": oid})
-
-    # Delete associated timeseries rows
-    result = timeseries_collection.delete_many({"file_id": oid})
-
-    return {
-        "message": "File deleted successfully",
-        "file_id": file_id,
-        "deleted_timeseries_rows": result.deleted_count
-    }
+    if file_doc.get("status") == "ingesting":
+        raise HTTPException(status_code=409, detail="File is still being ingested")
+
+    with _delete_lock:
+        if file_doc.get("status") == "deleting":
+            job = jobs.get(file_doc.get("delete_job"))
+            if job is not None and job.status in ("queued", "running"):
+                return _deletion_in_progress(file_id, job.id)
+            # Lost job: claim it by the stale job id so only one call resumes it
+            claim = {"_id": oid, "status": "deleting", "delete_job": file_doc.get("delete_job")}
+        else:
+            claim = {"_id": oid, "status": {"$ne": "deleting"}}
+
+        # Hidden before any row goes; a fresh claim token makes the update
+        # modify the doc even when it was already "deleting"
+        token = f"claim-{ObjectId()}"
+        if files_collection.update_one(claim, {"$set": {"status": "deleting", "delete_job": token}}).modified_count == 0:
+            current = files_collection.find_one({"_id": oid}, {"delete_job": 1}) or {}
+            return _deletion_in_progress(file_id, current.get("delete_job"))
+
+        try:
+            job = jobs.submit("delete", lambda job: delete_file_data(db, oid, job), file_id=file_id)
+        except HTTPException:
+            # Queue full: back as it was (listed again unless it was already being deleted)
+            restore = {"$set": {}, "$unset": {}}
+            for field in ("status", "delete_job"):
+                if file_doc.get(field) is None:
+                    restore["$unset"][field] = ""
+                else:
+                    restore["$set"][field] = file_doc[field]
+            files_collection.update_one({"_id": oid, "delete_job": token}, {k: v for k, v in restore.items() if v})
+            raise
+        files_collection.update_one({"_id": oid, "delete_job": token}, {"$set": {"delete_job": job.id}})
+
+    return JSONResponse(
+        {"message": "File deletion started", "file_id": file_id, "job_id": job.id, "status": "deleting"},
+        status_code=202,
+    )
@@ -0,0 +1,59 @@
+"""
+Move uploaded files from the per-row timeseries_mtm layout to packed
+timeseries_mtm_buckets docs (see services/file_buckets.py).
+
+    python scripts/migrate_timeseries_buckets.py --all
+    python scripts/migrate_timeseries_buckets.py --file-id 65f0c... --file-id 65f1a...
+    python scripts/migrate_timeseries_buckets.py --all --dry-run
+
+Each file is switched to the bucket layout only after all of its buckets
+are written, so the API keeps serving it throughout; an interrupted run can
+simply be started again.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+from database import get_infra_db  # noqa: E402
+from services.file_buckets import ROWS, BUCKETS, BUSY, migrate_file  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file-id", action="append", default=[], help="file to migrate (repeatable)")
+    parser.add_argument("--all", action="store_true", help="every file still in the per-row layout")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be migrated")
+    args = parser.parse_args()
+
+    if not args.all and not args.file_id:
+        parser.error("pass --all or at least one --file-id")
+
+    db = get_infra_db()
+    query = {"layout": {"$in": [None, ROWS]}, "status": {"$nin": BUSY}}
+    if args.file_id:
+        query["_id"] = {"$in": [ObjectId(f) for f in args.file_id]}
+    files = list(db.files.find(query, {"_id": 1, "filename": 1, "total_rows": 1}))
+
+    print(f"{len(files)} idle file(s) in the per-row layout")
+    total_rows = total_buckets = 0
+    for f in files:
+        start = time.perf_counter()
+        if args.dry_run:
+            print(f"  {f['_id']}  {f.get('filename')}  rows={f.get('total_rows')}")
+            continue
+        buckets = migrate_file(db, f["_id"])
+        total_rows += f.get("total_rows") or 0
+        total_buckets += buckets
+        print(f"  {f['_id']}  {f.get('filename')}  rows={f.get('total_rows')} → buckets={buckets}"
+              f"  ({time.perf_counter() - start:.1f}s)")
+
+    if not args.dry_run and files:
+        print(f"Done: {total_rows} rows → {total_buckets} {BUCKETS} docs")
+
+
+if __name__ == "__main__":
+    main()
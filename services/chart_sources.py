@@ -0,0 +1,43 @@
+from services.strategy_ohlc_service import get_strategy_ohlc_frame, get_strategy_version
+from services.portfolio_ohlc_service import get_portfolio_ohlc_frame, get_portfolio_lots, portfolio_version
+from services.file_ohlc import get_file_ohlc_page, get_file_version
+
+
+# ==================== SETTINGS ====================
+
+# Series a derived chart (Renko, transforms) can be built from
+SOURCES = ("strategy", "portfolio", "file")
+
+
+# ==================== SOURCES ====================
+
+def source_version(source, name, db):
+    """Data-version marker of the source — the one its OHLC frame is cached under"""
+    if source == "strategy":
+        return get_strategy_version(name, db)
+    if source == "portfolio":
+        return portfolio_version(get_portfolio_lots(name, db), db)
+    return get_file_version(name, db)
+
+
+def load_source_frame(source, name, db, version):
+    """Full-history candles of the source (time in ms), shared with the OHLC cache"""
+    if source == "strategy":
+        return get_strategy_ohlc_frame(name, db, version=version)
+    if source == "portfolio":
+        return get_portfolio_ohlc_frame(name, db, version=version)
+    df, _ = get_file_ohlc_page(name, db, version=version)
+    return df
+
+
+def load_source_window(source, name, db, version, from_ms, to_ts):
+    """Candles with from_ms <= time < to_ts (seconds), same values as in the full frame"""
+    if source == "strategy":
+        df = get_strategy_ohlc_frame(name, db, from_ts=from_ms // 1000, to_ts=to_ts, version=version)
+    elif source == "file":
+        df, _ = get_file_ohlc_page(name, db, from_ts=from_ms // 1000, to_ts=to_ts, version=version)
+    else:
+        df = get_portfolio_ohlc_frame(name, db, version=version)
+        if to_ts is not None:
+            df = df[df["time"] < to_ts * 1000]
+    return df[df["time"] >= from_ms]
@@ -0,0 +1,296 @@
+from bson import Binary, ObjectId
+from pymongo import ASCENDING, DESCENDING
+from logger_setup import logger
+from helpers.columnar_loader import iter_column_batches, FLOAT
+from services.file_delete import delete_in_batches, DELETE_BATCH_ROWS, DELETE_PAUSE_SECONDS
+import numpy as np
+
+
+# ==================== LAYOUT ====================
+
+# files.layout values; docs written before bucketing have no layout → ROWS
+ROWS    = "rows"        # timeseries_mtm: one doc per row
+BUCKETS = "buckets"     # timeseries_mtm_buckets: one doc per BUCKET_ROWS rows
+
+BUCKET_ROWS = 5000      # ~120 KB of packed arrays per doc
+BUCKET_READ_BATCH = 16  # bucket docs per server batch
+
+# files.status values whose data belongs to a running ingest / delete job
+BUSY = ["ingesting", "deleting"]
+
+BUCKET_PROJECTION = {"_id": 0, "seq": 1, "start_ts": 1, "end_ts": 1, "timestamp": 1, "pnl": 1, "open": 1}
+
+
+def file_layout(file_doc) -> str:
+    return (file_doc or {}).get("layout", ROWS)
+
+
+# ==================== PACKING ====================
+
+def pack_bucket(file_id, seq: int, ts: np.ndarray, pnl: np.ndarray, open_: np.ndarray) -> dict:
+    """
+    One bucket doc of time-sorted rows: little-endian int64 seconds, float64
+    PnL (the candle close) and float64 open — the previous row's close in
+    file order, so a read never has to look outside its window for it.
+    """
+    ts = ts.astype("<i8")
+    return {
+        "file_id": file_id,
+        "seq": seq,
+        "start_ts": int(ts[0]),
+        "end_ts": int(ts[-1]),
+        "count": len(ts),
+        "timestamp": Binary(ts.tobytes()),
+        "pnl": Binary(pnl.astype("<f8").tobytes()),
+        "open": Binary(open_.astype("<f8").tobytes()),
+    }
+
+
+def unpack_bucket(doc: dict) -> dict:
+    """Columns of a bucket doc as float64 arrays, named like the per-row fields"""
+    cols = {
+        "timestamp": np.frombuffer(doc["timestamp"], dtype="<i8").astype(np.float64),
+        "CumulativePnl": np.frombuffer(doc["pnl"], dtype="<f8").astype(np.float64),
+    }
+    if "open" in doc:
+        cols["open"] = np.frombuffer(doc["open"], dtype="<f8").astype(np.float64)
+    return cols
+
+
+class BucketPacker:
+    """
+    Cleans a row stream and cuts it into full buckets across chunk
+    boundaries. Rows without a timestamp or with a non-finite PnL are
+    dropped (counted in `dropped`) — no read path would serve them.
+
+    Opens chain through the previous bucket, which is only right while the
+    stream is in time order; `ordered` turns False otherwise and the file
+    then needs repack_buckets once everything is written.
+    """
+
+    def __init__(self, file_id, bucket_rows: int = BUCKET_ROWS, seq: int = 0):
+        self.file_id = file_id
+        self.bucket_rows = bucket_rows
+        self.seq = seq
+        self.ts = np.empty(0, dtype=np.int64)
+        self.pnl = np.empty(0, dtype=np.float64)
+        self.last_ts = None
+        self.last_close = None
+        self.ordered = True
+        self.dropped = {"invalid_date": 0, "non_finite_pnl": 0}
+
+    def add(self, ts: np.ndarray, pnl: np.ndarray) -> list:
+        """Buckets completed by these rows; `ts` holds NaN for missing timestamps"""
+        has_ts = ~np.isnan(ts)
+        finite = np.isfinite(pnl)
+        self.dropped["invalid_date"] += int((~has_ts).sum())
+        self.dropped["non_finite_pnl"] += int((has_ts & ~finite).sum())
+
+        keep = has_ts & finite
+        self.ts = np.concatenate([self.ts, ts[keep].astype(np.int64)])
+        self.pnl = np.concatenate([self.pnl, pnl[keep]])
+
+        docs = []
+        while len(self.ts) >= self.bucket_rows:
+            docs.append(self._cut(self.bucket_rows))
+        return docs
+
+    def flush(self) -> list:
+        return [self._cut(len(self.ts))] if len(self.ts) else []
+
+    def _cut(self, n: int) -> dict:
+        # Stable, so equal timestamps keep their upload order
+        order = np.argsort(self.ts[:n], kind="stable")
+        ts, pnl = self.ts[:n][order], self.pnl[:n][order]
+        self.ts, self.pnl = self.ts[n:], self.pnl[n:]
+
+        if self.last_ts is not None and ts[0] < self.last_ts:
+            self.ordered = False
+        open_ = np.empty_like(pnl)
+        open_[0] = pnl[0] if self.last_close is None else self.last_close
+        open_[1:] = pnl[:-1]
+
+        doc = pack_bucket(self.file_id, self.seq, ts, pnl, open_)
+        self.last_ts, self.last_close = ts[-1], pnl[-1]
+        self.seq += 1
+        return doc
+
+
+# ==================== READING ====================
+
+def _bucket_query(file_id, ts_filter: dict) -> dict:
+    """Buckets whose [start_ts, end_ts] range can hold rows of the window"""
+    query = {"file_id": ObjectId(file_id)}
+    if ts_filter.get("$gt") is not None:
+        query["end_ts"] = {"$gt": ts_filter["$gt"]}
+    elif ts_filter.get("$gte") is not None:
+        query["end_ts"] = {"$gte": ts_filter["$gte"]}
+    if ts_filter.get("$lt") is not None:
+        query["start_ts"] = {"$lt": ts_filter["$lt"]}
+    return query
+
+
+def _window_mask(ts: np.ndarray, ts_filter: dict) -> np.ndarray:
+    mask = np.ones(len(ts), dtype=bool)
+    if ts_filter.get("$gt") is not None:
+        mask &= ts > ts_filter["$gt"]
+    if ts_filter.get("$gte") is not None:
+        mask &= ts >= ts_filter["$gte"]
+    if ts_filter.get("$lt") is not None:
+        mask &= ts < ts_filter["$lt"]
+    return mask
+
+
+def _take(cols: dict, idx) -> dict:
+    return {name: values[idx] for name, values in cols.items()}
+
+
+def iter_bucket_rows(collection, file_id, ts_filter: dict = None, descending: bool = False, limit: int = 0):
+    """
+    Rows of a bucketed file inside `ts_filter` ($gt / $gte / $lt on seconds),
+    as {"timestamp", "CumulativePnl", "open"} float64 batches in time order —
+    the shape iter_column_batches yields for the per-row layout, plus opens.
+
+    Buckets arrive ordered by their near edge (start_ts ascending, end_ts
+    descending). A row beyond the edge of the bucket just read can't be
+    overtaken by a later bucket, so it is final; everything else waits in a
+    small merge buffer. For an upload in time order that buffer is one bucket.
+    """
+    ts_filter = ts_filter or {}
+    edge = "end_ts" if descending else "start_ts"
+    cursor = collection.find(
+        _bucket_query(file_id, ts_filter),
+        BUCKET_PROJECTION,
+        sort=[(edge, DESCENDING if descending else ASCENDING)],
+        batch_size=BUCKET_READ_BATCH,
+    )
+
+    # Kept ascending by (time, bucket seq): equal timestamps stay in upload order
+    pending = None
+    pending_seq = np.empty(0, dtype=np.int64)
+    remaining = limit or None
+
+    def emit(cols):
+        nonlocal remaining
+        idx = slice(None, None, -1) if descending else slice(None)
+        cols = _take(cols, idx)
+        if remaining is not None:
+            cols = _take(cols, slice(None, remaining))
+            remaining -= len(cols["timestamp"])
+        return cols
+
+    for doc in cursor:
+        # Rows past this bucket's edge are final
+        if pending is not None:
+            if descending:
+                cut = np.searchsorted(pending["timestamp"], doc["end_ts"], side="right")
+                done, keep = slice(cut, None), slice(None, cut)
+            else:
+                cut = np.searchsorted(pending["timestamp"], doc["start_ts"], side="left")
+                done, keep = slice(None, cut), slice(cut, None)
+            if len(pending["timestamp"][done]):
+                yield emit(_take(pending, done))
+                if remaining == 0:
+                    return
+            pending, pending_seq = _take(pending, keep), pending_seq[keep]
+
+        cols = unpack_bucket(doc)
+        mask = _window_mask(cols["timestamp"], ts_filter)
+        if not mask.any():
+            continue
+        cols = _take(cols, mask)
+        seq = np.full(len(cols["timestamp"]), doc.get("seq", 0), dtype=np.int64)
+        if pending is None:
+            pending, pending_seq = cols, seq
+            continue
+
+        pending = {name: np.concatenate([pending[name], cols[name]]) for name in cols}
+        pending_seq = np.concatenate([pending_seq, seq])
+        order = np.lexsort((pending_seq, pending["timestamp"]))
+        pending, pending_seq = _take(pending, order), pending_seq[order]
+
+    if pending is not None and len(pending["timestamp"]):
+        yield emit(pending)
+
+
+def last_bucket_row(collection, file_id, before_ts, finite_pnl: bool = False):
+    """(timestamp, pnl) of the latest row strictly before `before_ts`, None if there is none"""
+    for batch in iter_bucket_rows(collection, file_id, {"$lt": before_ts}, descending=True):
+        ts, pnl = batch["timestamp"], batch["CumulativePnl"]
+        hits = np.flatnonzero(np.isfinite(pnl)) if finite_pnl else np.arange(len(ts))
+        if len(hits):
+            return int(ts[hits[0]]), float(pnl[hits[0]])
+    return None
+
+
+def repack_buckets(collection, file_id, old_count: int, bucket_rows: int = BUCKET_ROWS) -> int:
+    """
+    Rewrite the `old_count` buckets of a file uploaded out of time order as
+    time-ordered, non-overlapping buckets with correct opens, then drop the
+    originals. Only for files no reader sees yet. Returns the new bucket count.
+    """
+    packer = BucketPacker(file_id, bucket_rows, seq=old_count)
+    for batch in iter_bucket_rows(collection, file_id):
+        docs = packer.add(batch["timestamp"], batch["CumulativePnl"])
+        if docs:
+            collection.insert_many(docs)
+    docs = packer.flush()
+    if docs:
+        collection.insert_many(docs)
+
+    collection.delete_many({"file_id": file_id, "seq": {"$lt": old_count}})
+    return packer.seq - old_count
+
+
+# ==================== MIGRATION ====================
+
+def migrate_file(db, file_id, bucket_rows: int = BUCKET_ROWS, batch_size: int = 50_000) -> int:
+    """
+    Rewrite one per-row file into cleaned buckets, then switch its layout and
+    drop the old rows in rate-limited batches. Safe to re-run: leftover
+    buckets of an interrupted run are cleared first, and readers keep using
+    the rows until the switch. Files being ingested or deleted are left
+    alone. Returns the number of bucket docs written.
+    """
+    oid = ObjectId(file_id)
+    if not db.files.find_one({"_id": oid, "status": {"$nin": BUSY}}, {"_id": 1}):
+        logger.info(f"Skipped migrating file {file_id}: missing, being ingested or being deleted")
+        return 0
+    db.timeseries_mtm_buckets.delete_many({"file_id": oid})
+
+    packer = BucketPacker(oid, bucket_rows)
+    written = 0
+    batches = iter_column_batches(
+        db.timeseries_mtm, {"file_id": oid},
+        {"timestamp": FLOAT, "CumulativePnl": FLOAT},
+        sort=[("timestamp", ASCENDING)], batch_size=batch_size,
+    )
+    for batch in batches:
+        docs = packer.add(batch["timestamp"], batch["CumulativePnl"])
+        if docs:
+            db.timeseries_mtm_buckets.insert_many(docs)
+            written += len(docs)
+    docs = packer.flush()
+    if docs:
+        db.timeseries_mtm_buckets.insert_many(docs)
+        written += len(docs)
+
+    switched = db.files.update_one(
+        {"_id": oid, "status": {"$nin": BUSY}},
+        {"$set": {"layout": BUCKETS, "dropped_rows": packer.dropped}},
+    )
+    if not switched.matched_count:
+        # Deleted or re-ingested meanwhile: its own job owns the data
+        logger.info(f"Skipped migrating file {file_id}: no longer idle")
+        return 0
+
+    # Same small, paced batches as a file delete
+    deleted = 0
+
+    def count(docs):
+        nonlocal deleted
+        deleted += len(docs)
+
+    delete_in_batches(db.timeseries_mtm, oid, DELETE_BATCH_ROWS, DELETE_PAUSE_SECONDS, count)
+    logger.info(f"Migrated file {file_id}: {deleted} rows → {written} buckets")
+    return written
@@ -0,0 +1,49 @@
+from bson import ObjectId
+from logger_setup import logger
+import time
+
+
+# ==================== SETTINGS ====================
+
+# Small id-range deletes with a pause in between keep the cluster's other
+# queries fast: at most ~DELETE_BATCH_ROWS / DELETE_PAUSE_SECONDS rows per second.
+DELETE_BATCH_ROWS = 5000        # per-row layout docs per delete
+DELETE_BATCH_BUCKETS = 1        # bucket docs per delete (BUCKET_ROWS = 5000 rows, as above)
+DELETE_PAUSE_SECONDS = 0.1
+
+
+# ==================== DELETION ====================
+
+def delete_in_batches(collection, file_id, batch_docs: int, pause: float, on_batch):
+    """Delete a file's docs `batch_docs` at a time, by _id, pausing between batches"""
+    while True:
+        docs = list(collection.find({"file_id": file_id}, {"_id": 1, "count": 1}, limit=batch_docs))
+        if not docs:
+            return
+        collection.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+        on_batch(docs)
+        time.sleep(pause)
+
+
+def delete_file_data(db, file_id, job=None, pause: float = DELETE_PAUSE_SECONDS) -> dict:
+    """
+    Background job body: remove every stored row of a file marked "deleting",
+    then its files doc. `job` (if any) gets rows_deleted progress.
+    """
+    oid = ObjectId(file_id)
+    deleted = 0
+
+    def progress(rows):
+        nonlocal deleted
+        deleted += rows
+        if job:
+            job.add("rows_deleted", rows)
+
+    delete_in_batches(db.timeseries_mtm, oid, DELETE_BATCH_ROWS, pause,
+                       lambda docs: progress(len(docs)))
+    delete_in_batches(db.timeseries_mtm_buckets, oid, DELETE_BATCH_BUCKETS, pause,
+                       lambda docs: progress(sum(d.get("count", 0) for d in docs)))
+
+    db.files.delete_one({"_id": oid})
+    logger.info(f"Deleted file {file_id} ({deleted} rows)")
+    return {"file_id": str(file_id), "deleted_timeseries_rows": deleted}
@@ -0,0 +1,307 @@
+from fastapi import HTTPException
+from bson import ObjectId
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dateutil.tz import tzlocal
+from logger_setup import logger
+from services.file_buckets import BUCKETS, BUCKET_ROWS, BucketPacker, repack_buckets
+import datetime
+import hashlib
+import ijson
+import numpy as np
+import pandas as pd
+
+
+# ==================== SETTINGS ====================
+
+INGEST_CHUNK_ROWS = 50_000      # rows parsed per chunk
+INSERT_BATCH_ROWS = 10_000      # rows per insert_many
+BUCKETS_PER_INSERT = max(1, INSERT_BATCH_ROWS // BUCKET_ROWS)
+MAX_INFLIGHT_BATCHES = 4        # bounds memory held by pending writes
+INSERT_WORKERS = 4
+MAX_REPORTED_ERRORS = 100
+HASH_BLOCK_BYTES = 1024 * 1024
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+INGEST_COLUMNS = ("Date", "CumulativePnl")
+
+
+# ==================== VECTORIZED CONVERSION ====================
+
+def local_epoch_seconds(dates: pd.Series) -> np.ndarray:
+    """
+    "YYYY-mm-dd HH:MM:SS" strings → epoch seconds, read as server-local wall
+    time like datetime.strptime(...).timestamp(). Unparseable → None.
+    """
+    if dates.dtype != object:
+        return np.full(len(dates), None, dtype=object)
+
+    parsed = pd.to_datetime(dates, format=DATE_FORMAT, errors="coerce")
+    local = parsed.dt.tz_localize(tzlocal(), ambiguous=True, nonexistent="shift_forward")
+    seconds = local.to_numpy(dtype="datetime64[ns]").view(np.int64) // 10**9
+
+    out = seconds.astype(object)
+    out[parsed.isna().to_numpy()] = None
+    return out
+
+
+def _invalid_pnl(pnl: pd.Series):
+    """CumulativePnl as float64 plus the positions that are missing or not numbers"""
+    values = pd.to_numeric(pnl, errors="coerce").to_numpy(dtype=np.float64)
+    return values, np.flatnonzero(np.isnan(values))
+
+
+# ==================== DEDUPLICATION ====================
+
+def content_hash(fileobj) -> str:
+    """sha256 of the spooled upload, read block by block; leaves the file at 0"""
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: fileobj.read(HASH_BLOCK_BYTES), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def find_duplicate(db, digest: str, file_type: str):
+    """An earlier upload with the same bytes (ready or still ingesting), None if there is none"""
+    return db.files.find_one(
+        {"content_hash": digest, "file_type": file_type, "status": {"$nin": ["failed", "deleting"]}},
+        {"_id": 1, "total_rows": 1, "dropped_rows": 1, "status": 1},
+        sort=[("_id", 1)],
+    )
+
+
+# ==================== CHUNK SOURCES ====================
+
+def iter_csv_chunks(fileobj, chunk_rows: int = INGEST_CHUNK_ROWS):
+    """Date / CumulativePnl chunks straight from the spooled upload, never the whole file"""
+    reader = pd.read_csv(
+        fileobj,
+        usecols=lambda c: c in INGEST_COLUMNS,
+        chunksize=chunk_rows,
+        encoding="utf-8",
+    )
+    for chunk in reader:
+        yield chunk
+
+
+def _has_top_level_key(fileobj, key: str) -> bool:
+    fileobj.seek(0)
+    for prefix, event, value in ijson.parse(fileobj):
+        if prefix == "" and event == "map_key" and value == key:
+            return True
+    return False
+
+
+def iter_json_mtm(fileobj):
+    """
+    Items of the top-level "mtm" array, parsed incrementally from the file —
+    neither the document nor the array is ever fully in memory.
+    """
+    count = 0
+    for item in ijson.items(fileobj, "mtm.item", use_float=True):
+        count += 1
+        yield item
+
+    # Nothing parsed: tell an empty array apart from a missing key (cheap rescan)
+    if not count and not _has_top_level_key(fileobj, "mtm"):
+        raise HTTPException(
+            status_code=400,
+            detail="JSON must contain 'mtm' key with array of records"
+        )
+
+
+def iter_record_chunks(records, chunk_rows: int = INGEST_CHUNK_ROWS):
+    """Same chunks from an iterable of {"Date": ..., "CumulativePnl": ...} dicts"""
+    batch = []
+    for item in records:
+        if not isinstance(item, dict):
+            item = {}       # reported as an invalid row
+        batch.append((item.get("Date"), item.get("CumulativePnl")))
+        if len(batch) >= chunk_rows:
+            yield pd.DataFrame(batch, columns=list(INGEST_COLUMNS))
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=list(INGEST_COLUMNS))
+
+
+# ==================== BULK WRITER ====================
+
+class _BulkWriter:
+    """Unordered insert_many batches on a small pool, at most `max_inflight` pending"""
+
+    def __init__(self, collection, max_inflight: int = MAX_INFLIGHT_BATCHES, workers: int = INSERT_WORKERS, on_inserted=None):
+        self.collection = collection
+        self.max_inflight = max_inflight
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self.pending = deque()
+        self.started = False
+        self.on_inserted = on_inserted      # called with the row count of each stored batch
+
+    def submit(self, docs, rows: int = None):
+        while len(self.pending) >= self.max_inflight:
+            self.pending.popleft().result()
+        self.started = True
+        future = self.pool.submit(self.collection.insert_many, docs, ordered=False)
+        if self.on_inserted is not None:
+            future.add_done_callback(
+                lambda f, n=rows or len(docs): None if f.cancelled() or f.exception() else self.on_inserted(n)
+            )
+        self.pending.append(future)
+
+    def drain(self):
+        while self.pending:
+            self.pending.popleft().result()
+
+    def abort(self):
+        """Stop queueing and wait for what is already running (so a rollback sees every row)"""
+        for future in self.pending:
+            future.cancel()
+        for future in self.pending:
+            if not future.cancelled():
+                future.exception()
+        self.pending.clear()
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+# ==================== PIPELINE ====================
+
+def _chunk_stamps(chunk: pd.DataFrame) -> np.ndarray:
+    """Epoch seconds of a chunk as float64, NaN where the Date did not parse"""
+    dates = chunk["Date"] if "Date" in chunk else pd.Series([None] * len(chunk), dtype=object)
+    return local_epoch_seconds(dates).astype(np.float64)
+
+
+def _submit_buckets(writer, docs):
+    for start in range(0, len(docs), BUCKETS_PER_INSERT):
+        batch = docs[start:start + BUCKETS_PER_INSERT]
+        writer.submit(batch, rows=sum(d["count"] for d in batch))
+
+
+def ingest_chunks(db, chunks, filename: str, content_type, file_type: str, file_id=None, job=None, digest=None) -> dict:
+    """
+    Validate and store parsed chunks for one upload.
+
+    Rows are cleaned and stored as ready-made candles (time, open, close),
+    BUCKET_ROWS to a timeseries_mtm_buckets doc (see services.file_buckets);
+    rows that can't be charted are counted in the files doc's dropped_rows.
+    Writes of one chunk overlap with parsing the next. Every row is checked;
+    any invalid CumulativePnl stops the writes, rolls back what was stored
+    and raises 400 with a row-level report.
+
+    Without `file_id` the files doc is only written once every row is in, so
+    a half-ingested upload is never listed. A background upload passes the
+    id of a files doc already registered as "ingesting"; it is flipped to
+    "ready" at the end, or "failed" after a rollback. `job` (if any) gets
+    rows_parsed / rows_inserted counters and the error report. `digest` is
+    the content_hash stored for deduplication.
+    """
+    registered = file_id is not None
+    file_id = file_id or ObjectId()
+    packer = BucketPacker(file_id)
+    writer = _BulkWriter(
+        db.timeseries_mtm_buckets,
+        on_inserted=(lambda n: job.add("rows_inserted", n)) if job else None,
+    )
+    row_count = 0
+    errors = []
+    error_count = 0
+
+    try:
+        for chunk in chunks:
+            pnl_col = chunk["CumulativePnl"] if "CumulativePnl" in chunk else pd.Series([None] * len(chunk), dtype=object)
+            pnl, bad = _invalid_pnl(pnl_col)
+
+            if len(bad):
+                error_count += len(bad)
+                for i in bad[:MAX_REPORTED_ERRORS - len(errors)]:
+                    value = pnl_col.iloc[i]
+                    errors.append({
+                        "row": row_count + int(i) + 1,
+                        "column": "CumulativePnl",
+                        "value": None if pd.isna(value) else str(value),
+                    })
+            elif not error_count:
+                _submit_buckets(writer, packer.add(_chunk_stamps(chunk), pnl))
+
+            row_count += len(chunk)
+            if job:
+                job.set_counter("rows_parsed", row_count)
+                job.set_counter("error_count", error_count)
+
+        if error_count:
+            logger.error("User tried to upload currupt file")
+            if job:
+                job.errors = errors
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "message": f"Invalid CumulativePnl at row {errors[0]['row']}",
+                    "error_count": error_count,
+                    "errors": errors,
+                }
+            )
+
+        _submit_buckets(writer, packer.flush())
+        writer.drain()
+
+        # Opens were chained in upload order — rebuild them if that wasn't time order
+        if not packer.ordered:
+            logger.info(f"{filename} is not in time order, repacking its buckets")
+            repack_buckets(db.timeseries_mtm_buckets, file_id, packer.seq)
+
+        file_doc = {
+            "filename": filename,
+            "content_type": content_type,
+            "upload_date": datetime.datetime.utcnow(),
+            "total_rows": row_count,
+            "file_type": file_type,
+            "layout": BUCKETS,
+            "dropped_rows": packer.dropped,
+            "content_hash": digest,
+            "status": "ready",
+        }
+        if registered:
+            db.files.update_one({"_id": file_id}, {"$set": file_doc})
+        else:
+            db.files.insert_one({"_id": file_id, **file_doc})
+
+    except BaseException as e:
+        writer.abort()
+        if writer.started:
+            deleted = db.timeseries_mtm_buckets.delete_many({"file_id": file_id}).deleted_count
+            logger.warning(f"Rolled back {deleted} buckets of failed upload {filename}")
+        if registered:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            db.files.update_one({"_id": file_id}, {"$set": {"status": "failed", "error": error}})
+        raise
+    finally:
+        writer.close()
+
+    logger.info(f"Ingested {row_count} rows from {filename} as {file_id}")
+    return {
+        "file_id": str(file_id),
+        "rows": row_count,
+        "dropped_rows": packer.dropped,
+        "file_type": file_type,
+    }
+
+
+def register_file(db, filename: str, content_type, file_type: str, digest=None) -> ObjectId:
+    """Files doc for a background upload, hidden from listings until it is "ready" """
+    file_id = ObjectId()
+    db.files.insert_one({
+        "_id": file_id,
+        "filename": filename,
+        "content_type": content_type,
+        "upload_date": datetime.datetime.utcnow(),
+        "total_rows": 0,
+        "file_type": file_type,
+        "layout": BUCKETS,
+        "content_hash": digest,
+        "status": "ingesting",
+    })
+    return file_id
@@ -1,58 +1,365 @@
 from logger_setup import logger
 from fastapi import HTTPException, APIRouter, UploadFile, Depends, Query
+from pymongo import ASCENDING, DESCENDING
 from bson import ObjectId
 import pandas as pd
 import numpy as np
 from datetime import datetime
 from logger_setup import logger
+from helpers.resample_ohlc import resolution_to_ms, bucket_start, resample_ohlc, candles_from_equity, candles_from_opens, empty_ohlc
+from helpers.ohlc_formats import ohlc_records
+from helpers.ohlc_cache import ohlc_cache
+from helpers.columnar_loader import iter_column_batches, FLOAT
+from services.file_buckets import ROWS, BUCKETS, file_layout, iter_bucket_rows, last_bucket_row
 
-def get_file_ohlc(
+# Only finite numbers: excludes NaN, ±inf and non-numeric types
+FINITE_PNL = {"$gt": float("-inf"), "$lt": float("inf")}
+
+
+def _previous_close(file_id, db, before_ts, layout=ROWS):
+    """Last finite CumulativePnl strictly before `before_ts` (seconds)"""
+    if layout == BUCKETS:
+        row = last_bucket_row(db.timeseries_mtm_buckets, file_id, before_ts, finite_pnl=True)
+        return row[1] if row else None
+
+    query = {"file_id": ObjectId(file_id), "timestamp": {"$lt": before_ts}, "CumulativePnl": FINITE_PNL}
+    prev = db.timeseries_mtm.find_one(query, {"_id": 0, "timestamp": 1}, sort=[("timestamp", DESCENDING)])
+    if not prev:
+        return None
+
+    # Equal timestamps keep their upload order: the close is the last row of the run
+    query["timestamp"] = prev["timestamp"]
+    prev = db.timeseries_mtm.find_one(query, {"_id": 0, "CumulativePnl": 1}, sort=[("_id", DESCENDING)])
+    return prev["CumulativePnl"]
+
+
+def get_file_next_time(file_id, db, before_ts, version=None):
+    """Chart time (ms) of the latest row before `before_ts`, None if there is none"""
+    if _layout(file_id, db, version) == BUCKETS:
+        row = last_bucket_row(db.timeseries_mtm_buckets, file_id, before_ts)
+        return row[0] * 1000 if row else None
+
+    doc = db.timeseries_mtm.find_one(
+        {"file_id": ObjectId(file_id), "timestamp": {"$lt": before_ts}},
+        {"_id": 0, "timestamp": 1},
+        sort=[("timestamp", DESCENDING)]
+    )
+    return int(doc["timestamp"]) * 1000 if doc else None
+
+
+def get_file_version(file_id, db):
+    """
+    Data-version marker of an upload — its files doc, which is written once
+    per ingest: (upload_date, total_rows, layout).
+    """
+    doc = db.files.find_one(
+        {"_id": ObjectId(file_id), "status": {"$ne": "deleting"}},    # being deleted → gone
+        {"_id": 0, "upload_date": 1, "total_rows": 1, "layout": 1}
+    )
+    return (doc.get("upload_date"), doc.get("total_rows"), file_layout(doc)) if doc else None
+
+
+def _layout(file_id, db, version=None):
+    if version is None:
+        version = get_file_version(file_id, db)
+    return version[2] if version else ROWS
+
+
+# timestamp may be null for rows whose Date did not parse → NaN
+FILE_FIELDS = {"timestamp": FLOAT, "CumulativePnl": FLOAT}
+
+# Columns each layout's row batches carry (buckets also store the candle open)
+ROW_COLUMNS = {ROWS: tuple(FILE_FIELDS), BUCKETS: (*FILE_FIELDS, "open")}
+
+
+def _iter_rows(file_id, db, layout, ts_filter, descending=False, limit=0, batch_size=5000):
+    """{"timestamp", "CumulativePnl"} batches of a window, whatever the storage layout"""
+    if layout == BUCKETS:
+        return iter_bucket_rows(db.timeseries_mtm_buckets, file_id, ts_filter, descending, limit)
+
+    query = {"file_id": ObjectId(file_id)}
+    if ts_filter:
+        query["timestamp"] = ts_filter
+    return iter_column_batches(
+        db.timeseries_mtm, query, FILE_FIELDS,
+        sort=[("timestamp", DESCENDING if descending else ASCENDING)],
+        limit=limit, batch_size=batch_size
+    )
+
+
+def _load_rows(file_id, db, layout, ts_filter, descending=False, limit=0) -> dict:
+    parts = list(_iter_rows(file_id, db, layout, ts_filter, descending, limit, batch_size=50000))
+    return _concat_rows(parts, layout)
+
+
+def _concat_rows(parts, layout) -> dict:
+    names = ROW_COLUMNS[layout]
+    if not parts:
+        return {name: np.empty(0) for name in names}
+    return {name: np.concatenate([p[name] for p in parts]) for name in names}
+
+
+def _take(cols: dict, idx) -> dict:
+    return {name: values[idx] for name, values in cols.items()}
+
+
+def _last_buckets(batches, count_back, bucket_ms, layout):
+    """
+    Consume newest-first column batches until `count_back` buckets are complete.
+    Returns the rows oldest-first.
+    """
+    parts = []
+    seen = 0
+    current = None
+    for batch in batches:
+        batch = _take(batch, ~np.isnan(batch["timestamp"]))
+        ts = batch["timestamp"]
+        if not len(ts):
+            continue
+        buckets = bucket_start(ts.astype(np.int64) * 1000, bucket_ms)
+        new_bucket = np.r_[buckets[0] != current, buckets[1:] != buckets[:-1]]
+        ordinal = seen + np.cumsum(new_bucket)
+
+        keep = ordinal <= count_back
+        parts.append(_take(batch, keep))
+        if not keep[-1]:
+            break
+        seen = ordinal[-1]
+        current = buckets[-1]
+
+    return _take(_concat_rows(parts, layout), slice(None, None, -1))
+
+
+
+
+def _to_candles(file_id, db, cols, layout, seeded=False, prev_close=None):
+    """
+    Raw candles from oldest-first rows. Bucketed files were cleaned at upload
+    and carry their opens, so this is a straight column copy. Per-row files
+    are cleaned here, and a `seeded` window opens at the close before it.
+    Returns (candles, last_close) — None for an empty window.
+    """
+    ts, pnl = cols["timestamp"], cols["CumulativePnl"]
+    if "open" in cols:
+        if not len(ts):
+            return None, prev_close
+        return candles_from_opens(ts.astype(np.int64) * 1000, cols["open"], pnl), pnl[-1]
+
+    # Unparseable timestamps / PnL were stored as null → NaN, skip them
+    valid = ~(np.isnan(ts) | np.isnan(pnl))
+    ts, pnl = ts[valid], pnl[valid]
+    if not len(ts):
+        return None, prev_close
+
+    if seeded and prev_close is None:
+        prev_close = _previous_close(file_id, db, int(ts[0]), layout)
+    return candles_from_equity(ts.astype(np.int64) * 1000, pnl, prev_close), pnl[-1]
+
+
+def get_file_ohlc_page(
         file_id: str,
-        db
+        db,
+        from_ts=None,
+        to_ts=None,
+        count_back=None,
+        cursor=None,
+        limit=None,
+        resolution=None,
+        version=None
 ):
+    """
+    Windowed read over the (file_id, timestamp) index.
+
+    from_ts / to_ts : [from, to) window in seconds
+    count_back      : last N rows before `to` (takes priority over `from`)
+    cursor / limit  : page forward from `cursor` (exclusive) in pages of about `limit`
+                      rows, each ending where the timestamp (or the resampled
+                      bucket) changes
+    resolution      : aggregate into 1/5/15/60/1D/1W candles, raw rows when None
+    version         : get_file_version result, when the caller already has it
+
+    Returns (candles, next_cursor): a time/open/high/low/close DataFrame shared
+    with the cache (read-only) and None as next_cursor on the last page.
+    """
     try:
-        cursor = db.timeseries_mtm.find(
-            {"file_id": ObjectId(file_id)},
-            {"timestamp": 1, "CumulativePnl": 1}
-        ).sort("timestamp", 1)
-        
-        data = list(cursor)
-        print(f'lenght of data before process: {len(data)}')
-        df = pd.DataFrame(data)
-        if df.empty:
-            logger.warning("Empty dataframe, returning empty array")
-            return []
-
-        # bad = df[df.isin([np.inf, -np.inf]).any(axis=1)]
-        # print("INF ROWS:", bad)
-
-        # today = datetime.now().strftime("%Y-%m-%d")
-        # file_name = f"uploaded_currupt_csv_on_{today}_{file_id}.csv"
-
-        # bad_nan = df[df.isna().any(axis=1)]
-        # logger.error("NAN ROWS:", bad_nan.info())
-        # bad_nan.to_csv(file_name, index=False)
-
-        df["timestamp"] = pd.to_numeric(df["timestamp"], errors="coerce")
-        df["CumulativePnl"] = pd.to_numeric(df["CumulativePnl"], errors="coerce")
-
-        df = df.dropna(subset=["timestamp", "CumulativePnl"])
-
-        df["time"] = (df["timestamp"]) * 1000
-        df["open"] = df["CumulativePnl"].shift(1).fillna(df["CumulativePnl"])
-        df["close"] = df["CumulativePnl"]
-        df["high"] = df[["open", "close"]].max(axis=1)
-        df["low"] = df[["open", "close"]].min(axis=1)
-        
-        df = df.replace([np.inf, -np.inf], np.nan)
-        df = df.where(pd.notnull(df), None)
-        
-        # df.to_csv('2025.csv')
-
-        out = df[["time", "open", "high", "low", "close"]].to_dict(orient="records")
-        # logger.info(f"Generated {len(out)} OHLC records for file_id: {file_id}")
-        
-        return out
+        key = ("file", file_id, from_ts, to_ts, count_back, cursor, limit, resolution)
+        if version is None:
+            version = get_file_version(file_id, db)
+        page = ohlc_cache.get(key, version)
+        if page is not None:
+            return page
+
+        page = _build_file_ohlc_page(file_id, db, from_ts, to_ts, count_back, cursor, limit, resolution, _layout(file_id, db, version))
+        ohlc_cache.set(key, version, page)
+        return page
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error while fetching MTM data for file_id {file_id}: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _window_query(file_id, from_ts=None, to_ts=None, count_back=None, cursor=None):
+    ts_filter = {}
+    if cursor is not None:
+        ts_filter["$gt"] = cursor
+    elif from_ts is not None and not count_back:
+        ts_filter["$gte"] = from_ts
+    if to_ts is not None:
+        ts_filter["$lt"] = to_ts
+
+    query = {"file_id": ObjectId(file_id)}
+    if ts_filter:
+        query["timestamp"] = ts_filter
+    return query, ts_filter
+
+
+def _end_at_timestamp_change(file_id, db, layout, cols, boundary):
+    """
+    The next page starts after the cursor timestamp, so a page must not end
+    inside a run of equal timestamps: drop the run when the page has earlier
+    rows, otherwise (one run longer than the page) read the whole run.
+    """
+    ts = cols["timestamp"]
+    last = ts[-1]
+    if boundary != last:
+        return cols
+
+    earlier = np.flatnonzero(ts != last)
+    if len(earlier):
+        return _take(cols, slice(None, earlier[-1] + 1))
+
+    run = _load_rows(file_id, db, layout, {"$gte": last, "$lt": last + 1})
+    return _take(run, run["timestamp"] == last)
+
+
+def _end_at_bucket_change(file_id, db, layout, cols, boundary, bucket_ms, ts_filter):
+    """
+    Same for a resampled page and its last bucket: drop the bucket when it
+    continues past the page and the page has earlier buckets, otherwise (one
+    bucket longer than the page) read the rest of the window's bucket.
+    """
+    buckets = bucket_start(np.nan_to_num(cols["timestamp"]).astype(np.int64) * 1000, bucket_ms)
+    last = buckets[-1]
+    if bucket_start(int(np.nan_to_num(boundary)) * 1000, bucket_ms) != last:
+        return cols
+
+    earlier = np.flatnonzero(buckets != last)
+    if len(earlier):
+        return _take(cols, slice(None, earlier[-1] + 1))
+
+    bucket_end = int(last + bucket_ms) // 1000
+    window = {**ts_filter, "$lt": min(ts_filter.get("$lt", bucket_end), bucket_end)}
+    return _load_rows(file_id, db, layout, window)
+
+
+def _build_file_ohlc_page(file_id, db, from_ts, to_ts, count_back, cursor, limit, resolution, layout=ROWS):
+    bucket_ms = resolution_to_ms(resolution)
+    _, ts_filter = _window_query(file_id, from_ts, to_ts, count_back, cursor)
+
+    next_cursor = None
+    if count_back:
+        if bucket_ms is None:
+            cols = _load_rows(file_id, db, layout, ts_filter, descending=True, limit=count_back)
+            cols = _take(cols, slice(None, None, -1))
+        else:
+            batches = _iter_rows(file_id, db, layout, ts_filter, descending=True)
+            cols = _last_buckets(batches, count_back, bucket_ms, layout)
+    else:
+        cols = _load_rows(file_id, db, layout, ts_filter, limit=limit + 1 if limit else 0)
+        if limit and len(cols["timestamp"]) > limit:
+            boundary = cols["timestamp"][limit]     # first row left for the next page
+            cols = _take(cols, slice(None, limit))
+            if bucket_ms is None:
+                cols = _end_at_timestamp_change(file_id, db, layout, cols, boundary)
+            else:
+                cols = _end_at_bucket_change(file_id, db, layout, cols, boundary, bucket_ms, ts_filter)
+            next_cursor = int(cols["timestamp"][-1])
+
+    logger.debug(f"Fetched {len(cols['timestamp'])} rows for file_id {file_id}")
+
+    # A window that does not start at the first row opens at the previous close
+    seeded = ts_filter.get("$gt") is not None or ts_filter.get("$gte") is not None or bool(count_back)
+    df, _ = _to_candles(file_id, db, cols, layout, seeded)
+    if df is None:
+        logger.warning("Empty dataframe, returning empty array")
+        return empty_ohlc(), next_cursor
+
+    df = resample_ohlc(df, resolution)
+
+    out = df[["time", "open", "high", "low", "close"]]
+    # logger.info(f"Generated {len(out)} OHLC records for file_id: {file_id}")
+
+    return out, next_cursor
+
+
+def get_file_ohlc(
+        file_id: str,
+        db,
+        from_ts=None,
+        to_ts=None,
+        count_back=None,
+        resolution=None
+):
+    out, _ = get_file_ohlc_page(file_id, db, from_ts, to_ts, count_back, resolution=resolution)
+    return ohlc_records(out)
+
+
+# ==================== STREAMING ====================
+
+# Full reads of files at least this long are streamed instead of built in memory
+STREAM_MIN_ROWS = 200_000
+STREAM_BATCH_ROWS = 20_000
+
+
+def is_large_file(version):
+    """`version` as returned by get_file_version"""
+    return bool(version) and (version[1] or 0) >= STREAM_MIN_ROWS
+
+
+def iter_file_ohlc(
+        file_id: str,
+        db,
+        from_ts=None,
+        to_ts=None,
+        resolution=None,
+        batch_size=STREAM_BATCH_ROWS,
+        version=None
+):
+    """
+    The [from, to) window of a file as a sequence of candle DataFrames, one
+    per server batch, so only a batch (plus one open bucket) is ever in memory.
+    Concatenated they equal get_file_ohlc for the same window.
+    """
+    bucket_ms = resolution_to_ms(resolution)
+    layout = _layout(file_id, db, version)
+    _, ts_filter = _window_query(file_id, from_ts, to_ts)
+    batches = _iter_rows(file_id, db, layout, ts_filter, batch_size=batch_size)
+
+    prev_close = None
+    pending = _concat_rows([], layout)
+
+    for batch in batches:
+        cols = _concat_rows([pending, batch], layout)
+        if "open" not in cols:
+            cols = _take(cols, ~(np.isnan(cols["timestamp"]) | np.isnan(cols["CumulativePnl"])))
+        if not len(cols["timestamp"]):
+            continue
+
+        # The last bucket may continue in the next batch — hold it back
+        if bucket_ms is not None:
+            buckets = bucket_start(cols["timestamp"].astype(np.int64) * 1000, bucket_ms)
+            cut = np.searchsorted(buckets, buckets[-1])
+            cols, pending = _take(cols, slice(None, cut)), _take(cols, slice(cut, None))
+            if not len(cols["timestamp"]):
+                continue
+
+        # Only the first batch of a from-window looks up the close before it
+        seeded = from_ts is not None and prev_close is None
+        df, prev_close = _to_candles(file_id, db, cols, layout, seeded, prev_close)
+        yield resample_ohlc(df, resolution)
+
+    if len(pending["timestamp"]):
+        seeded = from_ts is not None and prev_close is None
+        df, _ = _to_candles(file_id, db, pending, layout, seeded, prev_close)
+        yield resample_ohlc(df, resolution)
@@ -0,0 +1,125 @@
+from fastapi import HTTPException
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from logger_setup import logger
+import datetime
+import threading
+import time
+import uuid
+
+
+# ==================== JOB ====================
+
+class Job:
+    """
+    One background task (an ingest, a delete, ...) and its progress counters.
+    Workers bump counters with add(); the status endpoint reads snapshot().
+    """
+
+    def __init__(self, kind: str, **meta):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.meta = meta
+        self.status = "queued"          # queued → running → done | failed
+        self.counters = {}
+        self.errors = []
+        self.error = None
+        self.result = None
+        self.created_at = datetime.datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self._started = None
+        self._finished = None
+        self._lock = threading.Lock()
+
+    def add(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_counter(self, name: str, value):
+        with self._lock:
+            self.counters[name] = value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            end = self._finished or time.monotonic()
+            elapsed = end - self._started if self._started else 0.0
+            counters = dict(self.counters)
+
+        # Throughput of every "rows_*" counter, e.g. rows_inserted → rows_inserted_per_second
+        rates = {
+            f"{name}_per_second": round(value / elapsed, 1)
+            for name, value in counters.items()
+            if name.startswith("rows_") and elapsed > 0
+        }
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            **self.meta,
+            **counters,
+            **rates,
+            "elapsed_seconds": round(elapsed, 3),
+            "errors": self.errors,
+            "error": self.error,
+            "result": self.result,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+# ==================== REGISTRY ====================
+
+class JobRegistry:
+    """In-process job table on a bounded worker pool (jobs do not survive a restart)"""
+
+    def __init__(self, workers: int = 2, max_queued: int = 50, keep_finished: int = 500):
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jobs")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn, **meta) -> Job:
+        """Queue fn(job); raises 503 when too many jobs are already waiting"""
+        job = Job(kind, **meta)
+        with self._lock:
+            queued = sum(1 for j in self._jobs.values() if j.status == "queued")
+            if queued >= self.max_queued:
+                raise HTTPException(status_code=503, detail="Too many background jobs queued, retry later")
+            self._jobs[job.id] = job
+            self._prune()
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, fn):
+        job.status = "running"
+        job.started_at = datetime.datetime.utcnow()
+        job._started = time.monotonic()
+        try:
+            job.result = fn(job)
+            job.status = "done"
+        except HTTPException as e:
+            job.status = "failed"
+            job.error = e.detail
+        except Exception as e:
+            logger.exception(f"Background {job.kind} job {job.id} failed")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job._finished = time.monotonic()
+            job.finished_at = datetime.datetime.utcnow()
+
+    def _prune(self):
+        finished = [k for k, j in self._jobs.items() if j.status in ("done", "failed")]
+        for key in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[key]
+
+
+# Shared by the upload and delete routes
+jobs = JobRegistry()
@@ -1,87 +1,224 @@
 from fastapi import HTTPException
-from datetime import datetime
+from pymongo import ASCENDING, DESCENDING
+from concurrent.futures import ThreadPoolExecutor
 from logger_setup import logger  
-import pandas as pd
+from helpers.resample_ohlc import resample_ohlc, candles_from_equity, empty_ohlc
+from helpers.ohlc_formats import ohlc_records
+from helpers.portfolio_equity import merge_equity
+from helpers.ohlc_cache import ohlc_cache
+from helpers.columnar_loader import load_columns, aload_columns, DATETIME, FLOAT
+import numpy as np
+import asyncio
+import hashlib
+import json
 
-def get_portfolio_ohlc(
+
+PORTFOLIO_PROJECTION = {"_id": 0, "strategies.strategy": 1, "strategies.lots": 1}
+SERIES_FIELDS = {"Date": DATETIME, "CumulativePnl": FLOAT}
+
+# Per-strategy queries in flight at once on the sync path (each one rides the (strategy, Date) index)
+FETCH_WORKERS = 8
+
+
+def _lots_from_portfolio(portfolio):
+    """strategy → lots for a portfolio doc (404 / 400 when missing or empty)"""
+    if not portfolio:
+        raise HTTPException(404, "Portfolio not found")
+
+    lots_map = {}
+    for s in portfolio.get("strategies", []):
+        name = s.get("strategy")
+        if name:
+            lots_map[name] = s.get("lots", 1)
+
+    if not lots_map:
+        raise HTTPException(400, "No strategies in portfolio")
+    return lots_map
+
+
+def _config_hash(lots_map):
+    return hashlib.sha1(
+        json.dumps(sorted(lots_map.items()), default=str).encode()
+    ).hexdigest()
+
+
+# Latest row of one strategy: a single probe of the (strategy, Date) index
+LATEST_PROJECTION = {"_id": 0, "Date": 1}
+LATEST_SORT = [("Date", DESCENDING)]
+
+
+def _series_marker(names, latest_docs):
+    return tuple((name, doc["Date"] if doc else None) for name, doc in sorted(zip(names, latest_docs), key=lambda p: p[0]))
+
+
+def _series_query(name):
+    return {"strategy": name}, SERIES_FIELDS
+
+
+def _scaled_series(cols, lots):
+    """(Date in ns, CumulativePnl × lots) of one strategy, rows without a Date dropped"""
+    date = cols["Date"]
+    valid = ~np.isnat(date)
+    scale = np.array([lots], dtype=np.float64)[0]     # lots None → NaN, like the old map
+    return date[valid].astype("datetime64[ns]").view(np.int64), cols["CumulativePnl"][valid] * scale
+
+
+# ==================== SYNC ACCESS ====================
+
+def get_portfolio_lots(portfolio_name, db):
+    portfolio = db.portfolios.find_one({"portfolio": portfolio_name}, PORTFOLIO_PROJECTION)
+    return _lots_from_portfolio(portfolio)
+
+
+def portfolio_version(lots_map, db):
+    """
+    Data-version marker: hash of the strategies + lots, plus each strategy's
+    latest Date — one index probe per strategy. Per strategy, so new rows of
+    a strategy that lags the others change it too; like a strategy's own
+    version (get_strategy_version), it doesn't see back-filled older rows.
+    """
+    names = list(lots_map)
+    latest = [db.strategies_mtm_data.find_one({"strategy": name}, LATEST_PROJECTION, sort=LATEST_SORT) for name in names]
+    return _config_hash(lots_map), _series_marker(names, latest)
+
+
+def get_portfolio_version(portfolio_name, db):
+    return portfolio_version(get_portfolio_lots(portfolio_name, db), db)
+
+
+def load_scaled_series(lots_map, db) -> list:
+    """
+    One (time_ns, scaled cumulative) pair per strategy in `lots_map`, each
+    sorted by Date. Strategies are fetched concurrently, one indexed query each.
+    """
+    def fetch(name):
+        cols = load_columns(db.strategies_mtm_data, *_series_query(name), sort=[("Date", ASCENDING)])
+        return _scaled_series(cols, lots_map[name])
+
+    with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, len(lots_map))) as pool:
+        return list(pool.map(fetch, lots_map))
+
+
+# ==================== ASYNC ACCESS ====================
+
+async def get_portfolio_lots_async(portfolio_name, adb):
+    portfolio = await adb.portfolios.find_one({"portfolio": portfolio_name}, PORTFOLIO_PROJECTION)
+    return _lots_from_portfolio(portfolio)
+
+
+async def portfolio_version_async(lots_map, adb):
+    names = list(lots_map)
+    latest = await asyncio.gather(*(
+        adb.strategies_mtm_data.find_one({"strategy": name}, LATEST_PROJECTION, sort=LATEST_SORT) for name in names
+    ))
+    return _config_hash(lots_map), _series_marker(names, latest)
+
+
+async def get_portfolio_version_async(portfolio_name, adb):
+    return await portfolio_version_async(await get_portfolio_lots_async(portfolio_name, adb), adb)
+
+
+async def load_scaled_series_async(lots_map, adb) -> list:
+    async def fetch(name):
+        cols = await aload_columns(adb.strategies_mtm_data, *_series_query(name), sort=[("Date", ASCENDING)])
+        return _scaled_series(cols, lots_map[name])
+
+    # The client pool caps how many of these actually run at once
+    return await asyncio.gather(*(fetch(name) for name in lots_map))
+
+
+# ==================== OHLC ====================
+
+def has_rows(series) -> bool:
+    return any(len(time_ns) for time_ns, _ in series)
+
+
+def build_portfolio_ohlc(series, resolution=None):
+    """Per-strategy scaled series → portfolio OHLC frame (pure CPU, safe to run in a thread)"""
+    # 3️⃣ Merge → portfolio cumulative PnL = sum of every strategy's last value
+    time_ns, equity = merge_equity(series)
+
+    # 7️⃣ Convert UNIX time (IST), open = previous close
+    equity = candles_from_equity(((time_ns // 10**9) - 19800) * 1000, equity)
+
+    # 8️⃣ Aggregate to the requested resolution
+    equity = resample_ohlc(equity[["time", "open", "high", "low", "close"]], resolution)
+
+    return equity[["time", "open", "high", "low", "close"]]
+
+
+def get_portfolio_ohlc_frame(
     portfolio_name,
-    db
+    db,
+    resolution=None,
+    version=None
 ):
+    """Portfolio OHLC as a DataFrame shared with the cache (read-only), empty when there is no data"""
     try:
         # 1. Get strategies + lots
-        portfolio = db.portfolios.find_one(
-            {"portfolio": portfolio_name},
-            {"_id": 0, "strategies.strategy": 1, "strategies.lots": 1}
-        )
-        if not portfolio:
-            raise HTTPException(404, "Portfolio not found")
-
-        lots_map = {}
-        strategy_names = []
-        for s in portfolio.get("strategies", []):
-            name = s.get("strategy")
-            if name:
-                lots_map[name] = s.get("lots", 1)
-                strategy_names.append(name)
-
-        if not strategy_names:
-            raise HTTPException(400, "No strategies in portfolio")
-
-        # 2. Fetch data
-        cursor = (
-            db.strategies_mtm_data
-            .find(
-                {"strategy": {"$in": strategy_names}},
-                {"Date": 1, "CumulativePnl": 1, "strategy": 1}
-            )
-            .batch_size(50000) 
-        )
-        docs = list(cursor)
-        if not docs:
-            return {"portfolio": portfolio_name, "ohlc": []}
-
-        df = pd.DataFrame(docs)
-
-        # 1️⃣ Convert Date to datetime
-        df["Date"] = pd.to_datetime(df["Date"], utc=True)
-
-        # 2️⃣ Apply lots on Cumulative PnL (NOT diff)
-        df["scaled_cumul"] = df["CumulativePnl"] * df["strategy"].map(lots_map)
-
-        # 3️⃣ Pivot → align all strategies on all timestamps
-        pivot = df.pivot_table(
-            index="Date",
-            columns="strategy",
-            values="scaled_cumul",
-            aggfunc="last"
-        )
-
-        # 4️⃣ Forward fill missing cumulative PnL for each strategy
-        pivot = pivot.ffill()
-
-        # 5️⃣ Portfolio cumulative PnL = sum of all strategies horizontally
-        pivot["portfolio_equity"] = pivot.sum(axis=1)
-
-        equity = pivot["portfolio_equity"].reset_index()
-
-        equity["open"] = equity["portfolio_equity"].shift(1).fillna(equity["portfolio_equity"])
-        equity["close"] = equity["portfolio_equity"].fillna(equity["portfolio_equity"])
-
-        # High/Low
-        equity["high"] = equity[["open", "close"]].max(axis=1)
-        equity["low"]  = equity[["open", "close"]].min(axis=1)
-
-        # 7️⃣ Convert UNIX time (IST)
-        equity["time"] = ((equity["Date"].astype("int64") // 10**9) - 19800) * 1000
-        filename = f"{portfolio_name}_csv_{datetime.utcnow():%Y-%m-%d}.csv"
-
-        equity[["time", "open", "high", "low", "close"]].to_csv(
-            filename,
-            index=False
-        )
-        out = equity[["time", "open", "high", "low", "close"]].to_dict("records")
+        lots_map = get_portfolio_lots(portfolio_name, db)
+
+        # Many users watch the same portfolios — reuse the last build until it changes
+        key = ("portfolio", portfolio_name, resolution)
+        if version is None:
+            version = portfolio_version(lots_map, db)
+        out = ohlc_cache.get(key, version)
+        if out is not None:
+            logger.info(f"Serving cached OHLC for portfolio {portfolio_name}")
+            return out
+
+        # 2. Fetch data, 1️⃣ Date as UTC datetime, 2️⃣ lots applied on Cumulative PnL (NOT diff)
+        series = load_scaled_series(lots_map, db)
+        if not has_rows(series):
+            return empty_ohlc()
+
+        out = build_portfolio_ohlc(series, resolution)
+        ohlc_cache.set(key, version, out)
+
+        return out
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error while generating OHLC for portfolio '{portfolio_name}'")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def get_portfolio_ohlc(portfolio_name, db, resolution=None):
+    """Candle dicts, or {"portfolio": ..., "ohlc": []} when the portfolio has no data"""
+    out = get_portfolio_ohlc_frame(portfolio_name, db, resolution)
+    if out.empty:
+        return {"portfolio": portfolio_name, "ohlc": []}
+    return ohlc_records(out)
+
+
+async def get_portfolio_ohlc_frame_async(
+    portfolio_name,
+    adb,
+    resolution=None,
+    version=None
+):
+    """get_portfolio_ohlc_frame for async routes: Mongo I/O on the loop, pandas on a thread"""
+    try:
+        lots_map = await get_portfolio_lots_async(portfolio_name, adb)
+
+        key = ("portfolio", portfolio_name, resolution)
+        if version is None:
+            version = await portfolio_version_async(lots_map, adb)
+        out = ohlc_cache.get(key, version)
+        if out is not None:
+            logger.info(f"Serving cached OHLC for portfolio {portfolio_name}")
+            return out
+
+        series = await load_scaled_series_async(lots_map, adb)
+        if not has_rows(series):
+            return empty_ohlc()
+
+        out = await asyncio.to_thread(build_portfolio_ohlc, series, resolution)
+        ohlc_cache.set(key, version, out)
 
         return out
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error while generating OHLC for portfolio '{portfolio_name}'")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
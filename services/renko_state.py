@@ -0,0 +1,319 @@
+from fastapi import HTTPException
+from datetime import datetime, timezone
+from bson import Binary
+from pymongo import ASCENDING, DESCENDING
+from logger_setup import logger
+from helpers.make_renko import calculate_brick_size, walk_renko, renko_path, fix_duplicate_dates, generate_renko
+from helpers.ohlc_cache import ohlc_cache
+from helpers.resample_ohlc import empty_ohlc
+from services.chart_sources import SOURCES, source_version, load_source_frame, load_source_window
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+
+
+# ==================== SETTINGS ====================
+
+# Collections in the infra DB: one header per parameter set, bricks in
+# chunks, and the brick price at regular candle intervals for windowed reads
+STATES = "renko_states"
+BRICKS = "renko_bricks"
+CHECKPOINTS = "renko_checkpoints"
+
+# Bumped when the stored layout changes; states of another format are rebuilt
+STATE_FORMAT = 4            # 2: bricks + checkpoints per generation, 4: pinned brick size
+
+CHUNK_BRICKS = 50_000       # ~1.2 MB of packed arrays per doc
+CHECKPOINT_CANDLES = 5000   # a window replays at most this many candles before `from`
+
+
+# ==================== STATE KEYS ====================
+
+def state_id(source, name, brick_type, method, value, margin) -> str:
+    return hashlib.sha1(
+        json.dumps([source, name, brick_type, method, value, margin], default=str).encode()
+    ).hexdigest()
+
+
+def _prefix_hash(times: np.ndarray, path: np.ndarray) -> str:
+    """Fingerprint of the candles a state has consumed"""
+    digest = hashlib.sha1(times.astype("<i8").tobytes())
+    digest.update(path.astype("<f8").tobytes())
+    return digest.hexdigest()
+
+
+# ==================== BRICK STORAGE ====================
+
+def _read_bricks(state_db, state, from_seq: int = 0) -> dict:
+    """date (ms) / open / close arrays of a state's bricks, from chunk `from_seq` on"""
+    cols = {"date": [], "open": [], "close": []}
+    cursor = state_db[BRICKS].find(
+        {"state_id": state["_id"], "generation": state["generation"], "seq": {"$gte": from_seq, "$lt": state["chunks"]}},
+        {"_id": 0, "date": 1, "open": 1, "close": 1},
+        sort=[("seq", 1)],
+    )
+    for doc in cursor:
+        cols["date"].append(np.frombuffer(doc["date"], dtype="<i8"))
+        cols["open"].append(np.frombuffer(doc["open"], dtype="<f8"))
+        cols["close"].append(np.frombuffer(doc["close"], dtype="<f8"))
+
+    n = state["bricks"] - from_seq * CHUNK_BRICKS
+    return {
+        "date": np.concatenate(cols["date"] or [np.empty(0, np.int64)]).astype(np.int64)[:n],
+        "open": np.concatenate(cols["open"] or [np.empty(0)]).astype(np.float64)[:n],
+        "close": np.concatenate(cols["close"] or [np.empty(0)]).astype(np.float64)[:n],
+    }
+
+
+def _write_chunks(state_db, sid, generation: int, bricks: dict, first_seq: int) -> int:
+    """
+    Write `bricks` — the bricks from chunk `first_seq` on — as chunks
+    first_seq, first_seq + 1, ... Returns the state's chunk count.
+    """
+    n = len(bricks["date"])
+    for i in range(-(-n // CHUNK_BRICKS)):
+        part = slice(i * CHUNK_BRICKS, (i + 1) * CHUNK_BRICKS)
+        state_db[BRICKS].replace_one(
+            {"state_id": sid, "generation": generation, "seq": first_seq + i},
+            {
+                "state_id": sid,
+                "generation": generation,
+                "seq": first_seq + i,
+                "date": Binary(bricks["date"][part].astype("<i8").tobytes()),
+                "open": Binary(bricks["open"][part].astype("<f8").tobytes()),
+                "close": Binary(bricks["close"][part].astype("<f8").tobytes()),
+            },
+            upsert=True,
+        )
+    return first_seq + -(-n // CHUNK_BRICKS)
+
+
+def _write_checkpoints(state_db, sid, generation: int, times, idx, closes, start: int, start_price: float, last_ts):
+    """
+    Brick price before every CHECKPOINT_CANDLES-th candle from `start` on,
+    given the candles from `start` on (`times`) and their bricks walked from
+    `start_price`. A checkpoint sits on the first candle of its timestamp,
+    so a window loaded from that time holds no candle walked before it —
+    a timestamp already consumed up to `last_ts` gets none.
+    """
+    first = -(-start // CHECKPOINT_CANDLES) * CHECKPOINT_CANDLES - start
+    candles = np.arange(first, len(times), CHECKPOINT_CANDLES)
+    candles = np.unique(np.searchsorted(times, times[candles], side="left"))
+    if last_ts is not None:
+        candles = candles[times[candles] != last_ts]
+    if not len(candles):
+        return
+
+    walked = np.searchsorted(idx, candles, side="left")
+    prices = np.r_[start_price, closes][walked]
+
+    # Re-running the same extension replaces its checkpoints
+    state_db[CHECKPOINTS].delete_many({"state_id": sid, "generation": generation, "candle": {"$gte": start}})
+    state_db[CHECKPOINTS].insert_many([
+        {"state_id": sid, "generation": generation, "candle": int(start + c), "time": int(times[c]), "brick_price": float(p)}
+        for c, p in zip(candles, prices)
+    ])
+
+
+# ==================== INCREMENTAL RENKO ====================
+
+def _renko_output(bricks: dict) -> pd.DataFrame:
+    """Stored bricks as generate_renko's frame"""
+    open_, close = bricks["open"], bricks["close"]
+    return fix_duplicate_dates(pd.DataFrame({
+        "date": pd.to_datetime(bricks["date"], unit="ms"),
+        "open": open_,
+        "high": np.maximum(open_, close),
+        "low": np.minimum(open_, close),
+        "close": close,
+    }))
+
+
+def _continues(state, times, path) -> bool:
+    """
+    Whether a state can be extended: same format, and the candles it
+    consumed are still the start of the series — their hash, so a row
+    added, removed or edited before its last candle (retroactive change)
+    rebuilds it.
+    """
+    if not state or state.get("format") != STATE_FORMAT:
+        return False
+    consumed = state["candles"]
+    return consumed <= len(times) and _prefix_hash(times[:consumed], path[:consumed]) == state["prefix_hash"]
+
+
+def _build(state, source, name, db, version, key, marker, state_db, sid):
+    """
+    Extend the state by the candles it hasn't consumed, or rebuild it from the
+    first candle. Writes only the new bricks (and the partly filled chunk
+    they continue). Returns (header, new bricks, (generation, bricks) of the
+    state extended or None), or None when the source has no candles.
+    """
+    brick_type, method, value, margin = key[2:]
+    df = load_source_frame(source, name, db, version)
+    if df.empty:
+        return None
+    times = df["time"].to_numpy().astype(np.int64)
+    path = renko_path(df, brick_type)
+
+    if _continues(state, times, path):
+        generation, brick_size = state["generation"], state["brick_size"]
+        start, start_price = state["candles"], state["brick_price"]
+        extended = (generation, state["bricks"])
+    else:
+        # First call, older format or a rewritten history: from scratch
+        current = state if state and state.get("format") == STATE_FORMAT else None
+        generation = (state or {}).get("generation", 0) + 1
+        # Pinned for the parameter set: a rebuild keeps the state's brick size
+        brick_size = current["brick_size"] if current else calculate_brick_size(df, method, value, margin)
+        start, start_price = 0, path[0, 0]
+        extended = None
+        if state:
+            logger.info(f"Rebuilding Renko state {sid} ({key[0]} {key[1]})")
+
+    idx, opens, closes, brick_price = walk_renko(path[start:], start_price, brick_size)
+    new = {"date": times[start:][idx], "open": opens, "close": closes}
+
+    from_brick = extended[1] if extended else 0
+    first_seq = from_brick // CHUNK_BRICKS
+    if extended and not len(new["date"]):
+        chunks = state["chunks"]
+    else:
+        block = new
+        if from_brick % CHUNK_BRICKS:
+            head = _read_bricks(state_db, state, from_seq=first_seq)
+            block = {c: np.concatenate([head[c], new[c]]) for c in new}
+        chunks = _write_chunks(state_db, sid, generation, block, first_seq)
+    last_ts = int(times[start - 1]) if start else None
+    _write_checkpoints(state_db, sid, generation, times[start:], idx, closes, start, start_price, last_ts)
+
+    header = {
+        "_id": sid,
+        **dict(zip(("source", "name", "brick_type", "method", "value", "margin"), key)),
+        "version": marker,
+        "format": STATE_FORMAT,
+        "brick_size": brick_size,
+        "brick_price": float(brick_price),
+        "candles": len(times),
+        "last_ts": int(times[-1]),
+        "prefix_hash": _prefix_hash(times, path),
+        "bricks": from_brick + len(new["date"]),
+        "chunks": chunks,
+        "generation": generation,
+        "updated_at": datetime.now(timezone.utc),
+    }
+    state_db[STATES].replace_one({"_id": sid}, header, upsert=True)
+    if extended is None:
+        state_db[BRICKS].delete_many({"state_id": sid, "generation": {"$ne": generation}})
+        state_db[CHECKPOINTS].delete_many({"state_id": sid, "generation": {"$ne": generation}})
+
+    return header, new, extended
+
+
+def _all_bricks(state_db, state, new, extended) -> dict:
+    """
+    Every brick of a state: the in-process copy of the state it was extended
+    from plus the new bricks, read back from the chunks only when there is
+    no copy (another process extended it, or the copy expired).
+    """
+    key = ("renko-bricks", state["_id"])
+    bricks = None
+    if new is not None:
+        old = ohlc_cache.get(key, extended) if extended else {c: v[:0] for c, v in new.items()}
+        if old is not None:
+            bricks = {c: np.concatenate([old[c], new[c]]) for c in new}
+    if bricks is None:
+        bricks = ohlc_cache.get(key, (state["generation"], state["bricks"]))
+    if bricks is None:
+        bricks = _read_bricks(state_db, state)
+    ohlc_cache.set(key, (state["generation"], state["bricks"]), bricks)
+    return bricks
+
+
+def _window_bricks(source, name, db, version, state_db, state, brick_type, from_ts, to_ts) -> dict:
+    """
+    Bricks of the candles in [from, to) exactly as the full walk forms them:
+    the walk restarts at the last checkpoint at or before `from` (the first
+    one without `from`) with the state's brick size, or at the first candle
+    when the state has no checkpoint.
+    """
+    query = {"state_id": state["_id"], "generation": state["generation"]}
+    checkpoint = None
+    if from_ts is not None:
+        checkpoint = state_db[CHECKPOINTS].find_one(
+            {**query, "time": {"$lte": from_ts * 1000}}, sort=[("time", DESCENDING)])
+    if checkpoint is None:
+        checkpoint = state_db[CHECKPOINTS].find_one(query, sort=[("time", ASCENDING)])
+
+    if checkpoint is None:
+        df = load_source_frame(source, name, db, version)
+        if to_ts is not None:
+            df = df[df["time"] < to_ts * 1000]
+    else:
+        df = load_source_window(source, name, db, version, checkpoint["time"], to_ts)
+    times = df["time"].to_numpy().astype(np.int64)
+    path = renko_path(df, brick_type)
+    if not len(path):
+        return {"date": times, "open": np.empty(0), "close": np.empty(0)}
+    start_price = path[0, 0] if checkpoint is None else checkpoint["brick_price"]
+    idx, opens, closes, _ = walk_renko(path, start_price, state["brick_size"])
+
+    keep = slice(None) if from_ts is None else times[idx] >= from_ts * 1000
+    return {"date": times[idx][keep], "open": opens[keep], "close": closes[keep]}
+
+
+def get_renko(source, name, brick_type, method, value, margin, db, state_db, from_ts=None, to_ts=None):
+    """
+    Renko bricks of a strategy / portfolio / file as generate_renko returns
+    them, kept as a persisted state per parameter set in the infra DB: the
+    brick list, the last brick price and the candles consumed so far.
+
+    A call walks only the candles that arrived since the state was saved and
+    appends only their bricks. The brick size is fixed when the state is
+    first built and kept for its parameter set, rebuilds included; the state
+    is rebuilt from the first candle when the candles it consumed no longer
+    match (a row added, removed or edited before its last candle) or it was
+    saved in another format. Nothing is read beyond one version probe while
+    the source hasn't changed.
+
+    from_ts / to_ts (UTC seconds) keep only the bricks of candles in
+    [from, to), replayed from the nearest checkpoint instead of the first
+    candle — the same bricks as the full series gives, brick size included.
+    """
+    if source not in SOURCES:
+        raise HTTPException(status_code=400, detail=f"type must be one of {', '.join(SOURCES)}")
+    try:
+        key = (source, name, brick_type, method, value, margin)
+        sid = state_id(*key)
+        version = source_version(source, name, db)
+        marker = str(version)
+
+        cache_key = ("renko", sid, from_ts, to_ts)
+        out = ohlc_cache.get(cache_key, version)
+        if out is not None:
+            return out
+
+        new = extended = None
+        state = state_db[STATES].find_one({"_id": sid})
+        if not state or state["version"] != marker or state.get("format") != STATE_FORMAT:
+            built = _build(state, source, name, db, version, key, marker, state_db, sid)
+            if built is None:
+                return generate_renko(empty_ohlc(), brick_type, method, value, margin=margin)
+            state, new, extended = built
+
+        if from_ts is not None or to_ts is not None:
+            bricks = _window_bricks(source, name, db, version, state_db, state, brick_type, from_ts, to_ts)
+        else:
+            bricks = _all_bricks(state_db, state, new, extended)
+
+        out = (_renko_output(bricks), state["brick_size"])
+        ohlc_cache.set(cache_key, version, out)
+        return out
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Error while building Renko for {source} '{name}'")
+        raise HTTPException(status_code=500, detail=str(e))
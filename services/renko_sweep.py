@@ -0,0 +1,90 @@
+from fastapi import HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from logger_setup import logger
+from helpers.make_renko import calculate_brick_size, walk_renko, renko_path, fix_duplicate_dates, _renko_frame
+from services.chart_sources import SOURCES, source_version, load_source_frame
+import pandas as pd
+import numpy as np
+
+
+# ==================== SETTINGS ====================
+
+MAX_SWEEP_COMBINATIONS = 100
+SWEEP_WORKERS = 4       # brick walks in flight at once (numpy releases the GIL on large arrays)
+
+
+# ==================== STATS ====================
+
+def renko_stats(opens: np.ndarray, closes: np.ndarray) -> dict:
+    """Brick counts and trend runs of one brick set"""
+    up = closes > opens
+    n = len(up)
+    # Run = consecutive bricks in one direction; a new run is a reversal
+    starts = np.flatnonzero(np.r_[True, up[1:] != up[:-1]]) if n else np.empty(0, dtype=np.int64)
+    runs = np.diff(np.r_[starts, n])
+    return {
+        "bricks": n,
+        "up_bricks": int(up.sum()),
+        "down_bricks": int(n - up.sum()),
+        "reversals": max(len(starts) - 1, 0),
+        "longest_run": int(runs.max()) if n else 0,
+        "avg_run": round(float(runs.mean()), 2) if n else 0.0,
+    }
+
+
+# ==================== SWEEP ====================
+
+def run_renko_sweep(source, name, combinations: list, margin, db, include_bricks: bool = False) -> dict:
+    """
+    Renko bricks for many (brick_type, method, value) combinations of one
+    source: the series is loaded once, each distinct (brick_type, brick size)
+    is walked once, in parallel. Every result carries renko_stats, plus the
+    bricks as generate_renko returns them with `include_bricks`.
+    """
+    if source not in SOURCES:
+        raise HTTPException(status_code=400, detail=f"type must be one of {', '.join(SOURCES)}")
+    if not combinations:
+        raise HTTPException(status_code=400, detail="combinations must not be empty")
+    if len(combinations) > MAX_SWEEP_COMBINATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SWEEP_COMBINATIONS} combinations per sweep")
+
+    try:
+        df = load_source_frame(source, name, db, source_version(source, name, db))
+        if df.empty:
+            raise HTTPException(status_code=404, detail=f"No data for {source} '{name}'")
+
+        times = df["time"].to_numpy().astype(np.int64)
+        paths = {}
+        walks = []
+        for combo in combinations:
+            brick_type = combo["brick_type"]
+            if brick_type not in paths:
+                paths[brick_type] = renko_path(df, brick_type)
+            size = calculate_brick_size(df, combo["method"], combo["value"], margin)
+            walks.append((brick_type, size))
+
+        def walk(key):
+            path = paths[key[0]]
+            return walk_renko(path, path[0, 0], key[1])
+
+        distinct = list(dict.fromkeys(walks))
+        with ThreadPoolExecutor(max_workers=min(SWEEP_WORKERS, len(distinct))) as pool:
+            bricks = dict(zip(distinct, pool.map(walk, distinct)))
+
+        results = []
+        for combo, key in zip(combinations, walks):
+            idx, opens, closes, _ = bricks[key]
+            result = {**combo, "brick_size": key[1], **renko_stats(opens, closes)}
+            if include_bricks:
+                result["renko"] = fix_duplicate_dates(_renko_frame(pd.to_datetime(times[idx], unit="ms"), opens, closes))
+            results.append(result)
+
+        logger.info(f"Renko sweep for {source} '{name}': {len(combinations)} combinations, {len(distinct)} walks")
+        return {"type": source, "name": name, "candles": len(times), "results": results}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Error during Renko sweep for {source} '{name}'")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,44 +1,209 @@
 from fastapi import HTTPException
-from logger_setup import logger  
-import pandas as pd
+from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING
+from logger_setup import logger
+from helpers.resample_ohlc import resolution_to_ms, bucket_start, resample_ohlc, candles_from_equity, empty_ohlc
+from helpers.ohlc_formats import ohlc_records
+from helpers.ohlc_cache import ohlc_cache
+from helpers.columnar_loader import load_columns, iter_column_batches, DATETIME, FLOAT
+import numpy as np
 
-def get_strategy_ohlc(
+# strategies_mtm_data stores IST wall-clock time in the BSON date,
+# TradingView works in real UTC seconds
+IST_OFFSET_SECONDS = 19800
+
+
+def to_db_date(ts):
+    """UTC unix seconds (TradingView from/to) → Date value as stored in Mongo"""
+    return datetime.fromtimestamp(ts + IST_OFFSET_SECONDS, tz=timezone.utc)
+
+
+def to_chart_time(date):
+    """Stored Date → UTC unix milliseconds used by the charts"""
+    return (int(date.replace(tzinfo=timezone.utc).timestamp()) - IST_OFFSET_SECONDS) * 1000
+
+
+def _date_filter(from_ts=None, to_ts=None):
+    date_filter = {}
+    if from_ts is not None:
+        date_filter["$gte"] = to_db_date(from_ts)
+    if to_ts is not None:
+        date_filter["$lt"] = to_db_date(to_ts)
+    return date_filter
+
+
+def _previous_close(strategy_name, db, before):
+    """CumulativePnl of the last row strictly before `before` (a stored Date)"""
+    prev = db.strategies_mtm_data.find_one(
+        {"strategy": strategy_name, "Date": {"$lt": before}},
+        {"_id": 0, "CumulativePnl": 1},
+        sort=[("Date", DESCENDING)]
+    )
+    return prev["CumulativePnl"] if prev else None
+
+
+def get_strategy_next_time(strategy_name, db, before_ts):
+    """
+    Chart time (ms) of the latest candle before `before_ts` (UTC seconds),
+    or None when there is no older history — TradingView's nextTime.
+    """
+    doc = db.strategies_mtm_data.find_one(
+        {"strategy": strategy_name, "Date": {"$lt": to_db_date(before_ts)}},
+        {"_id": 0, "Date": 1},
+        sort=[("Date", DESCENDING)]
+    )
+    return to_chart_time(doc["Date"]) if doc else None
+
+
+def get_strategy_version(strategy_name, db):
+    """Cheap data-version marker: the latest Date stored for the strategy (one index probe)"""
+    doc = db.strategies_mtm_data.find_one(
+        {"strategy": strategy_name},
+        {"_id": 0, "Date": 1},
+        sort=[("Date", DESCENDING)]
+    )
+    return doc["Date"] if doc else None
+
+
+MTM_FIELDS = {"Date": DATETIME, "CumulativePnl": FLOAT}
+
+
+def _chart_ms(dates):
+    """datetime64[ms] Date column → chart times (UTC ms, whole seconds)"""
+    return (dates.astype(np.int64) // 1000 - IST_OFFSET_SECONDS) * 1000
+
+
+def _last_buckets(batches, count_back, bucket_ms):
+    """
+    Consume newest-first column batches until `count_back` buckets are complete.
+    Returns (dates, closes) oldest-first and the close of the row just before them.
+    """
+    dates, closes = [], []
+    seen = 0
+    current = None
+    for batch in batches:
+        d, c = batch["Date"], batch["CumulativePnl"]
+        if not len(d):
+            continue
+        buckets = bucket_start(_chart_ms(d), bucket_ms)
+        new_bucket = np.r_[buckets[0] != current, buckets[1:] != buckets[:-1]]
+        ordinal = seen + np.cumsum(new_bucket)
+
+        over = np.flatnonzero(ordinal > count_back)
+        if len(over):
+            k = over[0]
+            dates.append(d[:k])
+            closes.append(c[:k])
+            return np.concatenate(dates)[::-1], np.concatenate(closes)[::-1], c[k]
+
+        dates.append(d)
+        closes.append(c)
+        seen = ordinal[-1]
+        current = buckets[-1]
+
+    if not dates:
+        return np.empty(0, dtype="datetime64[ms]"), np.empty(0), None
+    return np.concatenate(dates)[::-1], np.concatenate(closes)[::-1], None
+
+
+def get_strategy_ohlc_frame(
         strategy_name,
-        db):
-    try:
-        logger.info(f"Fetching MTM data for strategy: {strategy_name}")
-        cursor = db.strategies_mtm_data.find(
-            {
-                "strategy": strategy_name,
-            },
-            {"_id": 0, "Date": 1, "CumulativePnl": 1}
-        )
+        db,
+        from_ts=None,
+        to_ts=None,
+        count_back=None,
+        resolution=None,
+        version=None):
+    """
+    OHLC candles for a strategy as a time/open/high/low/close DataFrame
+    (shared with the cache — treat it as read-only).
 
-        df = pd.DataFrame(list(cursor))
-        # df.to_csv('sorted.csv')
-        if df.empty:
-            return []
-            
-        # ---- 2. Convert datetime to UNIX timestamp ---- #
-        df["time"] = (df["Date"].astype("int64") // 10**9 -19800) * 1000   # Faster than .timestamp()
-        
-        # ---- 3. Compute OHLC using vectorized operations ---- #
-        # OPEN = previous close or current if it's first row
-        df["open"] = df["CumulativePnl"].shift(1).fillna(df["CumulativePnl"])
-
-        # CLOSE = current CumulativePnl
-        df["close"] = df["CumulativePnl"]
-
-        # HIGH & LOW
-        df["high"] = df[["open", "close"]].max(axis=1)
-        df["low"]  = df[["open", "close"]].min(axis=1)
-        # df.to_csv('test.csv')
-        # ---- 4. Select final required columns ---- #
-        out = df[["time", "open", "high", "low", "close"]].to_dict(orient="records")
-
-        logger.info(f"Generated {len(out)} OHLC candles for {strategy_name}")
+    from_ts / to_ts : UTC seconds, [from, to) window served by the (strategy, Date) index
+    count_back      : return the last N candles before `to` (takes priority over `from`)
+    resolution      : aggregate into 1/5/15/60/1D/1W candles, raw rows when None
+    No window at all returns the full history.
+    Results are cached until the strategy receives new data; pass `version`
+    when the caller already looked it up.
+    """
+    try:
+        key = ("strategy", strategy_name, from_ts, to_ts, count_back, resolution)
+        if version is None:
+            version = get_strategy_version(strategy_name, db)
+        out = ohlc_cache.get(key, version)
+        if out is not None:
+            logger.info(f"Serving cached OHLC for {strategy_name}")
+            return out
 
+        out = _build_strategy_ohlc(strategy_name, db, from_ts, to_ts, count_back, resolution)
+        ohlc_cache.set(key, version, out)
         return out
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error while generating OHLC for '{strategy_name}'")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def get_strategy_ohlc(strategy_name, db, from_ts=None, to_ts=None, count_back=None, resolution=None):
+    """get_strategy_ohlc_frame as a list of candle dicts"""
+    return ohlc_records(get_strategy_ohlc_frame(strategy_name, db, from_ts, to_ts, count_back, resolution))
+
+
+def _build_strategy_ohlc(strategy_name, db, from_ts, to_ts, count_back, resolution):
+    logger.info(f"Fetching MTM data for strategy: {strategy_name}")
+    bucket_ms = resolution_to_ms(resolution)
+    prev_close = None
+
+    query = {"strategy": strategy_name}
+    if count_back:
+        # Newest first, one extra row/bucket to seed the first candle's open
+        date_filter = _date_filter(to_ts=to_ts)
+        if date_filter:
+            query["Date"] = date_filter
+
+        if bucket_ms is None:
+            cols = load_columns(
+                db.strategies_mtm_data, query, MTM_FIELDS,
+                sort=[("Date", DESCENDING)], limit=count_back + 1
+            )
+            dates = cols["Date"][::-1]
+            closes = cols["CumulativePnl"][::-1]
+            if len(dates) > count_back:
+                prev_close = closes[0]
+                dates, closes = dates[1:], closes[1:]
+        else:
+            batches = iter_column_batches(
+                db.strategies_mtm_data, query, MTM_FIELDS,
+                sort=[("Date", DESCENDING)], batch_size=5000
+            )
+            dates, closes, prev_close = _last_buckets(batches, count_back, bucket_ms)
+
+    else:
+        date_filter = _date_filter(from_ts, to_ts)
+        if date_filter:
+            query["Date"] = date_filter
+        cols = load_columns(
+            db.strategies_mtm_data, query, MTM_FIELDS,
+            sort=[("Date", ASCENDING)]
+        )
+        dates = cols["Date"]
+        closes = cols["CumulativePnl"]
+        if len(dates) and from_ts is not None:
+            first = dates[0].item().replace(tzinfo=timezone.utc)
+            prev_close = _previous_close(strategy_name, db, first)
+
+    if not len(dates):
+        return empty_ohlc()
+
+    # ---- 2. Build candles: open = previous close, close = CumulativePnl ---- #
+    df = candles_from_equity(_chart_ms(dates), closes, prev_close)
+
+    # ---- 3. Aggregate to the requested resolution ---- #
+    df = resample_ohlc(df, resolution)
+
+    # ---- 4. Select final required columns ---- #
+    out = df[["time", "open", "high", "low", "close"]]
+
+    logger.info(f"Generated {len(out)} OHLC candles for {strategy_name}")
+
+    return out
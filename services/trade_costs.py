@@ -0,0 +1,116 @@
+from pymongo import DESCENDING
+from helpers.ohlc_cache import ohlc_cache
+import numpy as np
+import asyncio
+
+
+DAY_NS = 86_400 * 10**9
+
+
+# ==================== PER-STRATEGY DAILY STATS ====================
+
+def daily_trade_pipeline(strategy) -> list:
+    """
+    Aggregation reducing one strategy's trade log to a doc per UTC day with
+    trades: {_id: "YYYY-MM-DD", trades, prices = Σ (entry + exit)}. Rides the
+    (strategy, Key) index; trades without a Key are dropped and a missing
+    price adds nothing to the sum.
+    """
+    return [
+        {"$match": {"strategy": strategy}},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$Key"}},
+            "trades": {"$sum": 1},
+            "prices": {"$sum": {"$add": ["$EntryPrice", "$ExitPrice"]}},
+        }},
+        {"$match": {"_id": {"$ne": None}}},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+def _daily_stats(docs) -> tuple:
+    """daily_trade_pipeline docs → (day as datetime64[D], trades, price sum), days ascending"""
+    return (
+        np.array([d["_id"] for d in docs], dtype="datetime64[D]"),
+        np.array([d["trades"] for d in docs], dtype=np.float64),
+        np.array([d["prices"] for d in docs], dtype=np.float64),
+    )
+
+
+async def trade_log_versions_async(strategies, adb) -> dict:
+    """
+    strategy → data version of its trade log: its latest Key (None without
+    trades), one probe of the (strategy, Key) index per strategy. Trades
+    back-filled behind the latest Key don't change it.
+    """
+    latest = await asyncio.gather(*(
+        adb.strategies_trade_logs.find_one({"strategy": name}, {"_id": 0, "Key": 1}, sort=[("Key", DESCENDING)])
+        for name in strategies
+    ))
+    return {name: doc["Key"] if doc else None for name, doc in zip(strategies, latest)}
+
+
+async def get_daily_trade_stats_async(strategy, version, adb) -> tuple:
+    """
+    _daily_stats of one strategy's trade log. Independent of any portfolio's
+    lots / brokerage / slippage, so it is cached per strategy until its
+    trade log version (trade_log_versions_async) changes.
+    """
+    key = ("trade-days", strategy)
+    out = ohlc_cache.get(key, version)
+    if out is None:
+        cursor = await adb.strategies_trade_logs.aggregate(daily_trade_pipeline(strategy))
+        out = _daily_stats([doc async for doc in cursor])
+        ohlc_cache.set(key, version, out)
+    return out
+
+
+async def load_daily_trade_stats_async(versions: dict, adb) -> dict:
+    """strategy → _daily_stats for trade_log_versions_async's strategies, one aggregation per strategy not cached yet"""
+    stats = await asyncio.gather(*(get_daily_trade_stats_async(name, version, adb) for name, version in versions.items()))
+    return dict(zip(versions, stats))
+
+
+# ==================== PORTFOLIO COSTS ====================
+
+def portfolio_daily_costs(stats: dict, lots_map, brokerage_map, slippage_map) -> tuple:
+    """
+    (day, cost) of a portfolio, days ascending. Per strategy and day:
+
+        brokerage = trades × lots × brokerage
+        slippage  = Σ (entry + exit) × lots × slippage rate
+
+    Both are linear in lots, so each is the strategy's per-lot daily series
+    scaled by its lots; a part with a missing setting (NaN) counts as 0.
+    """
+    days, costs = [], []
+    for name, (day, trades, prices) in stats.items():
+        lots = np.array([lots_map.get(name)], dtype=np.float64)[0]
+        brokerage = np.array([brokerage_map.get(name)], dtype=np.float64)[0]
+        days.append(day)
+        costs.append(np.nan_to_num(trades * lots * brokerage) + np.nan_to_num(prices * (lots * slippage_map[name])))
+
+    if not days:
+        return np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=np.float64)
+    all_days, slot = np.unique(np.concatenate(days), return_inverse=True)
+    return all_days, np.bincount(slot, weights=np.concatenate(costs), minlength=len(all_days))
+
+
+def eod_cost_deduction(time_ns: np.ndarray, days: np.ndarray, costs: np.ndarray) -> np.ndarray:
+    """
+    Per timestamp of a sorted, unique UTC ns path: the day's whole cost at the
+    day's last timestamp, 0 everywhere else (costs of days without a
+    timestamp are dropped).
+    """
+    deduction = np.zeros(len(time_ns))
+    if not len(time_ns) or not len(days):
+        return deduction
+
+    day = time_ns // DAY_NS
+    eod = np.flatnonzero(np.r_[day[1:] != day[:-1], True])
+
+    cost_day = days.astype(np.int64)
+    pos = np.minimum(np.searchsorted(cost_day, day[eod]), len(cost_day) - 1)
+    hit = cost_day[pos] == day[eod]
+    deduction[eod[hit]] = costs[pos[hit]]
+    return deduction
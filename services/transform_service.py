@@ -0,0 +1,38 @@
+from fastapi import HTTPException
+from logger_setup import logger
+from helpers.chart_transforms import apply_transform, transform_params
+from helpers.ohlc_cache import ohlc_cache
+from services.chart_sources import SOURCES, source_version, load_source_frame
+
+
+# ==================== TRANSFORMS ====================
+
+def get_transform(source, name, transform, params: dict, db):
+    """
+    A derived chart (helpers.chart_transforms.TRANSFORMS) over the full
+    history of a strategy / portfolio / file. Cached per (source, transform,
+    params) until the source receives new data.
+    """
+    if source not in SOURCES:
+        raise HTTPException(status_code=400, detail=f"type must be one of {', '.join(SOURCES)}")
+    try:
+        params = transform_params(transform, params)
+        version = source_version(source, name, db)
+
+        key = ("transform", source, name, transform, tuple(sorted(params.items())))
+        out = ohlc_cache.get(key, version)
+        if out is not None:
+            return out
+
+        df = load_source_frame(source, name, db, version)
+        out = apply_transform(df, transform, params)
+        ohlc_cache.set(key, version, out)
+        logger.info(f"{transform} for {source} '{name}': {len(df)} candles -> {len(out)} rows")
+        return out
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception(f"Error while building {transform} for {source} '{name}'")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,83 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# ==================== ASYNC MONGO STAND-IN ====================
+
+class _AsyncCursor:
+    def __init__(self, docs):
+        self._docs = iter(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class AsyncCollection:
+    """The slice of pymongo's AsyncCollection the services use, over a mongomock collection"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        return self._collection.find_one(*args, **kwargs)
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.find(*args, **kwargs))
+
+    async def aggregate(self, pipeline, **kwargs):
+        return _AsyncCursor(self._collection.aggregate(pipeline, **kwargs))
+
+
+class AsyncDatabase:
+    def __init__(self, db):
+        self._db = db
+        self.name = db.name
+
+    def __getattr__(self, name):
+        return AsyncCollection(getattr(self._db, name))
+
+    def __getitem__(self, name):
+        return AsyncCollection(self._db[name])
+
+
+# ==================== MONGOMOCK DATABASES ====================
+
+def _find_raw_batches(self, filter=None, projection=None, sort=None, limit=0, batch_size=0, **kwargs):
+    """find_raw_batches (not in mongomock): BSON-concatenated batches of find"""
+    bson = pytest.importorskip("bson")
+    cursor = self.find(filter, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    docs = list(cursor)
+    size = batch_size or 101
+    for i in range(0, len(docs), size):
+        yield b"".join(bson.encode(doc) for doc in docs[i:i + size])
+
+
+@pytest.fixture
+def mongomock(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    monkeypatch.setattr(mongomock.collection.Collection, "find_raw_batches", _find_raw_batches, raising=False)
+    return mongomock
+
+
+@pytest.fixture
+def fin_db(mongomock):
+    return mongomock.MongoClient().finsage
+
+
+@pytest.fixture
+def infra_db(mongomock):
+    return mongomock.MongoClient().infra
@@ -0,0 +1,39 @@
+"""
+ETags are weak: the compression middleware sends the same tag for br, gzip
+and identity bodies, and any of them revalidates to a 304.
+"""
+import pytest
+
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from helpers.etag import etag_matches, make_etag  # noqa: E402
+from routes import upload_file  # noqa: E402
+
+
+@pytest.fixture
+def client(infra_db, monkeypatch):
+    monkeypatch.setitem(main.app.dependency_overrides, upload_file.get_db, lambda: infra_db)
+    # Listing large enough to be compressed
+    infra_db.files.insert_many([{"filename": f"file-{i}.csv", "file_type": "csv", "total_rows": i} for i in range(100)])
+    return TestClient(main.app)
+
+
+def test_make_etag_is_weak():
+    etag = make_etag("strategy", "A", 1)
+    assert etag.startswith('W/"') and etag == make_etag("strategy", "A", 1)
+    assert etag_matches(etag, etag) and etag_matches(etag.removeprefix("W/"), etag)
+    assert not etag_matches(make_etag("strategy", "A", 2), etag)
+
+
+@pytest.mark.parametrize("encoding", ["br", "gzip", "identity"])
+def test_encodings_share_a_weak_etag(client, encoding):
+    plain = client.get("/api/file", headers={"Accept-Encoding": "identity"})
+    r = client.get("/api/file", headers={"Accept-Encoding": encoding})
+
+    assert r.headers.get("content-encoding", "identity") == encoding
+    assert r.headers["etag"] == plain.headers["etag"] and r.headers["etag"].startswith('W/"')
+    again = client.get("/api/file", headers={"Accept-Encoding": encoding, "If-None-Match": r.headers["etag"]})
+    assert again.status_code == 304
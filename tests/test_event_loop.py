@@ -0,0 +1,78 @@
+"""
+The async portfolio routes keep the event loop free: while a portfolio build
+is blocked on its worker thread, other requests are still answered.
+"""
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+import main  # noqa: E402
+from helpers.ohlc_cache import ohlc_cache  # noqa: E402
+from routes import portfolio_ohlc, strategy_ohlc  # noqa: E402
+from services import portfolio_ohlc_service  # noqa: E402
+from conftest import AsyncDatabase  # noqa: E402
+
+BUILD_SECONDS = 1.0     # how long the stubbed portfolio build blocks its thread
+LISTING_BOUND = 0.3     # /api/strategies must answer well within that
+
+
+@pytest.fixture
+def app(fin_db, monkeypatch):
+    fin_db.portfolios.insert_one({"portfolio": "P", "strategies": [{"strategy": "A", "lots": 2}]})
+    fin_db.strategies.insert_one({"strategy": "A", "segment": "eq", "type": "intraday"})
+    fin_db.strategies_mtm_data.insert_one({"strategy": "A", "Date": np.datetime64("2024-01-01T09:15").item(), "CumulativePnl": 1.0})
+
+    started = threading.Event()
+    build = portfolio_ohlc_service.build_portfolio_ohlc
+
+    def slow_build(*args, **kwargs):
+        started.set()
+        time.sleep(BUILD_SECONDS)       # blocking, like a large pandas build
+        return build(*args, **kwargs)
+
+    async def one_series(lots_map, adb):
+        t = np.array([1_704_100_500 * 10**9], dtype=np.int64)
+        return [(t, np.array([2.0]))]
+
+    monkeypatch.setattr(portfolio_ohlc_service, "build_portfolio_ohlc", slow_build)
+    monkeypatch.setattr(portfolio_ohlc_service, "load_scaled_series_async", one_series)
+    monkeypatch.setitem(main.app.dependency_overrides, strategy_ohlc.get_db, lambda: fin_db)
+
+    async def async_db():
+        return AsyncDatabase(fin_db)
+    monkeypatch.setitem(main.app.dependency_overrides, portfolio_ohlc.get_async_db, async_db)
+
+    ohlc_cache.clear()
+    yield main.app, started
+    ohlc_cache.clear()
+
+
+def test_listing_answers_while_portfolio_builds(app):
+    app, started = app
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            portfolio = asyncio.create_task(client.get("/api/portfolio/P/mtms"))
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+
+            t0 = time.perf_counter()
+            listing = await client.get("/api/strategies")
+            elapsed = time.perf_counter() - t0
+            still_building = not portfolio.done()
+            return listing, elapsed, still_building, await portfolio
+
+    listing, elapsed, still_building, portfolio = asyncio.run(scenario())
+
+    assert listing.status_code == 200
+    assert listing.json() == [{"strategy": "A", "segment": "eq", "type": "intraday"}]
+    assert elapsed < LISTING_BOUND
+    assert still_building
+    assert portfolio.status_code == 200
+    assert len(portfolio.json()) == 1
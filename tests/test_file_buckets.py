@@ -0,0 +1,140 @@
+"""
+Bucketed file storage: BucketPacker cuts a row stream into buckets with
+chained opens, iter_bucket_rows reads any window back in time order (also
+from overlapping buckets), repack_buckets fixes an out-of-order upload and
+migrate_file converts per-row files that no job owns.
+"""
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from services import file_buckets
+from services.file_buckets import BUCKETS, BucketPacker, iter_bucket_rows, last_bucket_row, migrate_file, repack_buckets
+
+T0 = 1_700_000_000
+
+
+@pytest.fixture(autouse=True)
+def no_pause(monkeypatch):
+    monkeypatch.setattr(file_buckets, "DELETE_PAUSE_SECONDS", 0)
+
+
+def read(collection, file_id, ts_filter=None, descending=False, limit=0):
+    parts = list(iter_bucket_rows(collection, file_id, ts_filter, descending, limit))
+    if not parts:
+        return {"timestamp": np.empty(0), "CumulativePnl": np.empty(0), "open": np.empty(0)}
+    return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+
+def store(collection, file_id, ts, pnl, bucket_rows, chunk=7):
+    packer = BucketPacker(file_id, bucket_rows)
+    for i in range(0, len(ts), chunk):
+        docs = packer.add(np.asarray(ts[i:i + chunk], dtype=np.float64), np.asarray(pnl[i:i + chunk], dtype=np.float64))
+        if docs:
+            collection.insert_many(docs)
+    collection.insert_many(packer.flush())
+    return packer
+
+
+def test_packer_cuts_across_chunks_and_chains_opens(infra_db):
+    fid = ObjectId()
+    ts, pnl = T0 + 60 * np.arange(23), np.arange(23.0)
+    packer = store(infra_db.timeseries_mtm_buckets, fid, ts, pnl, bucket_rows=5)
+
+    docs = list(infra_db.timeseries_mtm_buckets.find({}, sort=[("seq", 1)]))
+    assert [d["count"] for d in docs] == [5, 5, 5, 5, 3]
+    assert [d["seq"] for d in docs] == [0, 1, 2, 3, 4] and packer.ordered
+    cols = read(infra_db.timeseries_mtm_buckets, fid)
+    assert np.array_equal(cols["timestamp"], ts)
+    assert np.array_equal(cols["open"], np.r_[0.0, pnl[:-1]])
+
+
+def test_packer_drops_unchartable_rows():
+    packer = BucketPacker(ObjectId(), bucket_rows=10)
+    packer.add(np.array([T0, np.nan, T0 + 60, T0 + 120]), np.array([1.0, 2.0, np.inf, np.nan]))
+    (doc,) = packer.flush()
+    assert doc["count"] == 1
+    assert packer.dropped == {"invalid_date": 1, "non_finite_pnl": 2}
+
+
+@pytest.fixture
+def overlapping(infra_db):
+    """Shuffled upload: buckets overlap in time, equal timestamps across buckets"""
+    fid = ObjectId()
+    rng = np.random.default_rng(5)
+    ts = T0 + 60 * rng.integers(0, 40, 60)
+    pnl = np.arange(60.0)
+    packer = store(infra_db.timeseries_mtm_buckets, fid, ts, pnl, bucket_rows=8)
+    assert not packer.ordered
+    order = np.argsort(ts, kind="stable")
+    return fid, ts[order], pnl[order], packer.seq
+
+
+@pytest.mark.parametrize("ts_filter", [None, {"$gte": T0 + 600}, {"$gt": T0 + 600}, {"$lt": T0 + 1500},
+                                       {"$gt": T0 + 300, "$lt": T0 + 1800}])
+@pytest.mark.parametrize("descending", [False, True])
+def test_windows_of_overlapping_buckets(infra_db, overlapping, ts_filter, descending):
+    fid, ts, pnl, _ = overlapping
+    mask = np.ones(len(ts), dtype=bool)
+    for op, bound in (ts_filter or {}).items():
+        mask &= {"$gt": ts > bound, "$gte": ts >= bound, "$lt": ts < bound}[op]
+    want_ts, want_pnl = ts[mask], pnl[mask]
+    if descending:
+        want_ts, want_pnl = want_ts[::-1], want_pnl[::-1]
+
+    cols = read(infra_db.timeseries_mtm_buckets, fid, ts_filter, descending)
+    assert np.array_equal(cols["timestamp"], want_ts)
+    assert np.array_equal(cols["CumulativePnl"], want_pnl)
+
+    limited = read(infra_db.timeseries_mtm_buckets, fid, ts_filter, descending, limit=11)
+    assert np.array_equal(limited["CumulativePnl"], want_pnl[:11])
+
+
+def test_last_bucket_row(infra_db, overlapping):
+    fid, ts, pnl, _ = overlapping
+    before = ts[30]
+    i = np.flatnonzero(ts < before)[-1]
+    assert last_bucket_row(infra_db.timeseries_mtm_buckets, fid, before) == (int(ts[i]), pnl[i])
+    assert last_bucket_row(infra_db.timeseries_mtm_buckets, fid, ts[0]) is None
+
+
+def test_repack_orders_buckets_and_opens(infra_db, overlapping):
+    fid, ts, pnl, old_count = overlapping
+    buckets = infra_db.timeseries_mtm_buckets
+
+    written = repack_buckets(buckets, fid, old_count, bucket_rows=8)
+
+    docs = list(buckets.find({}, sort=[("seq", 1)]))
+    assert len(docs) == written == old_count
+    assert all(a["end_ts"] <= b["start_ts"] for a, b in zip(docs, docs[1:]))
+    cols = read(buckets, fid)
+    assert np.array_equal(cols["timestamp"], ts) and np.array_equal(cols["CumulativePnl"], pnl)
+    assert np.array_equal(cols["open"], np.r_[pnl[:1], pnl[:-1]])
+
+
+def per_row_file(db, status="ready", n=30):
+    oid = db.files.insert_one({"filename": "a.csv", "status": status, "total_rows": n}).inserted_id
+    rows = [{"file_id": oid, "timestamp": T0 + 60 * i, "CumulativePnl": float(i)} for i in range(n)]
+    rows[3]["CumulativePnl"] = float("nan")
+    db.timeseries_mtm.insert_many(rows)
+    return oid
+
+
+def test_migrate_file(infra_db):
+    oid = per_row_file(infra_db)
+
+    assert migrate_file(infra_db, oid, bucket_rows=8) == 4
+    doc = infra_db.files.find_one({"_id": oid})
+    assert doc["layout"] == BUCKETS and doc["dropped_rows"] == {"invalid_date": 0, "non_finite_pnl": 1}
+    assert infra_db.timeseries_mtm.count_documents({}) == 0
+    assert len(read(infra_db.timeseries_mtm_buckets, oid)["timestamp"]) == 29
+
+
+@pytest.mark.parametrize("status", ["ingesting", "deleting"])
+def test_migrate_skips_busy_files(infra_db, status):
+    oid = per_row_file(infra_db, status)
+
+    assert migrate_file(infra_db, oid, bucket_rows=8) == 0
+    assert "layout" not in infra_db.files.find_one({"_id": oid})
+    assert infra_db.timeseries_mtm.count_documents({}) == 30
+    assert infra_db.timeseries_mtm_buckets.count_documents({}) == 0
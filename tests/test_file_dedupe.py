@@ -0,0 +1,94 @@
+"""
+POST /api/file/upload: identical bytes return the earlier file unless
+force=true; failed or deleting uploads and other file types don't count.
+Bytes that don't parse as the file's type are a 400 naming that type.
+"""
+import io
+import time
+
+import pytest
+from bson import ObjectId
+
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from routes import upload_file  # noqa: E402
+from services.file_ingest import content_hash  # noqa: E402
+
+CSV = b"Date,CumulativePnl\n2024-01-01 09:15:00,1.5\n2024-01-01 09:16:00,2.5\n"
+
+
+@pytest.fixture
+def client(infra_db, monkeypatch):
+    monkeypatch.setitem(main.app.dependency_overrides, upload_file.get_db, lambda: infra_db)
+    return TestClient(main.app)
+
+
+def upload(client, name="a.csv", data=CSV, **params):
+    r = client.post("/api/file/upload", params=params, files={"file": (name, data, "text/csv")})
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_content_hash_rewinds():
+    f = io.BytesIO(CSV)
+    f.read(5)
+    assert content_hash(f) == content_hash(io.BytesIO(CSV))
+    assert f.tell() == 0
+
+
+def test_same_bytes_return_earlier_file(client, infra_db):
+    first = upload(client)
+    again = upload(client, name="renamed.csv")
+
+    assert again["duplicate"] is True
+    assert again["file_id"] == first["file_id"]
+    assert (again["rows"], again["status"]) == (2, "ready")
+    assert infra_db.files.count_documents({}) == 1
+
+
+def test_force_stores_a_fresh_copy(client, infra_db):
+    first = upload(client)
+    forced = upload(client, force=True)
+
+    assert "duplicate" not in forced and forced["file_id"] != first["file_id"]
+    assert infra_db.files.count_documents({}) == 2
+    # Still deduplicated against the earliest copy
+    assert upload(client)["file_id"] == first["file_id"]
+
+
+@pytest.mark.parametrize("status", ["failed", "deleting"])
+def test_failed_or_deleting_upload_is_not_a_duplicate(client, infra_db, status):
+    first = upload(client)
+    infra_db.files.update_one({}, {"$set": {"status": status}})
+
+    again = upload(client)
+    assert "duplicate" not in again and again["file_id"] != first["file_id"]
+
+
+def test_different_bytes_or_type_are_new_files(client):
+    first = upload(client)
+    assert "duplicate" not in upload(client, data=CSV + b"2024-01-01 09:17:00,3.5\n")
+    as_json = upload(client, name="a.json", data=b'{"mtm": []}')
+    as_csv = upload(client, name="a.csv", data=b'{"mtm": []}')
+    assert "duplicate" not in as_csv and as_csv["file_id"] not in (first["file_id"], as_json["file_id"])
+
+
+@pytest.mark.parametrize("name,data,message", [
+    ("a.csv", "Date,CumulativePnl\n2024-01-01 09:15:00,1.5\n".encode("utf-16"), "Invalid CSV format"),
+    ("a.json", b'{"mtm": [', "Invalid JSON format"),
+], ids=["csv", "json"])
+def test_unparseable_upload_names_its_type(client, infra_db, name, data, message):
+    r = client.post("/api/file/upload", files={"file": (name, data, "text/plain")})
+    assert r.status_code == 400 and r.json()["detail"] == message
+
+    r = client.post("/api/file/upload", params={"background": True}, files={"file": (name, data, "text/plain")})
+    job_id = r.json()["job_id"]
+    deadline = time.monotonic() + 5
+    while (snapshot := client.get(f"/api/file/jobs/{job_id}").json())["status"] in ("queued", "running"):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert snapshot["status"] == "failed" and message in str(snapshot["error"])
+    assert infra_db.files.find_one({"_id": ObjectId(r.json()["file_id"])})["status"] == "failed"
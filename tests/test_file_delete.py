@@ -0,0 +1,84 @@
+"""
+DELETE /api/file/{id}: one background job per file, a lost job is resumed
+and a job that can't be queued leaves the file as it was.
+"""
+import threading
+import time
+
+import pytest
+from bson import ObjectId
+
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+from routes import upload_file  # noqa: E402
+from services.jobs import jobs  # noqa: E402
+
+
+@pytest.fixture
+def client(infra_db, monkeypatch):
+    monkeypatch.setitem(main.app.dependency_overrides, upload_file.get_db, lambda: infra_db)
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def file_id(infra_db):
+    oid = infra_db.files.insert_one({"filename": "a.csv", "status": "ready", "total_rows": 3}).inserted_id
+    infra_db.timeseries_mtm.insert_many([{"file_id": oid, "timestamp": 1_700_000_000 + 60 * i, "CumulativePnl": 1.0} for i in range(3)])
+    return oid
+
+
+def wait_for(job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while jobs.get(job_id).status in ("queued", "running"):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_concurrent_deletes_share_one_job(client, infra_db, file_id, monkeypatch):
+    delete = upload_file.delete_file_data
+    monkeypatch.setattr(upload_file, "delete_file_data", lambda db, oid, job: (time.sleep(0.3), delete(db, oid, job, pause=0))[1])
+
+    responses = []
+    threads = [threading.Thread(target=lambda: responses.append(client.delete(f"/api/file/{file_id}"))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert {r.status_code for r in responses} == {202}
+    assert len({r.json()["job_id"] for r in responses}) == 1
+    assert sorted(r.json()["message"] for r in responses).count("File deletion started") == 1
+
+    wait_for(responses[0].json()["job_id"])
+    assert infra_db.files.count_documents({}) == 0
+    assert infra_db.timeseries_mtm.count_documents({}) == 0
+
+
+def test_lost_job_is_resumed(client, infra_db, file_id):
+    infra_db.files.update_one({"_id": file_id}, {"$set": {"status": "deleting", "delete_job": "lost-in-restart"}})
+
+    r = client.delete(f"/api/file/{file_id}")
+    assert r.status_code == 202 and r.json()["message"] == "File deletion started"
+
+    wait_for(r.json()["job_id"])
+    assert infra_db.files.count_documents({}) == 0
+    assert infra_db.timeseries_mtm.count_documents({}) == 0
+
+
+@pytest.mark.parametrize("status,delete_job", [("ready", None), ("deleting", "lost-in-restart")])
+def test_full_queue_leaves_file_as_it_was(client, infra_db, file_id, monkeypatch, status, delete_job):
+    if status == "deleting":
+        infra_db.files.update_one({"_id": file_id}, {"$set": {"status": status, "delete_job": delete_job}})
+    monkeypatch.setattr(jobs, "max_queued", 0)
+
+    assert client.delete(f"/api/file/{file_id}").status_code == 503
+    doc = infra_db.files.find_one({"_id": file_id})
+    assert doc["status"] == status and doc.get("delete_job") == delete_job
+    assert infra_db.timeseries_mtm.count_documents({}) == 3
+
+
+def test_unknown_file(client):
+    assert client.delete(f"/api/file/{ObjectId()}").status_code == 404
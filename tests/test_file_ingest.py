@@ -0,0 +1,126 @@
+"""
+Chunked CSV / JSON ingest: rows are stored as time-ordered buckets with their
+opens, unchartable rows are dropped and counted, and an invalid CumulativePnl
+leaves nothing behind.
+"""
+import datetime as dt
+import io
+import json
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from services.file_buckets import BUCKET_ROWS, iter_bucket_rows
+from services.file_ingest import ingest_chunks, iter_csv_chunks, iter_json_mtm, iter_record_chunks, register_file
+
+START = dt.datetime(2024, 1, 1, 9, 15)
+
+
+def records(n, seed=0):
+    pnl = np.round(np.cumsum(np.random.default_rng(seed).normal(0, 50, n)), 2)
+    return [
+        {"Date": (START + dt.timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"), "CumulativePnl": float(p)}
+        for i, p in enumerate(pnl)
+    ]
+
+
+def csv_bytes(rows):
+    lines = ["Date,CumulativePnl,Other"] + [f"{r['Date']},{r['CumulativePnl']},x" for r in rows]
+    return io.BytesIO("\n".join(lines).encode())
+
+
+def json_bytes(rows):
+    return io.BytesIO(json.dumps({"name": "s", "mtm": rows}).encode())
+
+
+def stored(db, file_id):
+    parts = list(iter_bucket_rows(db.timeseries_mtm_buckets, file_id))
+    return {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+
+
+def expected(rows):
+    ts = np.array([dt.datetime.strptime(r["Date"], "%Y-%m-%d %H:%M:%S").timestamp() for r in rows])
+    pnl = np.array([r["CumulativePnl"] for r in rows])
+    order = np.argsort(ts, kind="stable")
+    ts, pnl = ts[order], pnl[order]
+    return ts, pnl, np.r_[pnl[:1], pnl[:-1]]
+
+
+@pytest.mark.parametrize("file_type", ["csv", "json"])
+def test_chunks_are_stored_as_buckets(infra_db, file_type):
+    rows = records(BUCKET_ROWS + 1234)
+    if file_type == "csv":
+        chunks = iter_csv_chunks(csv_bytes(rows), chunk_rows=777)
+    else:
+        chunks = iter_record_chunks(iter_json_mtm(json_bytes(rows)), chunk_rows=777)
+
+    out = ingest_chunks(infra_db, chunks, f"a.{file_type}", "text/plain", file_type, digest="d")
+
+    assert out["rows"] == len(rows)
+    doc = infra_db.files.find_one({})
+    assert (doc["status"], doc["layout"], doc["total_rows"], doc["content_hash"]) == ("ready", "buckets", len(rows), "d")
+    assert infra_db.timeseries_mtm_buckets.count_documents({}) == 2
+    cols = stored(infra_db, doc["_id"])
+    ts, pnl, opens = expected(rows)
+    assert np.array_equal(cols["timestamp"], ts)
+    assert np.array_equal(cols["CumulativePnl"], pnl)
+    assert np.array_equal(cols["open"], opens)
+
+
+def test_out_of_order_upload_is_repacked(infra_db):
+    rows = records(2 * BUCKET_ROWS + 10, seed=1)
+    shuffled = [rows[i] for i in np.random.default_rng(2).permutation(len(rows))]
+
+    out = ingest_chunks(infra_db, iter_csv_chunks(csv_bytes(shuffled), chunk_rows=3000), "a.csv", None, "csv")
+
+    cols = stored(infra_db, out["file_id"])
+    ts, pnl, opens = expected(rows)
+    assert np.array_equal(cols["timestamp"], ts) and np.array_equal(cols["open"], opens)
+    starts = [d["start_ts"] for d in infra_db.timeseries_mtm_buckets.find({}, sort=[("seq", 1)])]
+    assert starts == sorted(starts) and len(starts) == 3
+
+
+def test_unchartable_rows_are_dropped_and_counted(infra_db):
+    rows = records(6)
+    rows[1]["Date"] = "not a date"
+    rows[4]["CumulativePnl"] = "inf"
+
+    out = ingest_chunks(infra_db, iter_csv_chunks(csv_bytes(rows), chunk_rows=4), "a.csv", None, "csv")
+
+    assert out["rows"] == 6
+    assert out["dropped_rows"] == {"invalid_date": 1, "non_finite_pnl": 1}
+    assert len(stored(infra_db, out["file_id"])["timestamp"]) == 4
+
+
+def test_invalid_pnl_rolls_back(infra_db):
+    rows = records(BUCKET_ROWS + 20)
+    rows[-3]["CumulativePnl"] = "abc"
+
+    with pytest.raises(HTTPException) as e:
+        ingest_chunks(infra_db, iter_csv_chunks(csv_bytes(rows), chunk_rows=BUCKET_ROWS), "a.csv", None, "csv")
+
+    assert e.value.status_code == 400
+    assert e.value.detail["errors"] == [{"row": len(rows) - 2, "column": "CumulativePnl", "value": "abc"}]
+    assert infra_db.files.count_documents({}) == 0
+    assert infra_db.timeseries_mtm_buckets.count_documents({}) == 0
+
+
+def test_registered_upload_is_flipped(infra_db):
+    ok = register_file(infra_db, "a.json", None, "json")
+    assert infra_db.files.find_one({"_id": ok})["status"] == "ingesting"
+    ingest_chunks(infra_db, iter_record_chunks(iter_json_mtm(json_bytes(records(5)))), "a.json", None, "json", file_id=ok)
+    assert infra_db.files.find_one({"_id": ok})["status"] == "ready"
+
+    bad = register_file(infra_db, "b.json", None, "json")
+    with pytest.raises(HTTPException):
+        ingest_chunks(infra_db, iter_record_chunks(iter_json_mtm(io.BytesIO(b'{"rows": []}'))), "b.json", None, "json", file_id=bad)
+    doc = infra_db.files.find_one({"_id": bad})
+    assert doc["status"] == "failed" and "mtm" in doc["error"]
+
+
+def test_json_without_mtm_key():
+    with pytest.raises(HTTPException) as e:
+        list(iter_json_mtm(io.BytesIO(b'{"name": "s", "nested": {"mtm": []}}')))
+    assert e.value.status_code == 400
+    assert list(iter_json_mtm(io.BytesIO(b'{"mtm": []}'))) == []
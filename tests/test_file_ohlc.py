@@ -0,0 +1,100 @@
+"""
+Cursor pages of a file, in either storage layout, never end inside a run of
+equal timestamps or a bucket, and together they give exactly the candles of
+a full read.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from helpers.ohlc_cache import ohlc_cache
+from services.file_buckets import BUCKETS, BucketPacker
+from services.file_ohlc import get_file_ohlc_page
+
+T0 = 1_704_067_200      # 2024-01-01 05:30 IST
+LAYOUTS = ["rows", BUCKETS]
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    ohlc_cache.clear()
+    yield
+    ohlc_cache.clear()
+
+
+def make_file(db, layout, ts, pnl):
+    oid = db.files.insert_one({"filename": "a.csv", "status": "ready", "total_rows": len(ts), "upload_date": 1}).inserted_id
+    ts, pnl = np.asarray(ts, dtype=np.float64), np.asarray(pnl, dtype=np.float64)
+    if layout == BUCKETS:
+        packer = BucketPacker(oid, bucket_rows=4)
+        docs = packer.add(ts, pnl) + packer.flush()
+        db.timeseries_mtm_buckets.insert_many(docs)
+        db.files.update_one({"_id": oid}, {"$set": {"layout": BUCKETS}})
+    else:
+        db.timeseries_mtm.insert_many([
+            {"file_id": oid, "timestamp": int(t), "CumulativePnl": float(p)} for t, p in zip(ts, pnl)
+        ])
+    return str(oid)
+
+
+def runs_file(db, layout):
+    # Runs of 1-3 equal timestamps, a minute apart
+    ts = np.repeat(T0 + 60 * np.arange(20), [1, 3, 1, 2, 1, 1, 3, 1, 2, 1] * 2)
+    return make_file(db, layout, ts, np.cumsum(np.arange(len(ts)) % 7 - 3.0)), ts
+
+
+def all_pages(file_id, db, limit, resolution=None):
+    pages, cursor = [], None
+    while True:
+        page, cursor = get_file_ohlc_page(file_id, db, cursor=cursor, limit=limit, resolution=resolution)
+        pages.append(page)
+        if cursor is None:
+            return pages
+
+
+def full(file_id, db, resolution=None):
+    page, cursor = get_file_ohlc_page(file_id, db, resolution=resolution)
+    assert cursor is None
+    return page.reset_index(drop=True)
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+@pytest.mark.parametrize("limit", [2, 3, 5, 8])
+def test_pages_end_at_timestamp_change(infra_db, layout, limit):
+    file_id, ts = runs_file(infra_db, layout)
+    pages = all_pages(file_id, infra_db, limit)
+
+    for page in pages[:-1]:
+        last = page["time"].iloc[-1] // 1000
+        assert (page["time"] // 1000 == last).sum() == (ts == last).sum()
+    joined = pd.concat(pages, ignore_index=True)
+    assert joined.equals(full(file_id, infra_db))
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_run_longer_than_page_is_read_whole(infra_db, layout):
+    ts = [T0, T0 + 60, T0 + 60, T0 + 60, T0 + 60, T0 + 60, T0 + 120]
+    file_id = make_file(infra_db, layout, ts, np.arange(7.0))
+
+    first, cursor = get_file_ohlc_page(file_id, infra_db, cursor=T0, limit=2)
+    assert len(first) == 5 and cursor == T0 + 60
+    last, cursor = get_file_ohlc_page(file_id, infra_db, cursor=cursor, limit=2)
+    assert list(last["time"]) == [(T0 + 120) * 1000] and cursor is None
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_resampled_pages_do_not_split_buckets(infra_db, layout):
+    file_id, _ = runs_file(infra_db, layout)
+    pages = all_pages(file_id, infra_db, 5, resolution="5")
+
+    joined = pd.concat(pages, ignore_index=True)
+    assert joined["time"].is_unique
+    assert joined.equals(full(file_id, infra_db, resolution="5"))
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_page_opens_at_previous_close(infra_db, layout):
+    file_id, _ = runs_file(infra_db, layout)
+    first, cursor = get_file_ohlc_page(file_id, infra_db, limit=3)
+    second, _ = get_file_ohlc_page(file_id, infra_db, cursor=cursor, limit=3)
+    assert second["open"].iloc[0] == first["close"].iloc[-1]
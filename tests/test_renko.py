@@ -0,0 +1,72 @@
+"""
+The clamp-scan Renko builders must match the candle loops brick for brick:
+close path (_build_renko_numpy vs _build_renko_reference) and OHLC path
+(renko_path + walk_renko vs _build_ohlc_renko_reference). Timing lives in
+benchmarks/bench_renko.py.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from helpers.make_renko import (
+    _build_renko_numpy, _build_renko_reference, _build_ohlc_renko_reference, _renko_frame, renko_path, walk_renko,
+)
+
+STEP_SD = 40.0
+
+
+def adversarial_cases(seed: int = 1):
+    """Integer closes on brick boundaries, 0.1-step prices, large offsets"""
+    rng = np.random.default_rng(seed)
+    for n in (0, 1, 2, 50, 2000):
+        yield f"integer closes-{n}", np.round(np.cumsum(rng.normal(0, 30, n))), 5
+        yield f"0.1 steps-{n}", np.cumsum(rng.choice([-3, -1, 0, 1, 3], n)) * 0.1 + 1e6 / 3, 1
+        yield f"large offset-{n}", np.cumsum(rng.normal(0, 500, n)) + 1e13 + 0.1234, 150
+        yield f"exact multiples-{n}", np.cumsum(rng.choice([-14, -7, 0, 7, 14], n)) * 1.0, 7
+
+
+def random_walk_cases():
+    rng = np.random.default_rng(0)
+    closes = np.cumsum(rng.normal(0, STEP_SD, 5000)) + 250_000.37
+    for mult in (0.25, 1.0, 5.0):
+        yield f"random walk-{mult}", closes, max(1, round(mult * STEP_SD))
+
+
+CASES = list(adversarial_cases()) + list(random_walk_cases())
+
+
+def with_wicks(closes, seed: int = 0):
+    """Candles opening at the previous close, wicks up to a move either side"""
+    rng = np.random.default_rng(seed)
+    opens = np.r_[closes[:1], closes[:-1]]
+    highs = np.maximum(opens, closes) + np.abs(rng.normal(0, STEP_SD, len(closes)))
+    lows = np.minimum(opens, closes) - np.abs(rng.normal(0, STEP_SD, len(closes)))
+    return pd.DataFrame({"open": opens, "high": highs, "low": lows, "close": closes})
+
+
+def ohlc_numpy(df, dates, size):
+    path = renko_path(df, "ohlc")
+    if not len(path):
+        return _build_ohlc_renko_reference(*(df[c].to_numpy() for c in ("open", "high", "low", "close")), dates, size)
+    idx, opens, closes, _ = walk_renko(path, path[0, 0], size)
+    return _renko_frame(dates[idx], opens, closes)
+
+
+def assert_same(a, b):
+    assert a.shape == b.shape
+    for c in a.columns:
+        assert np.array_equal(a[c].to_numpy(), b[c].to_numpy()), c
+
+
+@pytest.mark.parametrize("name,closes,size", CASES, ids=[c[0] for c in CASES])
+def test_close_renko_matches_loop(name, closes, size):
+    dates = np.arange(len(closes)).astype("datetime64[ms]")
+    assert_same(_build_renko_reference(closes, dates, size), _build_renko_numpy(closes, dates, size))
+
+
+@pytest.mark.parametrize("name,closes,size", CASES, ids=[c[0] for c in CASES])
+def test_ohlc_renko_matches_loop(name, closes, size):
+    dates = np.arange(len(closes)).astype("datetime64[ms]")
+    df = with_wicks(closes) if name.startswith(("large offset", "random walk")) else with_wicks(closes).round(1)
+    reference = _build_ohlc_renko_reference(*(df[c].to_numpy() for c in ("open", "high", "low", "close")), dates, size)
+    assert_same(reference, ohlc_numpy(df, dates, size))
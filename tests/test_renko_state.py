@@ -0,0 +1,126 @@
+"""
+A persisted Renko state — extended by new candles, rebuilt on retroactive
+changes, windows replayed from checkpoints — gives exactly the bricks of a
+full replay of the current series.
+"""
+import datetime as dt
+
+import numpy as np
+import pytest
+
+from helpers.make_renko import renko_path, walk_renko
+from helpers.ohlc_cache import ohlc_cache
+from services import renko_state
+from services.chart_sources import load_source_frame, source_version
+
+START = dt.datetime(2024, 1, 1, 9, 15)
+BRICK = 40
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # Many chunks and checkpoints on a few hundred candles
+    monkeypatch.setattr(renko_state, "CHUNK_BRICKS", 7)
+    monkeypatch.setattr(renko_state, "CHECKPOINT_CANDLES", 5)
+    ohlc_cache.clear()
+    yield
+    ohlc_cache.clear()
+
+
+@pytest.fixture
+def series(fin_db):
+    rng = np.random.default_rng(3)
+    pnl = np.cumsum(rng.normal(0, 60, 300))
+    fin_db.strategies_mtm_data.insert_many([
+        {"strategy": "A", "Date": START + dt.timedelta(minutes=15 * i), "CumulativePnl": float(p)}
+        for i, p in enumerate(pnl)
+    ])
+    return fin_db
+
+
+def append(db, n, seed=0):
+    last = db.strategies_mtm_data.find_one({"strategy": "A"}, sort=[("Date", -1)])
+    steps = np.random.default_rng(seed).normal(0, 60, n)
+    db.strategies_mtm_data.insert_many([
+        {"strategy": "A", "Date": last["Date"] + dt.timedelta(minutes=15 * (i + 1)), "CumulativePnl": float(last["CumulativePnl"] + s)}
+        for i, s in enumerate(np.cumsum(steps))
+    ])
+
+
+def renko(fin_db, infra_db, brick_type, from_ts=None, to_ts=None):
+    out, size = renko_state.get_renko("strategy", "A", brick_type, "traditional", BRICK, 1, fin_db, infra_db, from_ts, to_ts)
+    assert size == BRICK
+    return out
+
+
+def full_replay(fin_db, brick_type, from_ts=None, to_ts=None):
+    df = load_source_frame("strategy", "A", fin_db, source_version("strategy", "A", fin_db))
+    times = df["time"].to_numpy().astype(np.int64)
+    path = renko_path(df, brick_type)
+    idx, opens, closes, _ = walk_renko(path, path[0, 0], BRICK)
+    keep = np.ones(len(idx), dtype=bool)
+    if from_ts is not None:
+        keep &= times[idx] >= from_ts * 1000
+    if to_ts is not None:
+        keep &= times[idx] < to_ts * 1000
+    return renko_state._renko_output({"date": times[idx][keep], "open": opens[keep], "close": closes[keep]})
+
+
+def generation(infra_db):
+    return infra_db[renko_state.STATES].find_one({})["generation"]
+
+
+@pytest.mark.parametrize("brick_type", ["close", "ohlc"])
+def test_append_extends_state(series, infra_db, brick_type):
+    renko(series, infra_db, brick_type)
+    for step in range(4):
+        append(series, 7 + step, seed=step)
+        if step == 2:
+            ohlc_cache.clear()      # bricks read back from the chunks
+        assert renko(series, infra_db, brick_type).equals(full_replay(series, brick_type))
+    assert generation(infra_db) == 1
+
+
+@pytest.mark.parametrize("change", ["delete", "edit"])
+def test_retroactive_change_rebuilds(series, infra_db, change):
+    renko(series, infra_db, "ohlc")
+    row = {"strategy": "A", "Date": START + dt.timedelta(minutes=15 * 40)}
+    if change == "delete":
+        series.strategies_mtm_data.delete_one(row)
+    else:
+        series.strategies_mtm_data.update_one(row, {"$inc": {"CumulativePnl": 333.0}})
+    append(series, 5)
+
+    assert renko(series, infra_db, "ohlc").equals(full_replay(series, "ohlc"))
+    assert generation(infra_db) == 2
+
+
+def test_windows_match_full_replay(series, infra_db):
+    renko(series, infra_db, "ohlc")
+    append(series, 23)
+    df = load_source_frame("strategy", "A", series, source_version("strategy", "A", series))
+    t0, t1 = int(df["time"].iloc[0]) // 1000, int(df["time"].iloc[-1]) // 1000
+    for from_ts, to_ts in [(t0, None), (None, t1), (t0 + 3700, t1 - 9000), (t1 - 2000, None), (t1 + 900, None)]:
+        got = renko(series, infra_db, "ohlc", from_ts, to_ts)
+        assert got.equals(full_replay(series, "ohlc", from_ts, to_ts)), (from_ts, to_ts)
+
+
+def test_state_without_checkpoints_is_rebuilt(series, infra_db):
+    full = renko(series, infra_db, "close")
+    # As saved before checkpoints existed
+    infra_db[renko_state.STATES].update_many({}, {"$unset": {"format": ""}})
+    infra_db[renko_state.CHECKPOINTS].delete_many({})
+    ohlc_cache.clear()
+
+    from_ts = int(full["date"].iloc[len(full) // 2].timestamp())
+    assert renko(series, infra_db, "close", from_ts).equals(full_replay(series, "close", from_ts))
+    assert infra_db[renko_state.CHECKPOINTS].count_documents({}) > 0
+
+
+def test_missing_checkpoint_replays_from_first_candle(series, infra_db):
+    full = renko(series, infra_db, "close")
+    infra_db[renko_state.CHECKPOINTS].delete_many({})
+    ohlc_cache.clear()
+
+    from_ts = int(full["date"].iloc[len(full) // 3].timestamp())
+    assert renko(series, infra_db, "close", from_ts).equals(full_replay(series, "close", from_ts))
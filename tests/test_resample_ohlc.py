@@ -0,0 +1,90 @@
+"""
+resample_ohlc buckets on the IST wall clock (days from 00:00 IST, weeks from
+Monday) and aggregates first open / max high / min low / last close.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from helpers.resample_ohlc import (
+    DAY_MS, WEEK_MS, HOUR_MS, bucket_start, candles_from_equity, resample_ohlc, resolution_to_ms,
+)
+
+
+def utc_ms(stamp: str) -> int:
+    return int(pd.Timestamp(stamp, tz="UTC").value // 10**6)
+
+
+def ist_ms(stamp: str) -> int:
+    return int(pd.Timestamp(stamp, tz="Asia/Kolkata").value // 10**6)
+
+
+@pytest.mark.parametrize("stamp,start", [
+    ("2024-01-01 00:00", "2024-01-01 00:00"),
+    ("2024-01-01 23:59:59", "2024-01-01 00:00"),
+    ("2024-01-02 05:29", "2024-01-02 00:00"),     # before 00:00 UTC, already the next IST day
+])
+def test_day_buckets_start_at_ist_midnight(stamp, start):
+    assert bucket_start(ist_ms(stamp), DAY_MS) == ist_ms(start)
+
+
+@pytest.mark.parametrize("stamp,monday", [
+    ("2024-01-01 00:00", "2024-01-01 00:00"),     # a Monday
+    ("2024-01-07 23:59", "2024-01-01 00:00"),     # the Sunday after
+    ("2024-01-08 00:00", "2024-01-08 00:00"),
+    ("2024-01-04 12:00", "2024-01-01 00:00"),     # a Thursday, like the epoch
+])
+def test_week_buckets_start_on_monday(stamp, monday):
+    assert bucket_start(ist_ms(stamp), WEEK_MS) == ist_ms(monday)
+
+
+def test_hour_buckets_follow_ist_half_hour_offset():
+    # 09:15 IST is 03:45 UTC; its hour bucket is 09:00 IST = 03:30 UTC
+    assert bucket_start(ist_ms("2024-01-01 09:15"), HOUR_MS) == utc_ms("2024-01-01 03:30")
+
+
+def test_bucket_start_on_arrays():
+    times = np.array([ist_ms("2024-01-01 09:15"), ist_ms("2024-01-01 15:30"), ist_ms("2024-01-02 09:15")])
+    assert list(bucket_start(times, DAY_MS)) == [ist_ms("2024-01-01")] * 2 + [ist_ms("2024-01-02")]
+
+
+def test_resample_aggregates_each_bucket():
+    times = [ist_ms(t) for t in ("2024-01-01 09:15", "2024-01-01 12:00", "2024-01-01 15:30",
+                                 "2024-01-02 09:15", "2024-01-02 15:30")]
+    df = candles_from_equity(np.array(times), [10.0, 30.0, 5.0, 8.0, 20.0], prev_close=1.0)
+
+    out = resample_ohlc(df, "1D")
+
+    assert list(out["time"]) == [ist_ms("2024-01-01"), ist_ms("2024-01-02")]
+    assert list(out["open"]) == [1.0, 5.0]          # seed close, then the previous bucket's close
+    assert list(out["high"]) == [30.0, 20.0]
+    assert list(out["low"]) == [1.0, 5.0]
+    assert list(out["close"]) == [5.0, 20.0]
+
+
+def test_resample_skips_nan_highs_and_lows():
+    df = pd.DataFrame({
+        "time": [ist_ms("2024-01-01 09:15"), ist_ms("2024-01-01 09:16")],
+        "open": [1.0, 2.0], "high": [np.nan, 4.0], "low": [np.nan, 0.5], "close": [2.0, 3.0],
+    })
+    out = resample_ohlc(df, "15")
+    assert (out["high"].tolist(), out["low"].tolist()) == ([4.0], [0.5])
+
+
+def test_raw_resolution_and_empty_frames_pass_through():
+    df = candles_from_equity(np.array([1, 2]), [1.0, 2.0])
+    assert resample_ohlc(df, None) is df
+    empty = candles_from_equity(np.empty(0, dtype=np.int64), np.empty(0))
+    assert resample_ohlc(empty, "1D").empty
+
+
+def test_unknown_resolution():
+    with pytest.raises(ValueError):
+        resolution_to_ms("2H")
+
+
+def test_candles_from_equity_opens_at_previous_close():
+    out = candles_from_equity(np.array([1, 2, 3]), [5.0, np.nan, 7.0])
+    assert out["open"].tolist()[0] == 5.0           # no seed: opens at its own close
+    assert np.isnan(out["close"].iloc[1])
+    assert out["open"].iloc[2] == 7.0               # NaN previous close → its own close